@@ -0,0 +1,187 @@
+import dataclasses
+from uuid import UUID
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.utils import unquote
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import HttpRequest, HttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from exercises.models import Exercise
+from exercises.models.range_exercise import ExerciseDataPoint
+from exercises.serializers.points_csv import parse_points_csv
+from exercises.services.service import ExerciseService, ExerciseSummaryDto
+
+POINTS_PER_PAGE = 100
+
+
+class PointsUploadForm(forms.Form):
+    file = forms.FileField(
+        help_text="CSV or TSV whose first line names the x, y and size columns. "
+        "It replaces every point of the exercise"
+    )
+
+
+@admin.register(Exercise)
+class ExerciseAdmin(admin.ModelAdmin):
+    list_display = (
+        "order",
+        "title",
+        "constraint_type",
+        "point_count",
+        "is_active",
+        "updated_at",
+    )
+    list_display_links = ("title",)
+    list_filter = ("is_active", "constraint_type")
+    search_fields = ("title",)
+    ordering = ("order",)
+    # there's intentionally no inline for the points: it renders a form per point,
+    # they're paged and replaced from an upload in their own views instead
+    readonly_fields = (
+        "order",
+        "points",
+        *(field.name for field in dataclasses.fields(ExerciseSummaryDto)),
+        "created_at",
+        "updated_at",
+    )
+
+    def get_urls(self):
+        info = self.opts.app_label, self.opts.model_name
+        return [
+            path(
+                "<path:object_id>/points/",
+                self.admin_site.admin_view(self.points_view),
+                name="%s_%s_points" % info,
+            ),
+            path(
+                "<path:object_id>/points/upload/",
+                self.admin_site.admin_view(self.upload_points_view),
+                name="%s_%s_upload_points" % info,
+            ),
+        ] + super().get_urls()
+
+    def _url(self, name: str, exercise: Exercise) -> str:
+        return reverse(
+            f"admin:{self.opts.app_label}_{self.opts.model_name}_{name}",
+            args=[exercise.pk],
+        )
+
+    @admin.display(description="data points")
+    def points(self, exercise: Exercise) -> str:
+        if exercise.pk is None:
+            return "-"
+        if exercise.generator_spec is not None:
+            return "generated from the generator spec"
+        return format_html(
+            '{} points: <a href="{}">browse</a> or <a href="{}">replace from a CSV</a>',
+            exercise.point_count,
+            self._url("points", exercise),
+            self._url("upload_points", exercise),
+        )
+
+    def save_model(self, request, obj: Exercise, form, change: bool) -> None:
+        if not change:
+            obj.order = ExerciseService._get_next_exercise_order()
+        super().save_model(request, obj, form, change)
+
+    def get_deleted_objects(self, objs, request):
+        # the default lists, so loads, every point of the exercises
+        objs = list(objs)
+        model_count = {
+            self.opts.verbose_name_plural: len(objs),
+            ExerciseDataPoint._meta.verbose_name_plural: sum(
+                exercise.point_count for exercise in objs
+            ),
+        }
+        return [str(exercise) for exercise in objs], model_count, set(), []
+
+    def delete_model(self, request, obj: Exercise) -> None:
+        ExerciseService.delete_exercises([obj.pk])
+
+    def delete_queryset(self, request, queryset) -> None:
+        ExerciseService.delete_exercises(list(queryset.values_list("pk", flat=True)))
+
+    def points_view(self, request: HttpRequest, object_id: str) -> HttpResponse:
+        """A page of the points of the exercise, by id, linked by keyset"""
+        exercise = self.get_object(request, unquote(object_id))
+        if exercise is None:
+            return self._get_obj_does_not_exist_redirect(request, self.opts, object_id)
+        if not self.has_view_permission(request, exercise):
+            raise PermissionDenied
+
+        try:
+            after = UUID(request.GET["after"]) if "after" in request.GET else None
+        except ValueError:
+            after = None
+
+        points = ExerciseDataPoint.objects.filter(exercise_id=exercise.pk)
+        if after is not None:
+            points = points.filter(id__gt=after)
+        # one more than a page, to know whether there's a next one
+        page = list(
+            points.order_by("id").values_list("id", "x", "y", "size")[
+                : POINTS_PER_PAGE + 1
+            ]
+        )
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.opts,
+            "original": exercise,
+            "title": f"Points of {exercise}",
+            "points": page[:POINTS_PER_PAGE],
+            "per_page": POINTS_PER_PAGE,
+            "after": after,
+            "next_after": (
+                page[POINTS_PER_PAGE - 1][0] if len(page) > POINTS_PER_PAGE else None
+            ),
+            "upload_url": self._url("upload_points", exercise),
+        }
+        return TemplateResponse(
+            request, "admin/exercises/exercise/points.html", context
+        )
+
+    def upload_points_view(self, request: HttpRequest, object_id: str) -> HttpResponse:
+        """Replaces the points of the exercise with the ones of a CSV or TSV upload"""
+        exercise = self.get_object(request, unquote(object_id))
+        if exercise is None:
+            return self._get_obj_does_not_exist_redirect(request, self.opts, object_id)
+        if not self.has_change_permission(request, exercise):
+            raise PermissionDenied
+
+        form = PointsUploadForm()
+        if request.method == "POST":
+            form = PointsUploadForm(request.POST, request.FILES)
+            if form.is_valid():
+                try:
+                    # uploads over FILE_UPLOAD_MAX_MEMORY_SIZE are on disk, and the
+                    # points are read from them as they're inserted
+                    summary = ExerciseService.replace_data_points(
+                        exercise.pk, parse_points_csv(form.cleaned_data["file"])
+                    )
+                except ValidationError as e:
+                    form.add_error(None, e)
+                else:
+                    self.message_user(
+                        request,
+                        f"replaced the points of {exercise} with "
+                        f"{summary.point_count} points",
+                        messages.SUCCESS,
+                    )
+                    return redirect(self._url("points", exercise))
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.opts,
+            "original": exercise,
+            "title": f"Replace the points of {exercise}",
+            "form": form,
+        }
+        return TemplateResponse(
+            request, "admin/exercises/exercise/upload_points.html", context
+        )
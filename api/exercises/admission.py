@@ -0,0 +1,212 @@
+"""
+Admission control for the API.
+
+Every request is put in a class (reads, evaluations, and "create" for every other write)
+with its own concurrency limit and bounded queue, and all classes share EXERCISES_ADMISSION_MAX_ACTIVE slots.
+When a slot frees up, queued requests are admitted by class priority, so light reads
+overtake heavy imports. Requests that find the queue full, or that would wait longer
+than their class allows, are rejected straight away so clients can retry elsewhere.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpRequest
+
+
+@dataclass(frozen=True)
+class AdmissionPolicy:
+    name: str
+    # requests of the class served at the same time
+    concurrency: int
+    # requests of the class waiting for a slot, more are rejected
+    queue_size: int
+    # seconds a request waits for a slot before it's rejected
+    timeout: float
+    # lower is admitted first
+    priority: int
+
+    @property
+    def retry_after(self) -> int:
+        """Seconds clients are told to wait before retrying a rejected request"""
+        return max(1, math.ceil(self.timeout))
+
+
+@dataclass
+class AdmissionStatsDto:
+    name: str
+    active: int = 0
+    queued: int = 0
+    admitted: int = 0
+    rejected_queue_full: int = 0
+    rejected_timeout: int = 0
+
+
+DEFAULT_POLICIES = {
+    "read": {"concurrency": 16, "queue_size": 64, "timeout": 1.0, "priority": 0},
+    "evaluate": {"concurrency": 8, "queue_size": 32, "timeout": 2.0, "priority": 1},
+    # every write but evaluations. SQLite has a single writer, concurrent writes would
+    # only wait for its lock
+    "create": {"concurrency": 1, "queue_size": 4, "timeout": 5.0, "priority": 2},
+}
+
+DEFAULT_MAX_ACTIVE = 16
+
+_WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+_EXERCISE_EVALUATE = re.compile(r"^/api/exercises/[^/]+/evaluate/?$")
+
+
+def classify(request: HttpRequest) -> Optional[str]:
+    """The admission class of a request, None for requests that aren't limited"""
+    path = request.path_info
+    if path.startswith("/api/"):
+        if request.method in ("GET", "HEAD"):
+            return "read"
+        if request.method == "POST" and _EXERCISE_EVALUATE.match(path):
+            return "evaluate"
+        # creates, clones, patches, archives and deletes
+        if request.method in _WRITE_METHODS:
+            return "create"
+    elif path.startswith("/admin/") and request.method in _WRITE_METHODS:
+        # e.g. the points uploads and deletes of the admin
+        return "create"
+    return None
+
+
+class Rejected(Exception):
+    def __init__(self, policy: AdmissionPolicy, reason: str):
+        super().__init__(f"too many {policy.name} requests, {reason}")
+        self.policy = policy
+        self.reason = reason
+
+
+class AdmissionController:
+    def __init__(self, policies: List[AdmissionPolicy], max_active: int):
+        self.policies = {policy.name: policy for policy in policies}
+        self.max_active = max_active
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[object]] = {
+            policy.name: deque() for policy in policies
+        }
+        self._stats = {
+            policy.name: AdmissionStatsDto(policy.name) for policy in policies
+        }
+        self._by_priority = sorted(policies, key=lambda policy: policy.priority)
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        configured = getattr(settings, "EXERCISES_ADMISSION_POLICIES", DEFAULT_POLICIES)
+        return cls(
+            [
+                AdmissionPolicy(name=name, **policy)
+                for name, policy in configured.items()
+            ],
+            max_active=getattr(
+                settings, "EXERCISES_ADMISSION_MAX_ACTIVE", DEFAULT_MAX_ACTIVE
+            ),
+        )
+
+    def _total_active(self) -> int:
+        return sum(stats.active for stats in self._stats.values())
+
+    def _has_room(self, policy: AdmissionPolicy) -> bool:
+        return (
+            self._stats[policy.name].active < policy.concurrency
+            and self._total_active() < self.max_active
+        )
+
+    def _can_admit(self, policy: AdmissionPolicy, ticket: Optional[object]) -> bool:
+        """Whether `ticket`, or a request that isn't queued yet, can take a slot now"""
+        queue = self._queues[policy.name]
+        if (queue and queue[0] is not ticket) or not self._has_room(policy):
+            return False
+        # a queued request of a more urgent class that could run goes first
+        for other in self._by_priority:
+            if other.priority >= policy.priority:
+                break
+            if self._queues[other.name] and self._has_room(other):
+                return False
+        return True
+
+    def acquire(self, name: str) -> float:
+        """
+        Waits for a slot of the class, returns the seconds waited. Raises Rejected when
+        the queue is full or the class's timeout passes first
+        """
+        policy = self.policies[name]
+        stats = self._stats[name]
+        queue = self._queues[name]
+        start = time.monotonic()
+
+        with self._cond:
+            if self._can_admit(policy, None):
+                stats.active += 1
+                stats.admitted += 1
+                return 0.0
+
+            if len(queue) >= policy.queue_size:
+                stats.rejected_queue_full += 1
+                raise Rejected(policy, "the queue is full")
+
+            ticket = object()
+            queue.append(ticket)
+            stats.queued += 1
+            deadline = start + policy.timeout
+            try:
+                while not self._can_admit(policy, ticket):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        stats.rejected_timeout += 1
+                        raise Rejected(policy, "timed out waiting for a slot")
+                    self._cond.wait(remaining)
+            finally:
+                queue.remove(ticket)
+                stats.queued -= 1
+                # the next request in line may be admissible now
+                self._cond.notify_all()
+
+            stats.active += 1
+            stats.admitted += 1
+            return time.monotonic() - start
+
+    def release(self, name: str) -> None:
+        with self._cond:
+            self._stats[name].active -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> List[AdmissionStatsDto]:
+        with self._cond:
+            return [
+                AdmissionStatsDto(**vars(self._stats[policy.name]))
+                for policy in self._by_priority
+            ]
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def controller() -> AdmissionController:
+    """The process wide controller, built from the settings on first use"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController.from_settings()
+    return _controller
+
+
+@receiver(setting_changed)
+def _reset_controller(setting: str, **kwargs) -> None:
+    global _controller
+    if setting.startswith("EXERCISES_ADMISSION"):
+        _controller = None
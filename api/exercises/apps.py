@@ -1,6 +1,38 @@
+import logging
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
 
 
 class ExercisesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "exercises"
+
+    def ready(self) -> None:
+        from exercises import signals  # noqa: F401
+
+
+def start_warmup() -> None:
+    """
+    Warms up the worker in the background if EXERCISES_WARMUP_ON_STARTUP is set.
+    Called by the WSGI and ASGI entry points once the apps are loaded, so management
+    commands don't warm up
+    """
+    if getattr(settings, "EXERCISES_WARMUP_ON_STARTUP", False):
+        threading.Thread(target=_warm_up, name="exercises-warmup", daemon=True).start()
+
+
+def _warm_up() -> None:
+    from exercises.services.warmup import warm_up
+
+    try:
+        warm_up()
+    except Exception:
+        # the worker works without it, just slower on its first requests
+        logger.exception("warmup failed")
+    finally:
+        connections.close_all()
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from exercises.services.snapshot import build_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Compile the active exercises and their points into the binary snapshot "
+        "that is served when EXERCISES_SNAPSHOT_FILE is set"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Where to write the snapshot (EXERCISES_SNAPSHOT_FILE)",
+        )
+
+    def handle(self, *args, **options):
+        path = options["output"] or getattr(settings, "EXERCISES_SNAPSHOT_FILE", None)
+        if not path:
+            raise CommandError("pass --output or set EXERCISES_SNAPSHOT_FILE")
+
+        info = build_snapshot(path)
+        self.stdout.write(
+            f"wrote {info.exercises} exercises and {info.points} points to "
+            f"{info.path} ({info.size / 2**20:.1f} MiB, generation {info.generation})"
+        )
@@ -0,0 +1,52 @@
+from uuid import UUID
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exercises.models import Exercise
+from exercises.services.service import ExerciseService
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive or delete exercises. Points are deleted in batches of set based "
+        "DELETEs, without loading them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="*", type=UUID, help="Exercises to delete")
+        parser.add_argument(
+            "--archived",
+            action="store_true",
+            help="Delete every archived exercise, in addition to the given ones",
+        )
+        parser.add_argument(
+            "--archive-only",
+            action="store_true",
+            help="Archive the exercises instead of deleting them",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Points deleted per statement (EXERCISES_DELETE_BATCH_SIZE)",
+        )
+
+    def handle(self, *args, **options):
+        ids = list(options["ids"])
+        if options["archived"]:
+            ids += Exercise.objects.filter(is_active=False).values_list("id", flat=True)
+
+        if not ids:
+            raise CommandError("no exercises given, pass their ids or --archived")
+        if options["batch_size"] is not None and options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        if options["archive_only"]:
+            archived = ExerciseService.archive_exercises(ids)
+            self.stdout.write(f"archived {archived} exercises")
+            return
+
+        result = ExerciseService.delete_exercises(ids, batch_size=options["batch_size"])
+        self.stdout.write(
+            f"deleted {result.exercises} exercises and {result.points} points"
+        )
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+
+from exercises.memory import RouteMemoryDto, load_reports
+
+
+def _mib(size: float) -> str:
+    return f"{size / 2**20:8.2f} MiB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the RSS of the workers, the allocation high-water marks of each route "
+        "and the requests that allocated the most, written by memory profiling"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--directory",
+            default=None,
+            help="Where the workers write their reports (EXERCISES_MEMORY_DIR)",
+        )
+        parser.add_argument(
+            "--top", type=int, default=10, help="Routes and requests listed"
+        )
+
+    def handle(self, *args, **options):
+        reports = load_reports(options["directory"])
+        if not reports:
+            self.stdout.write(
+                "no reports, is memory profiling on (SCHOLE_MEMORY_PROFILING=1)?"
+            )
+            return
+
+        self.stdout.write("workers")
+        for report in reports:
+            self.stdout.write(
+                f"  pid {report.pid:<8} rss {_mib(report.rss)}  "
+                f"max rss {_mib(report.max_rss)}  "
+                f"traced peak {_mib(report.traced_peak)}"
+            )
+
+        routes = {}
+        for report in reports:
+            for route in report.routes:
+                total = routes.setdefault(route.route, RouteMemoryDto(route.route))
+                total.requests += route.requests
+                total.peak_total += route.peak_total
+                total.peak_max = max(total.peak_max, route.peak_max)
+
+        self.stdout.write("routes by peak")
+        for route in sorted(
+            routes.values(), key=lambda route: route.peak_max, reverse=True
+        )[: options["top"]]:
+            self.stdout.write(
+                f"  {route.route or '/':<40} {route.requests:>8} requests  "
+                f"max {_mib(route.peak_max)}  mean {_mib(route.peak_mean)}"
+            )
+
+        worst = sorted(
+            (request for report in reports for request in report.worst),
+            key=lambda request: request.peak,
+            reverse=True,
+        )
+        self.stdout.write("worst requests")
+        for request in worst[: options["top"]]:
+            self.stdout.write(
+                f"  {_mib(request.peak)}  {request.method} {request.path}  "
+                f"{request.diff_file}"
+            )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from exercises.services.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Preload the exercise ordering, constraints and payloads into the cache, "
+        "and report how long each step took"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Exercises to preload, in navigation order (EXERCISES_WARMUP_LIMIT)",
+        )
+
+    def handle(self, *args, **options):
+        report = warm_up(limit=options["limit"])
+
+        for name, seconds in report.timings.items():
+            self.stdout.write(f"{name:<12} {seconds * 1000:8.1f} ms")
+        self.stdout.write(
+            f"warmed up {report.exercises} exercises in {report.total * 1000:.1f} ms"
+        )
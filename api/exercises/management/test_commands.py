@@ -0,0 +1,60 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from exercises.models import Exercise
+from exercises.models.range_exercise import ExerciseDataPoint
+from exercises.testing import create_exercise
+
+
+class DeleteExercisesCommandTest(TestCase):
+    def test_archive_then_delete_archived(self):
+        archived = create_exercise(5)
+        kept = create_exercise(2)
+        out = StringIO()
+
+        call_command("delete_exercises", str(archived.id), "--archive-only", stdout=out)
+        self.assertIn("archived 1 exercises", out.getvalue())
+        self.assertEqual(ExerciseDataPoint.objects.count(), 7)
+
+        call_command("delete_exercises", "--archived", "--batch-size=2", stdout=out)
+        self.assertIn("deleted 1 exercises and 5 points", out.getvalue())
+        self.assertEqual(list(Exercise.objects.values_list("id", flat=True)), [kept.id])
+
+    def test_requires_exercises(self):
+        with self.assertRaises(CommandError):
+            call_command("delete_exercises", stdout=StringIO())
+
+
+class WarmupCommandTest(TestCase):
+    def test_reports_timings(self):
+        create_exercise(3)
+        out = StringIO()
+
+        with self.assertLogs("exercises.services.warmup", "INFO"):
+            call_command("warmup", "--limit=5", stdout=out)
+
+        self.assertIn("connection", out.getvalue())
+        self.assertIn("warmed up 1 exercises", out.getvalue())
+
+
+class BuildSnapshotCommandTest(TestCase):
+    def test_writes_snapshot(self):
+        create_exercise(4)
+        out = StringIO()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "exercises.snapshot")
+            call_command("build_snapshot", f"--output={path}", stdout=out)
+            self.assertTrue(os.path.exists(path))
+
+        self.assertIn("wrote 1 exercises and 4 points", out.getvalue())
+
+    def test_requires_a_path(self):
+        with self.settings(EXERCISES_SNAPSHOT_FILE=None), self.assertRaises(
+            CommandError
+        ):
+            call_command("build_snapshot", stdout=StringIO())
@@ -0,0 +1,257 @@
+"""
+Opt-in memory instrumentation (EXERCISES_MEMORY_PROFILING).
+
+Every request is measured with tracemalloc: its peak of traced allocations is added to
+the stats of its route, and for the EXERCISES_MEMORY_WORST_REQUESTS requests with the
+highest peaks the allocations they left behind, which include the response and the
+data it was rendered from, are saved as a snapshot diff by line. Each worker writes
+its stats to EXERCISES_MEMORY_DIR, where `manage.py memory_report` reads them.
+
+tracemalloc slows everything down and the traced peak is process wide, so while
+profiling each worker serves one request at a time. Don't leave it on in production.
+"""
+
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+
+# lines of the snapshot diff saved for the worst requests
+DIFF_LINES = 25
+
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+@dataclass
+class RouteMemoryDto:
+    route: str
+    requests: int = 0
+    # peaks of traced allocations during the requests, in bytes
+    peak_max: int = 0
+    peak_total: int = 0
+
+    @property
+    def peak_mean(self) -> float:
+        return self.peak_total / self.requests if self.requests else 0
+
+
+@dataclass
+class WorstRequestDto:
+    peak: int
+    method: str
+    path: str
+    route: str
+    at: float
+    # snapshot diff of the allocations the request left behind
+    diff_file: Optional[str] = None
+
+
+@dataclass
+class WorkerMemoryDto:
+    pid: int
+    profiling: bool
+    rss: int
+    max_rss: int
+    traced_current: int = 0
+    traced_peak: int = 0
+    routes: List[RouteMemoryDto] = field(default_factory=list)
+    worst: List[WorstRequestDto] = field(default_factory=list)
+
+    @classmethod
+    def from_json(cls, data: dict) -> "WorkerMemoryDto":
+        return cls(
+            **{
+                **data,
+                "routes": [RouteMemoryDto(**route) for route in data["routes"]],
+                "worst": [WorstRequestDto(**request) for request in data["worst"]],
+            }
+        )
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # not Linux, the high-water mark is the best we have
+        return max_rss_bytes()
+
+
+def max_rss_bytes() -> int:
+    """Highest resident set size this process reached"""
+    # kibibytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def enabled() -> bool:
+    return getattr(settings, "EXERCISES_MEMORY_PROFILING", False)
+
+
+def directory() -> str:
+    return settings.EXERCISES_MEMORY_DIR
+
+
+class MemoryProfiler:
+    def __init__(self):
+        # serializes the requests of the worker, see the module docstring
+        self._request_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._routes: Dict[str, RouteMemoryDto] = {}
+        # highest peak first
+        self._worst: List[WorstRequestDto] = []
+        self._traced_peak = 0
+        self._last_dump = 0.0
+
+    @property
+    def worst_requests(self) -> int:
+        return getattr(settings, "EXERCISES_MEMORY_WORST_REQUESTS", 10)
+
+    def _is_worst(self, peak: int) -> bool:
+        return len(self._worst) < self.worst_requests or peak > self._worst[-1].peak
+
+    def measure(
+        self, request: HttpRequest, get_response: Callable[[HttpRequest], HttpResponse]
+    ) -> HttpResponse:
+        with self._request_lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(getattr(settings, "EXERCISES_MEMORY_FRAMES", 10))
+
+            before = tracemalloc.take_snapshot()
+            start, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+
+            response = get_response(request)
+
+            _, peak = tracemalloc.get_traced_memory()
+            # allocations of the request on top of what was already there
+            peak -= start
+            route = (
+                request.resolver_match.route
+                if request.resolver_match is not None
+                else request.path
+            )
+
+            worst = None
+            if self._is_worst(peak):
+                worst = WorstRequestDto(
+                    peak=peak,
+                    method=request.method or "",
+                    path=request.path,
+                    route=route,
+                    at=time.time(),
+                )
+                worst.diff_file = self._save_diff(before, worst)
+
+        self._record(route, peak, worst)
+        return response
+
+    def _save_diff(self, before: tracemalloc.Snapshot, worst: WorstRequestDto) -> str:
+        after = tracemalloc.take_snapshot()
+        stats = after.filter_traces(_SNAPSHOT_FILTERS).compare_to(
+            before.filter_traces(_SNAPSHOT_FILTERS), "lineno"
+        )
+
+        os.makedirs(directory(), exist_ok=True)
+        path = os.path.join(directory(), f"diff-{os.getpid()}-{time.time_ns()}.txt")
+        with open(path, "w", encoding="utf-8") as diff:
+            diff.write(
+                f"{worst.method} {worst.path} ({worst.route})\n"
+                f"peak {worst.peak} bytes of traced allocations\n\n"
+            )
+            for stat in stats[:DIFF_LINES]:
+                diff.write(f"{stat}\n")
+        return path
+
+    def _record(self, route: str, peak: int, worst: Optional[WorstRequestDto]) -> None:
+        with self._lock:
+            stats = self._routes.setdefault(route, RouteMemoryDto(route))
+            stats.requests += 1
+            stats.peak_total += peak
+            stats.peak_max = max(stats.peak_max, peak)
+            self._traced_peak = max(self._traced_peak, peak)
+
+            if worst is not None:
+                self._worst.append(worst)
+                self._worst.sort(key=lambda request: request.peak, reverse=True)
+                for evicted in self._worst[self.worst_requests :]:
+                    if evicted.diff_file is not None:
+                        try:
+                            os.remove(evicted.diff_file)
+                        except FileNotFoundError:
+                            pass
+                del self._worst[self.worst_requests :]
+
+            interval = getattr(settings, "EXERCISES_MEMORY_REPORT_INTERVAL", 10.0)
+            due = worst is not None or time.monotonic() - self._last_dump >= interval
+            if due:
+                self._last_dump = time.monotonic()
+
+        if due:
+            self.dump()
+
+    def report(self) -> WorkerMemoryDto:
+        traced_current = tracemalloc.get_traced_memory()[0]
+        rss = rss_bytes()
+        with self._lock:
+            return WorkerMemoryDto(
+                pid=os.getpid(),
+                profiling=enabled(),
+                rss=rss,
+                # the kernel updates the high-water mark lazily
+                max_rss=max(rss, max_rss_bytes()),
+                traced_current=traced_current,
+                traced_peak=self._traced_peak,
+                routes=sorted(
+                    (
+                        RouteMemoryDto(**asdict(route))
+                        for route in self._routes.values()
+                    ),
+                    key=lambda route: route.peak_max,
+                    reverse=True,
+                ),
+                worst=[WorstRequestDto(**asdict(request)) for request in self._worst],
+            )
+
+    def dump(self) -> None:
+        """Writes the report of the worker where `memory_report` finds it"""
+        os.makedirs(directory(), exist_ok=True)
+        path = os.path.join(directory(), f"worker-{os.getpid()}.json")
+        # written aside and renamed, so readers never see half a report
+        with open(f"{path}.tmp", "w", encoding="utf-8") as report:
+            json.dump(asdict(self.report()), report)
+        os.replace(f"{path}.tmp", path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routes.clear()
+            self._worst.clear()
+            self._traced_peak = 0
+
+
+memory_profiler = MemoryProfiler()
+
+
+def load_reports(path: Optional[str] = None) -> List[WorkerMemoryDto]:
+    """The last reports written by the workers"""
+    path = path or directory()
+    reports = []
+    if not os.path.isdir(path):
+        return reports
+    for name in sorted(os.listdir(path)):
+        if name.startswith("worker-") and name.endswith(".json"):
+            with open(os.path.join(path, name), encoding="utf-8") as report:
+                reports.append(WorkerMemoryDto.from_json(json.load(report)))
+    return reports
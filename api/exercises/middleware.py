@@ -0,0 +1,145 @@
+import logging
+import time
+from http import HTTPStatus
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, JsonResponse
+
+import schole
+from exercises import admission, memory, routers, tracing
+
+logger = logging.getLogger(__name__)
+
+
+class FirstResponseTimerMiddleware:
+    """
+    Logs how long the worker took to serve its first response, counted from when the
+    process started loading the project, and how much of it the request itself took
+    """
+
+    # once per process, even if there are several handlers (e.g. test clients)
+    reported = False
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if FirstResponseTimerMiddleware.reported:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        response = self.get_response(request)
+        end = time.perf_counter()
+
+        FirstResponseTimerMiddleware.reported = True
+        logger.info(
+            "first response after %.1f ms, %.1f ms of them serving %s %s",
+            (end - schole.STARTED_AT) * 1000,
+            (end - start) * 1000,
+            request.method,
+            request.path,
+        )
+        return response
+
+
+class TracingMiddleware:
+    """Starts the root span of the trace of each request, if it's sampled"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        with tracing.span(
+            f"HTTP {request.method}",
+            tracing.SpanKind.SERVER,
+            **{"http.method": request.method, "http.target": request.path},
+        ) as span:
+            response = self.get_response(request)
+
+            if span.recording:
+                span.set_attribute("http.status_code", response.status_code)
+                if request.resolver_match is not None:
+                    span.set_attribute("http.route", request.resolver_match.route)
+            return response
+
+
+class MemoryProfilingMiddleware:
+    """Measures the memory allocated by each request when memory profiling is on"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not memory.enabled():
+            return self.get_response(request)
+        return memory.memory_profiler.measure(request, self.get_response)
+
+
+class AdmissionControlMiddleware:
+    """
+    Limits the requests served at the same time by class, and answers with a 503 and
+    Retry-After the ones that can't be admitted in time
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        name = admission.classify(request)
+        if name is None:
+            return self.get_response(request)
+
+        controller = admission.controller()
+        span = tracing.current_span()
+        span.set_attribute("admission.class", name)
+        try:
+            waited = controller.acquire(name)
+        except admission.Rejected as e:
+            span.set_attribute("admission.rejected", e.reason)
+            response = JsonResponse(
+                {"error": str(e)}, status=HTTPStatus.SERVICE_UNAVAILABLE
+            )
+            response["Retry-After"] = str(e.policy.retry_after)
+            return response
+
+        span.set_attribute("admission.wait_ms", waited * 1000)
+        try:
+            return self.get_response(request)
+        finally:
+            controller.release(name)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Gives each request its own routing state, and pins the reads of a client to the
+    primary database for a while after it wrote, so it reads its own writes
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not routers.replicas():
+            return self.get_response(request)
+
+        try:
+            pinned_until = float(request.COOKIES.get(routers.STICKY_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+
+        token = routers.begin(pinned=pinned_until > time.time())
+        try:
+            response = self.get_response(request)
+        finally:
+            state = routers.end(token)
+
+        if state.wrote:
+            seconds = getattr(settings, "EXERCISES_REPLICA_STICKY_SECONDS", 5)
+            response.set_cookie(
+                routers.STICKY_COOKIE,
+                str(time.time() + seconds),
+                max_age=seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exercises", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExerciseStats",
+            fields=[
+                (
+                    "exercise",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="exercises.exercise",
+                    ),
+                ),
+                ("attempts", models.PositiveBigIntegerField(default=0)),
+                ("successes", models.PositiveBigIntegerField(default=0)),
+                ("min_y_sum", models.FloatField(default=0)),
+                ("min_y_sq_sum", models.FloatField(default=0)),
+                ("max_y_sum", models.FloatField(default=0)),
+                ("max_y_sq_sum", models.FloatField(default=0)),
+                ("lowest_min_y", models.FloatField(blank=True, null=True)),
+                ("highest_max_y", models.FloatField(blank=True, null=True)),
+            ],
+        ),
+    ]
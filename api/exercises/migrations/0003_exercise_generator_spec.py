@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exercises", "0002_exercise_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exercise",
+            name="generator_spec",
+            field=models.JSONField(
+                blank=True,
+                help_text="When set, the data points are generated from this spec instead of being stored",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:23
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def backfill_summary(apps, schema_editor):
+    Exercise = apps.get_model("exercises", "Exercise")
+    ExerciseDataPoint = apps.get_model("exercises", "ExerciseDataPoint")
+
+    summaries = (
+        ExerciseDataPoint.objects.values("exercise_id")
+        .annotate(
+            point_count=Count("id"),
+            min_x=Min("x"),
+            max_x=Max("x"),
+            min_y=Min("y"),
+            max_y=Max("y"),
+            total_size=Sum("size"),
+        )
+        .order_by()
+    )
+
+    for summary in summaries.iterator():
+        Exercise.objects.filter(id=summary.pop("exercise_id")).update(**summary)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exercises", "0003_exercise_generator_spec"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exercise",
+            name="max_x",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="exercise",
+            name="max_y",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="exercise",
+            name="min_x",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="exercise",
+            name="min_y",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="exercise",
+            name="point_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="exercise",
+            name="total_size",
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
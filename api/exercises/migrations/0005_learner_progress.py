@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:45
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exercises", "0004_exercise_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LearnerProgress",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("learner_id", models.UUIDField()),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("solved", models.BooleanField(default=False)),
+                ("solved_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="exercise",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["order", "id"],
+                name="exercise_active_order_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="learnerprogress",
+            name="exercise",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="progress",
+                to="exercises.exercise",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="learnerprogress",
+            constraint=models.UniqueConstraint(
+                fields=("learner_id", "exercise"), name="unique_learner_exercise"
+            ),
+        ),
+    ]
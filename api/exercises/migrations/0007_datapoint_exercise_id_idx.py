@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exercises", "0006_exercise_search"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="exercisedatapoint",
+            index=models.Index(
+                fields=["exercise", "id"], name="datapoint_exercise_id_idx"
+            ),
+        ),
+    ]
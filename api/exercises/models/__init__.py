@@ -1 +1,3 @@
 from .range_exercise import Exercise
+from .exercise_stats import ExerciseStats
+from .learner_progress import LearnerProgress
@@ -0,0 +1,22 @@
+from django.db import models
+
+from exercises.models.range_exercise import Exercise
+
+
+class ExerciseStats(models.Model):
+    """Aggregated evaluation counters for an exercise, updated incrementally"""
+
+    exercise = models.OneToOneField(
+        Exercise, primary_key=True, on_delete=models.CASCADE, related_name="stats"
+    )
+    attempts = models.PositiveBigIntegerField(default=0)
+    successes = models.PositiveBigIntegerField(default=0)
+
+    # running sums of the min/max y of each submitted solution, so the mean and
+    # standard deviation can be derived without keeping every attempt around
+    min_y_sum = models.FloatField(default=0)
+    min_y_sq_sum = models.FloatField(default=0)
+    max_y_sum = models.FloatField(default=0)
+    max_y_sq_sum = models.FloatField(default=0)
+    lowest_min_y = models.FloatField(null=True, blank=True)
+    highest_max_y = models.FloatField(null=True, blank=True)
@@ -0,0 +1,28 @@
+import uuid
+
+from django.db import models
+
+from exercises.models.range_exercise import Exercise
+
+
+class LearnerProgress(models.Model):
+    """A learner's attempts at an exercise, updated by each evaluation"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # learners aren't users, the client identifies them with an id of its own
+    learner_id = models.UUIDField()
+    exercise = models.ForeignKey(
+        Exercise, on_delete=models.CASCADE, related_name="progress"
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    solved = models.BooleanField(default=False)
+    solved_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # also the index looking up whether a learner solved an exercise
+            models.UniqueConstraint(
+                fields=["learner_id", "exercise"], name="unique_learner_exercise"
+            )
+        ]
@@ -4,6 +4,9 @@ import uuid
 from typing import TYPE_CHECKING, Never, cast
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.dispatch import Signal
+
+from exercises import tracing
 
 
 class ConstraintType(enum.StrEnum):
@@ -12,6 +15,55 @@ class ConstraintType(enum.StrEnum):
     BETWEEN = "between"
 
 
+class GeneratorDistribution(enum.StrEnum):
+    UNIFORM = "uniform"
+    NORMAL = "normal"
+
+
+# parameters of each coordinate: (low, high) for uniform and (mean, std) for normal
+GENERATOR_AXES = ("x", "y", "size")
+
+
+def validate_generator_spec(spec: dict) -> None:
+    """makes sure a generator spec can be used to generate the data points"""
+    if not isinstance(spec, dict):
+        raise ValidationError("generator spec should be an object")
+
+    try:
+        distribution = GeneratorDistribution(spec.get("distribution"))
+    except ValueError:
+        raise ValidationError(
+            f"unexpected generator distribution {spec.get('distribution')}"
+        )
+
+    # a generated exercise always has points, any seed is fine
+    for key, minimum, kind in (("seed", 0, "non-negative"), ("count", 1, "positive")):
+        value = spec.get(key)
+        if not isinstance(value, int) or isinstance(value, bool) or value < minimum:
+            raise ValidationError(f"generator {key} should be a {kind} integer")
+
+    for axis in GENERATOR_AXES:
+        params = spec.get(axis)
+        if (
+            not isinstance(params, (list, tuple))
+            or len(params) != 2
+            or not all(isinstance(p, (int, float)) for p in params)
+        ):
+            raise ValidationError(f"generator {axis} should be a pair of numbers")
+
+        match distribution:
+            case GeneratorDistribution.UNIFORM:
+                if params[0] > params[1]:
+                    raise ValidationError(
+                        f"generator {axis} low can't be greater than high"
+                    )
+            case GeneratorDistribution.NORMAL:
+                if params[1] < 0:
+                    raise ValidationError(
+                        f"generator {axis} standard deviation can't be negative"
+                    )
+
+
 def assert_never(arg: Never) -> Never:
     raise ValidationError(f"unexpected constraint_type {arg}")
 
@@ -34,11 +86,40 @@ class Exercise(models.Model):
     )
     upper_bound = models.FloatField(null=True, blank=True)
     lower_bound = models.FloatField(null=True, blank=True)
+    generator_spec = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="When set, the data points are generated from this spec instead "
+        "of being stored",
+    )
+
+    # summary of the data points, kept up to date whenever they change so it can be
+    # served without scanning them
+    point_count = models.PositiveIntegerField(default=0)
+    min_x = models.FloatField(null=True, blank=True)
+    max_x = models.FloatField(null=True, blank=True)
+    min_y = models.FloatField(null=True, blank=True)
+    max_y = models.FloatField(null=True, blank=True)
+    total_size = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            # the active exercises in navigation order, with their ids, so walking
+            # them never reads the table
+            models.Index(
+                fields=["order", "id"],
+                condition=models.Q(is_active=True),
+                name="exercise_active_order_idx",
+            ),
+        ]
 
     # this is for helping with type annotations/autocomplete since Django generates it on the fly
     if TYPE_CHECKING:
         data_points: models.QuerySet["ExerciseDataPoint"]
 
+    def __str__(self) -> str:
+        return self.title
+
     def clean(self) -> None:
         super().clean()
 
@@ -74,11 +155,35 @@ class Exercise(models.Model):
                 # exhaustiveness check
                 assert_never(unexpected)
 
+        if self.generator_spec is not None:
+            validate_generator_spec(self.generator_spec)
+
     def save(self, *args, **kwargs):
-        self.full_clean()
+        with tracing.span("Exercise.full_clean"):
+            self.full_clean()
         super().save(*args, **kwargs)
 
 
+# sent with the ids of the exercises whose points were deleted by the ORM, see signals.py
+data_points_deleted = Signal()
+
+
+class ExerciseDataPointQuerySet(models.QuerySet):
+    def delete(self, *, notify: bool = True):
+        """
+        Deletes the points, then sends `data_points_deleted` for their exercises.
+        Callers that keep the summary up to date themselves pass notify=False, which
+        leaves a plain QuerySet.delete
+        """
+        if not notify:
+            return super().delete()
+
+        exercise_ids = set(self.values_list("exercise_id", flat=True).distinct())
+        deleted = super().delete()
+        data_points_deleted.send(sender=self.model, exercise_ids=exercise_ids)
+        return deleted
+
+
 class ExerciseDataPoint(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     x = models.FloatField(help_text="x coordinate")
@@ -87,3 +192,19 @@ class ExerciseDataPoint(models.Model):
     exercise = models.ForeignKey(
         Exercise, on_delete=models.CASCADE, related_name="data_points"
     )
+
+    objects = ExerciseDataPointQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # the points of an exercise by id, so they can be paged by keyset. The
+            # foreign key keeps its own index: SQLite reads an exercise's points
+            # through it, which returns them in insertion order, and without it they
+            # would come back in (random) id order
+            models.Index(fields=["exercise", "id"], name="datapoint_exercise_id_idx"),
+        ]
+
+    def delete(self, *args, **kwargs):
+        deleted = super().delete(*args, **kwargs)
+        data_points_deleted.send(sender=type(self), exercise_ids={self.exercise_id})
+        return deleted
@@ -0,0 +1,108 @@
+"""
+Helpers to assert performance budgets (query count, traced allocations and wall time)
+in tests, so regressions like an N+1 query fail loudly instead of going unnoticed.
+"""
+
+import difflib
+import re
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+_VALUE_ROWS = re.compile(r"(\([?, ]+\))(?:, \1)+")
+# transaction control depends on how deeply the code under test is nested in atomic
+# blocks (e.g. TestCase wraps everything in one), so it doesn't count towards budgets
+_TRANSACTION_CONTROL = re.compile(
+    r"^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE SAVEPOINT)\b", re.IGNORECASE
+)
+
+
+@dataclass
+class Budget:
+    queries: int
+    max_kib: float
+    max_ms: float
+
+
+def normalize_sql(sql: str) -> str:
+    """replaces literals with placeholders, so repeated statements can be grouped"""
+    sql = _LITERALS.sub("?", sql)
+    return _VALUE_ROWS.sub(lambda m: f"{m.group(1)}, ...", sql)
+
+
+class PerformanceBudgetMixin:
+    """
+    Mixin for TestCase classes. Every measured block is also remembered by label, so
+    a query count mismatch can be shown as a diff against the queries issued by the
+    first (usually smallest) dataset size measured under the same label.
+    """
+
+    _reference_queries: Dict[str, List[str]]
+
+    def setUp(self):
+        super().setUp()  # type: ignore[misc]
+        self._reference_queries = {}
+
+    @contextmanager
+    def assertWithinBudget(self, label: str, budget: Budget) -> Iterator[None]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            with CaptureQueriesContext(connection) as ctx:
+                yield
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        queries = [
+            normalize_sql(q["sql"])
+            for q in ctx.captured_queries
+            if not _TRANSACTION_CONTROL.match(q["sql"])
+        ]
+        reference = self._reference_queries.setdefault(label.split("[")[0], queries)
+
+        if len(queries) != budget.queries:
+            self.fail(  # type: ignore[attr-defined]
+                self._describe_queries(label, budget.queries, queries, reference)
+            )
+
+        peak_kib = peak / 1024
+        if peak_kib > budget.max_kib:
+            self.fail(  # type: ignore[attr-defined]
+                f"{label}: traced allocations peaked at {peak_kib:.1f} KiB, "
+                f"budget is {budget.max_kib:.1f} KiB"
+            )
+
+        if elapsed_ms > budget.max_ms:
+            self.fail(  # type: ignore[attr-defined]
+                f"{label}: took {elapsed_ms:.1f} ms, budget is {budget.max_ms:.1f} ms"
+            )
+
+    @staticmethod
+    def _describe_queries(
+        label: str, expected: int, queries: List[str], reference: List[str]
+    ) -> str:
+        lines = [f"{label}: expected {expected} queries, {len(queries)} were issued"]
+
+        counts = Counter(queries)
+        for i, sql in enumerate(dict.fromkeys(queries), start=1):
+            repeated = f"  (x{counts[sql]}, possible N+1)" if counts[sql] > 1 else ""
+            lines.append(f"  {i}. {sql}{repeated}")
+
+        if reference is not queries:
+            lines.append("diff against the first measured dataset size:")
+            lines.extend(
+                difflib.unified_diff(
+                    reference, queries, "reference", label, lineterm="", n=1
+                )
+            )
+
+        return "\n".join(lines)
@@ -0,0 +1,103 @@
+"""
+Routes reads to the read replicas and writes to the primary (`default`) database.
+
+Reads stick to the primary once the current request has written, and for
+EXERCISES_REPLICA_STICKY_SECONDS after a request that wrote, through a cookie set by
+ReplicaRoutingMiddleware, so clients always read their own writes even while the
+replicas lag behind. Outside requests, e.g. in management commands, only reads in
+transactions go to the primary; wrap them in `begin`/`end` to stick after writes.
+
+Loads that fill the version-stamped caches read the primary explicitly, see
+ExerciseService._load_response: a lagging replica would otherwise store old rows
+under the new version, for every client.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = "schole_primary"
+
+
+@dataclass
+class RoutingState:
+    # reads go to the primary
+    pinned: bool = False
+    # something was written since the state was created
+    wrote: bool = False
+
+
+_state: ContextVar[Optional[RoutingState]] = ContextVar("routing_state", default=None)
+
+
+def replicas() -> List[str]:
+    return getattr(settings, "EXERCISES_REPLICA_DATABASES", [])
+
+
+def begin(pinned: bool = False) -> Token:
+    """Starts a new routing state, e.g. for a request, until `end` is called"""
+    return _state.set(RoutingState(pinned=pinned))
+
+
+def end(token: Token) -> RoutingState:
+    state = _state.get()
+    _state.reset(token)
+    assert state is not None
+    return state
+
+
+@contextmanager
+def unpinned() -> Iterator[None]:
+    """
+    Writes inside don't pin the client to the primary, for bookkeeping like stats
+    and progress that the client doesn't read back from this response on
+    """
+    state = _state.get()
+    if state is None:
+        yield
+        return
+
+    pinned, wrote = state.pinned, state.wrote
+    try:
+        yield
+    finally:
+        state.pinned, state.wrote = pinned, wrote
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints) -> str:
+        aliases = replicas()
+        if not aliases:
+            return DEFAULT_DB_ALIAS
+
+        # related objects are read from the database their instance came from
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db is not None:
+            return instance._state.db
+
+        state = _state.get()
+        if state is not None and state.pinned:
+            return DEFAULT_DB_ALIAS
+        # reads in a transaction of the primary have to see its uncommitted writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints) -> str:
+        # also used by select_for_update querysets
+        # outside requests there's no state to pin, setting one here would pin the
+        # thread (e.g. a whole management command) for good
+        state = _state.get()
+        if state is not None:
+            state.pinned = True
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        # the replicas are copies of the primary
+        return True
@@ -1,12 +1,30 @@
-from typing import List, cast
+import json
+from typing import Iterable, Iterator, List, Optional, Tuple, cast
+from uuid import UUID
+from django.urls import reverse
 from rest_framework import serializers
-from exercises.models.range_exercise import ConstraintType
+from rest_framework.utils.encoders import JSONEncoder
+from exercises.models.range_exercise import ConstraintType, GeneratorDistribution
 from exercises.services.service import (
+    CloneExercisesResultDto,
+    CloneTransformDto,
     CreateExerciseDto,
     CreateExerciseDataPointDto,
+    DataPointRow,
+    DeleteExercisesResultDto,
     ExerciseDataPointDto,
+    ExerciseListItemDto,
     ExerciseResponseDto,
+    ExerciseSummaryDto,
+    PatchExerciseDataPointsDto,
+    PatchExerciseDataPointsResultDto,
+    SolutionViolationsDto,
+    UpsertExerciseDataPointDto,
 )
+from exercises.services.generator import GeneratorSpecDto
+from exercises.services.search import ExerciseSearchPageDto
+from exercises.services.stats import ExerciseStatsDto, YDistributionDto
+from exercises.tracing import traced
 
 
 class ExerciseDataPointSerializer(serializers.Serializer):
@@ -31,6 +49,23 @@ class ExerciseDataPointCreateSerializer(serializers.Serializer):
     size = serializers.FloatField(min_value=0)
 
 
+class GeneratorSpecSerializer(serializers.Serializer):
+    distribution = serializers.ChoiceField(
+        choices=[d.value for d in GeneratorDistribution]
+    )
+    seed = serializers.IntegerField(min_value=0)
+    count = serializers.IntegerField(min_value=1, max_value=1_000_000)
+    x = serializers.ListField(
+        child=serializers.FloatField(), min_length=2, max_length=2
+    )
+    y = serializers.ListField(
+        child=serializers.FloatField(), min_length=2, max_length=2
+    )
+    size = serializers.ListField(
+        child=serializers.FloatField(), min_length=2, max_length=2
+    )
+
+
 class ExerciseCreateSerializer(serializers.Serializer):
     title = serializers.CharField(max_length=200)
     description = serializers.CharField()
@@ -40,7 +75,8 @@ class ExerciseCreateSerializer(serializers.Serializer):
     lower_bound = serializers.FloatField(required=False, allow_null=True)
     upper_bound = serializers.FloatField(required=False, allow_null=True)
     is_active = serializers.BooleanField(default=True)
-    points = ExerciseDataPointCreateSerializer(many=True)
+    generator = GeneratorSpecSerializer(required=False, allow_null=True)
+    points = ExerciseDataPointCreateSerializer(many=True, required=False)
 
 class ExerciseCreateManySerializer(serializers.Serializer):
     exercises = ExerciseCreateSerializer(many=True)
@@ -53,7 +89,10 @@ class ExerciseCreateManySerializer(serializers.Serializer):
         exercises = []
         for exercise in data["exercises"]:
             exercise["constraint_type"] = ConstraintType(exercise["constraint_type"])
-            points = exercise.pop("points")
+            points = exercise.pop("points", [])
+            generator = exercise.pop("generator", None)
+            if generator is not None:
+                exercise["generator"] = GeneratorSpecDto.from_json(generator)
             exercises.append(CreateExerciseDto(
                 **exercise,
                 points=[CreateExerciseDataPointDto(**point) for point in points]
@@ -62,6 +101,148 @@ class ExerciseCreateManySerializer(serializers.Serializer):
         return exercises
 
 
+class ExerciseSummarySerializer(serializers.Serializer):
+    point_count = serializers.IntegerField()
+    min_x = serializers.FloatField(allow_null=True)
+    max_x = serializers.FloatField(allow_null=True)
+    min_y = serializers.FloatField(allow_null=True)
+    max_y = serializers.FloatField(allow_null=True)
+    total_size = serializers.FloatField()
+
+    @classmethod
+    def from_dto(cls, dto: ExerciseSummaryDto) -> dict:
+        return {
+            "point_count": dto.point_count,
+            "min_x": dto.min_x,
+            "max_x": dto.max_x,
+            "min_y": dto.min_y,
+            "max_y": dto.max_y,
+            "total_size": dto.total_size,
+        }
+
+
+class ExerciseDataPointUpsertSerializer(serializers.Serializer):
+    id = serializers.UUIDField(
+        required=False,
+        help_text="Point to update. Points without an id, or with one the exercise "
+        "doesn't have, are created",
+    )
+    x = serializers.FloatField()
+    y = serializers.FloatField()
+    size = serializers.FloatField(min_value=0)
+
+
+class ExercisePatchSerializer(serializers.Serializer):
+    upsert = ExerciseDataPointUpsertSerializer(many=True, required=False)
+    delete = serializers.ListField(
+        child=serializers.UUIDField(),
+        required=False,
+        help_text="Ids of the points to delete",
+    )
+
+    def to_dto(self) -> PatchExerciseDataPointsDto:
+        assert isinstance(self.validated_data, dict)
+
+        return PatchExerciseDataPointsDto(
+            upsert=[
+                UpsertExerciseDataPointDto(**point)
+                for point in self.validated_data.get("upsert", [])
+            ],
+            delete=self.validated_data.get("delete", []),
+        )
+
+
+class ExercisePatchResponseSerializer(serializers.Serializer):
+    created = serializers.ListField(child=serializers.UUIDField())
+    updated = serializers.IntegerField()
+    deleted = serializers.IntegerField()
+    summary = ExerciseSummarySerializer()
+
+    @classmethod
+    def from_dto(cls, dto: PatchExerciseDataPointsResultDto) -> dict:
+        return {
+            "created": dto.created,
+            "updated": dto.updated,
+            "deleted": dto.deleted,
+            "summary": ExerciseSummarySerializer.from_dto(dto.summary),
+        }
+
+
+class ExerciseListQuerySerializer(serializers.Serializer):
+    after = serializers.IntegerField(
+        required=False,
+        help_text="Only return exercises after this order, to get the next page",
+    )
+    limit = serializers.IntegerField(default=100, min_value=1, max_value=1000)
+
+
+class ExerciseSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(
+        max_length=200, help_text="Words to find in the title or description"
+    )
+    cursor = serializers.CharField(
+        required=False, help_text="`next_cursor` of the previous page"
+    )
+    limit = serializers.IntegerField(default=20, min_value=1, max_value=100)
+
+
+class ExerciseListItemSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    order = serializers.IntegerField()
+    title = serializers.CharField()
+    constraint_type = serializers.CharField()
+    is_active = serializers.BooleanField()
+    summary = ExerciseSummarySerializer()
+
+    @classmethod
+    def from_dto(cls, dto: ExerciseListItemDto) -> dict:
+        return {
+            "id": dto.id,
+            "order": dto.order,
+            "title": dto.title,
+            "constraint_type": dto.constraint_type,
+            "is_active": dto.is_active,
+            "summary": ExerciseSummarySerializer.from_dto(dto.summary),
+        }
+
+
+class ExerciseSearchResponseSerializer(serializers.Serializer):
+    exercises = ExerciseListItemSerializer(many=True, help_text="Best match first")
+    next_cursor = serializers.CharField(
+        allow_null=True, help_text="Value of `cursor` to get the next page"
+    )
+
+    @classmethod
+    def from_dto(cls, dto: ExerciseSearchPageDto) -> dict:
+        return {
+            "exercises": [
+                ExerciseListItemSerializer.from_dto(exercise)
+                for exercise in dto.exercises
+            ],
+            "next_cursor": dto.next_cursor,
+        }
+
+
+class ExerciseListResponseSerializer(serializers.Serializer):
+    exercises = ExerciseListItemSerializer(many=True)
+    next_after = serializers.IntegerField(
+        allow_null=True, help_text="Value of `after` to get the next page"
+    )
+
+
+class ExerciseRetrieveQuerySerializer(serializers.Serializer):
+    stream = serializers.BooleanField(
+        default=False,
+        help_text="Stream the data points as they are read, keeping memory usage "
+        "flat for very large exercises",
+    )
+    seed = serializers.IntegerField(
+        required=False,
+        min_value=0,
+        help_text="Seed of the variant to generate, only for generated exercises",
+    )
+
+
 class ExerciseResponseSerializer(serializers.Serializer):
     id = serializers.UUIDField()
     order = serializers.IntegerField()
@@ -75,8 +256,11 @@ class ExerciseResponseSerializer(serializers.Serializer):
     created_at = serializers.DateTimeField()
     updated_at = serializers.DateTimeField()
     data_points = ExerciseDataPointSerializer(many=True)
+    generator = GeneratorSpecSerializer(allow_null=True)
+    summary = ExerciseSummarySerializer()
 
     @classmethod
+    @traced("ExerciseResponseSerializer.from_dto")
     def from_dto(cls, dto: ExerciseResponseDto) -> dict:
         """Convert DTO to serialized data"""
         return {
@@ -93,20 +277,252 @@ class ExerciseResponseSerializer(serializers.Serializer):
             "data_points": [
                 ExerciseDataPointSerializer.from_dto(dp) for dp in dto.data_points
             ],
+            "generator": (
+                dto.generator.to_json() if dto.generator is not None else None
+            ),
+            "summary": ExerciseSummarySerializer.from_dto(dto.summary),
         }
 
 
+    @classmethod
+    def stream_from_dto(
+        cls, dto: ExerciseResponseDto, chunks: Iterable[List[DataPointRow]]
+    ) -> Iterator[bytes]:
+        """
+        Renders the same JSON document as `from_dto`, but yields it piece by piece:
+        first the exercise fields, then each chunk of data points as it's read
+        """
+
+        def dumps(data) -> str:
+            return json.dumps(
+                data, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":")
+            )
+
+        header = cls.from_dto(dto)
+        header.pop("data_points")
+
+        # drop the closing brace so the points array can be appended to the object
+        yield (dumps(header)[:-1] + ',"data_points":[').encode()
+
+        separator = ""
+        for chunk in chunks:
+            points = dumps(
+                [
+                    {"id": id, "x": x, "y": y, "size": size}
+                    for id, x, y, size in chunk
+                ]
+            )
+            yield (separator + points[1:-1]).encode()
+            separator = ","
+
+        yield b"]}"
+
+
 class ExerciseManyResponseSerializer(serializers.Serializer):
     exercises = ExerciseResponseSerializer(many=True)
 
 
+class ExerciseIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.UUIDField(), min_length=1, max_length=1000
+    )
+
+
+class CloneTransformSerializer(serializers.Serializer):
+    x_scale = serializers.FloatField(default=1)
+    x_shift = serializers.FloatField(default=0)
+    y_scale = serializers.FloatField(default=1)
+    y_shift = serializers.FloatField(default=0)
+    size_scale = serializers.FloatField(default=1, min_value=0)
+    bound_scale = serializers.FloatField(
+        default=1,
+        help_text="Multiplies the bounds, has to be positive",
+    )
+    bound_shift = serializers.FloatField(default=0)
+
+
+class ExerciseCloneSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        min_length=1,
+        max_length=1000,
+        help_text="Exercises to clone, an id given several times is cloned as many "
+        "times",
+    )
+    transform = CloneTransformSerializer(
+        required=False,
+        help_text="Applied to the copies: x, y and size become value * scale + "
+        "shift, and so do the bounds",
+    )
+    title_suffix = serializers.CharField(
+        default=" (copy)", allow_blank=True, trim_whitespace=False, max_length=50
+    )
+
+    def to_dto(self) -> Tuple[List[UUID], CloneTransformDto, str]:
+        data = cast(dict, self.validated_data)
+        return (
+            data["ids"],
+            CloneTransformDto(**data.get("transform", {})),
+            data["title_suffix"],
+        )
+
+
+class ExerciseCloneResponseSerializer(serializers.Serializer):
+    exercises = ExerciseListItemSerializer(many=True)
+    points = serializers.IntegerField(help_text="Data points copied")
+
+    @classmethod
+    def from_dto(cls, dto: CloneExercisesResultDto) -> dict:
+        return {
+            "exercises": [
+                ExerciseListItemSerializer.from_dto(exercise)
+                for exercise in dto.exercises
+            ],
+            "points": dto.points,
+        }
+
+
+class ExerciseArchiveResponseSerializer(serializers.Serializer):
+    archived = serializers.IntegerField(help_text="Exercises that were active")
+
+
+class ExerciseDeleteResponseSerializer(serializers.Serializer):
+    exercises = serializers.IntegerField()
+    points = serializers.IntegerField()
+
+    @classmethod
+    def from_dto(cls, dto: DeleteExercisesResultDto) -> dict:
+        return {
+            "exercises": dto.exercises,
+            "points": dto.points,
+        }
+
+
 class EvaluateSolutionSerializer(serializers.Serializer):
     solution = ExerciseDataPointSerializer(many=True)
 
 
+class EvaluateQuerySerializer(serializers.Serializer):
+    stream = serializers.BooleanField(
+        default=False,
+        help_text="Parse the solution incrementally as the body is read, keeping "
+        "memory usage constant whatever the size of the solution",
+    )
+    feedback = serializers.ChoiceField(
+        choices=["indices", "ids", "runs", "bitset"],
+        required=False,
+        help_text="Also return which points are out of range: their indices in the "
+        "solution, their ids, (start, length) runs of consecutive indices, or a "
+        "base64 bitset with bit i % 8 of byte i // 8 set for point i. Runs and "
+        "bitsets stay small for large solutions",
+    )
+
+    learner = serializers.UUIDField(
+        required=False,
+        help_text="Id of the learner submitting the solution, to track their progress",
+    )
+
+    def validate(self, attrs):
+        if attrs["stream"] and "feedback" in attrs:
+            raise serializers.ValidationError(
+                "feedback is not available for streamed solutions"
+            )
+        return attrs
+
+
+class SolutionViolationsSerializer(serializers.Serializer):
+    count = serializers.IntegerField()
+    worst_margin = serializers.FloatField(allow_null=True)
+    indices = serializers.ListField(child=serializers.IntegerField(), required=False)
+    ids = serializers.ListField(child=serializers.UUIDField(), required=False)
+    runs = serializers.ListField(
+        child=serializers.ListField(
+            child=serializers.IntegerField(), min_length=2, max_length=2
+        ),
+        required=False,
+    )
+    bitset = serializers.CharField(required=False)
+
+    @classmethod
+    def from_dto(
+        cls,
+        dto: SolutionViolationsDto,
+        feedback: str,
+        solution: List[ExerciseDataPointDto],
+    ) -> dict:
+        res: dict = {"count": dto.count, "worst_margin": dto.worst_margin}
+        match feedback:
+            case "indices":
+                res["indices"] = dto.indices()
+            case "ids":
+                res["ids"] = [solution[i].id for i in dto.indices()]
+            case "runs":
+                res["runs"] = [list(run) for run in dto.runs()]
+            case "bitset":
+                res["bitset"] = dto.bitset()
+        return res
+
+
 class EvaluateSolutionResponseSerializer(serializers.Serializer):
     is_correct = serializers.BooleanField()
+    violations = SolutionViolationsSerializer(required=False)
 
 
 class NextExerciseSerializer(serializers.Serializer):
     id = serializers.UUIDField(allow_null=True)
+    url = serializers.CharField(
+        allow_null=True,
+        help_text="Immutable URL of the current version of the exercise when it was "
+        "already rendered, otherwise the exercise's URL, which links to it",
+    )
+
+    @classmethod
+    def from_id(cls, exercise_id: Optional[UUID]) -> dict:
+        # imported here, the payloads depend on the serializers
+        from exercises.services.payloads import cached_payload_url
+
+        if exercise_id is None:
+            return {"id": None, "url": None}
+        return {
+            "id": exercise_id,
+            "url": cached_payload_url(exercise_id)
+            or reverse("exercise-detail", kwargs={"pk": exercise_id}),
+        }
+
+
+class LearnerQuerySerializer(serializers.Serializer):
+    learner = serializers.UUIDField(help_text="Id the learner evaluates solutions with")
+
+
+class YDistributionSerializer(serializers.Serializer):
+    mean = serializers.FloatField(allow_null=True)
+    stddev = serializers.FloatField(allow_null=True)
+    extreme = serializers.FloatField(allow_null=True)
+
+    @classmethod
+    def from_dto(cls, dto: YDistributionDto) -> dict:
+        return {
+            "mean": dto.mean,
+            "stddev": dto.stddev,
+            "extreme": dto.extreme,
+        }
+
+
+class ExerciseStatsResponseSerializer(serializers.Serializer):
+    exercise_id = serializers.UUIDField()
+    attempts = serializers.IntegerField()
+    successes = serializers.IntegerField()
+    success_rate = serializers.FloatField(allow_null=True)
+    min_y = YDistributionSerializer()
+    max_y = YDistributionSerializer()
+
+    @classmethod
+    def from_dto(cls, dto: ExerciseStatsDto) -> dict:
+        return {
+            "exercise_id": dto.exercise_id,
+            "attempts": dto.attempts,
+            "successes": dto.successes,
+            "success_rate": dto.success_rate,
+            "min_y": YDistributionSerializer.from_dto(dto.min_y),
+            "max_y": YDistributionSerializer.from_dto(dto.max_y),
+        }
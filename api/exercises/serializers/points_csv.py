@@ -0,0 +1,131 @@
+"""
+Streaming parser for data point uploads in CSV or TSV, with a header row naming the
+x, y and size columns (in any order, other columns are ignored):
+
+    x,y,size
+    1.5,2,0.5
+
+Rows are decoded and yielded one at a time, so memory usage doesn't depend on the
+size of the file. Invalid rows are reported by line number once the whole file was
+read, up to MAX_ERRORS of them.
+"""
+
+import csv
+import io
+import math
+from typing import BinaryIO, Dict, Iterator, List
+
+from django.core.exceptions import ValidationError
+
+from exercises.services.service import CreateExerciseDataPointDto
+
+COLUMNS = ("x", "y", "size")
+
+# errors listed, the rest are only counted
+MAX_ERRORS = 20
+
+# a row is a handful of numbers, longer lines are rejected rather than buffered
+MAX_LINE_LENGTH = 64 * 1024
+
+
+class PointsCsvError(ValidationError):
+    pass
+
+
+def _lines(stream: BinaryIO) -> Iterator[str]:
+    """The decoded lines of `stream`, read in chunks by the text wrapper"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    line_number = 0
+    try:
+        while True:
+            line = text.readline(MAX_LINE_LENGTH)
+            if not line:
+                return
+            line_number += 1
+            if len(line) == MAX_LINE_LENGTH and not line.endswith(("\n", "\r")):
+                raise PointsCsvError(
+                    f"line {line_number}: longer than {MAX_LINE_LENGTH} characters"
+                )
+            yield line
+    except UnicodeDecodeError:
+        # lines are decoded a chunk at a time, so it's somewhere after this one
+        raise PointsCsvError(f"after line {line_number}: the file isn't UTF-8")
+    finally:
+        # closing the wrapper would close the upload
+        text.detach()
+
+
+def _header(row: List[str]) -> Dict[str, int]:
+    names = [name.strip().lower() for name in row]
+    missing = [column for column in COLUMNS if column not in names]
+    if missing:
+        raise PointsCsvError(
+            f"line 1: the header has no {', '.join(missing)} column, it has to name "
+            "the x, y and size columns"
+        )
+    return {column: names.index(column) for column in COLUMNS}
+
+
+def _value(row: List[str], index: int, column: str) -> float:
+    if index >= len(row):
+        raise ValueError(f"{column} is missing")
+    try:
+        value = float(row[index])
+    except ValueError:
+        raise ValueError(f"{column} is not a number: {row[index].strip()!r}")
+    if not math.isfinite(value):
+        raise ValueError(f"{column} has to be finite")
+    return value
+
+
+def parse_points_csv(stream: BinaryIO) -> Iterator[CreateExerciseDataPointDto]:
+    """
+    Yields the points of a CSV or TSV upload, see the module docstring. Raises
+    PointsCsvError with the errors of every invalid row after the last row
+    """
+    lines = _lines(stream)
+    first = next(lines, "")
+    if not first.strip():
+        raise PointsCsvError("line 1: the file is empty, it needs a header")
+
+    # TSV when the header has tabs, CSV otherwise
+    delimiter = "\t" if "\t" in first else ","
+    header = next(csv.reader([first], delimiter=delimiter), [])
+    columns = _header(header)
+
+    reader = csv.reader(lines, delimiter=delimiter)
+    errors: List[str] = []
+    error_count = 0
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            break
+        except csv.Error as e:
+            # the reader can't resync after malformed quoting
+            errors.append(f"line {reader.line_num + 1}: {e}")
+            error_count += 1
+            break
+
+        # reader.line_num counts the lines after the header
+        line_number = reader.line_num + 1
+        if not any(field.strip() for field in row):
+            continue
+
+        try:
+            x, y, size = (_value(row, columns[column], column) for column in COLUMNS)
+            if size < 0:
+                raise ValueError("size can't be negative")
+        except ValueError as e:
+            error_count += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append(f"line {line_number}: {e}")
+            continue
+
+        if not error_count:
+            yield CreateExerciseDataPointDto(x=x, y=y, size=size)
+
+    if error_count > len(errors):
+        errors.append(f"and {error_count - len(errors)} more invalid rows")
+    if errors:
+        raise PointsCsvError(errors)
@@ -0,0 +1,13 @@
+from rest_framework.renderers import JSONRenderer
+
+from exercises import tracing
+
+
+class TracedJSONRenderer(JSONRenderer):
+    """JSONRenderer that traces the rendering of each response"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with tracing.span("render json") as span:
+            body = super().render(data, accepted_media_type, renderer_context)
+            span.set_attribute("response.bytes", len(body))
+            return body
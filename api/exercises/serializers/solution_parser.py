@@ -0,0 +1,318 @@
+"""
+Incremental parser for evaluate request bodies of the form
+
+    {"solution": [{"id": "<uuid>", "x": 1.0, "y": 2.0, "size": 3.0}, ...]}
+
+It reads the body in chunks and only keeps the running count and min/max of y, so
+memory usage doesn't depend on the size of the solution and no object is built
+per point. It accepts the same points as EvaluateSolutionSerializer, coercing
+values like DRF's UUIDField and FloatField do: coordinates can also be numeric
+strings or booleans, and ids integers. Only the error messages differ, and a
+duplicated "solution" key is rejected where the serializer would keep the last one.
+"""
+
+import codecs
+import json
+import math
+import re
+import uuid
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+from django.core.exceptions import ValidationError
+
+from exercises.services.service import SolutionSummaryDto
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRING = re.compile(r'"((?:[^"\\\x00-\x1f]|\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4}))*)"')
+_STRING_PREFIX = re.compile(r'"(?:[^"\\\x00-\x1f]|\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4}))*')
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_NUMBER_CHARS = re.compile(r"[-+0-9.eE]*")
+_INTEGER = re.compile(r"-?\d+")
+_LITERAL = re.compile(r"true|false|null")
+_PUNCTUATION = "{}[]:,"
+
+# the longest token (e.g. a string in an ignored field) kept in memory while parsing
+MAX_TOKEN_LENGTH = 64 * 1024
+MAX_DEPTH = 32
+# the longest string accepted as a number, as in DRF's FloatField
+MAX_NUMBER_STRING_LENGTH = 1000
+
+POINT_FIELDS = ("id", "x", "y", "size")
+
+
+class SolutionParseError(ValidationError):
+    pass
+
+
+@dataclass
+class _Token:
+    kind: (
+        str  # one of the punctuation characters, "string", "number", "literal" or "eof"
+    )
+    text: str
+    position: int
+
+
+class _Tokenizer:
+    def __init__(self, stream: BinaryIO, chunk_size: int):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._offset = 0  # characters consumed before the start of the buffer
+        self._eof = False
+
+    def error(self, message: str, position: Optional[int] = None) -> SolutionParseError:
+        if position is None:
+            position = self._offset + self._pos
+        return SolutionParseError(f"{message} (at character {position})")
+
+    def _fill(self) -> bool:
+        """reads the next chunk, dropping what was already consumed from the buffer"""
+        if self._eof:
+            return False
+
+        try:
+            data = self._stream.read(self._chunk_size)
+            text = self._decoder.decode(data, final=not data)
+        except UnicodeDecodeError:
+            raise self.error("request body is not valid UTF-8")
+
+        self._eof = not data
+        self._offset += self._pos
+        self._buf = self._buf[self._pos :] + text
+        self._pos = 0
+
+        if len(self._buf) > MAX_TOKEN_LENGTH + self._chunk_size:
+            raise self.error(f"token longer than {MAX_TOKEN_LENGTH} characters")
+        return True
+
+    def next(self) -> _Token:
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            position = self._offset + self._pos
+
+            if self._pos == len(self._buf):
+                if self._fill():
+                    continue
+                return _Token("eof", "", position)
+
+            char = self._buf[self._pos]
+
+            if char in _PUNCTUATION:
+                self._pos += 1
+                return _Token(char, char, position)
+
+            if char == '"':
+                match = _STRING.match(self._buf, self._pos)
+                if match is None:
+                    prefix = _STRING_PREFIX.match(self._buf, self._pos)
+                    assert prefix is not None
+                    # the string may continue in the next chunk
+                    if len(self._buf) - prefix.end() < 6 and self._fill():
+                        continue
+                    raise self.error("invalid string", position)
+                self._pos = match.end()
+                return _Token("string", match.group(1), position)
+
+            if char == "-" or char.isdigit():
+                # a number may continue in the next chunk, even if what we have so far
+                # is valid (e.g. "1" from "1.5"), so wait for a character ending it
+                end = _NUMBER_CHARS.match(self._buf, self._pos).end()
+                if end == len(self._buf) and self._fill():
+                    continue
+                match = _NUMBER.match(self._buf, self._pos)
+                if match is None or match.end() != end:
+                    raise self.error("invalid number", position)
+                self._pos = match.end()
+                return _Token("number", match.group(), position)
+
+            if char in "tfn":
+                match = _LITERAL.match(self._buf, self._pos)
+                if match is None and len(self._buf) - self._pos < 5 and self._fill():
+                    continue
+                if match is None:
+                    raise self.error("invalid literal", position)
+                self._pos = match.end()
+                return _Token("literal", match.group(), position)
+
+            raise self.error(f"unexpected character {char!r}", position)
+
+
+class _Parser:
+    def __init__(self, tokenizer: _Tokenizer):
+        self._tokens = tokenizer
+        self.count = 0
+        self.min_y: Optional[float] = None
+        self.max_y: Optional[float] = None
+
+    def _error(self, message: str, token: _Token) -> SolutionParseError:
+        return self._tokens.error(message, token.position)
+
+    def _expect(self, kind: str, path: str) -> _Token:
+        token = self._tokens.next()
+        if token.kind != kind:
+            raise self._error(f"{path}: expected '{kind}'", token)
+        return token
+
+    def _first_item(self, closing: str) -> Optional[_Token]:
+        """after an opening bracket: the first item, or None if it's empty"""
+        token = self._tokens.next()
+        return None if token.kind == closing else token
+
+    def _next_item(self, closing: str, path: str) -> Optional[_Token]:
+        """after an item: the start of the next one, or None at the closing bracket"""
+        token = self._tokens.next()
+        if token.kind == closing:
+            return None
+        if token.kind != ",":
+            raise self._error(f"{path}: expected ',' or '{closing}'", token)
+        return self._tokens.next()
+
+    @staticmethod
+    def _string(token: _Token) -> str:
+        return json.loads(f'"{token.text}"') if "\\" in token.text else token.text
+
+    def _key(self, token: _Token, path: str) -> str:
+        if token.kind != "string":
+            raise self._error(f"{path}: expected a key", token)
+        key = self._string(token)
+        self._expect(":", f"{path}.{key}")
+        return key
+
+    def _check_uuid(self, token: _Token, path: str) -> None:
+        """validates an id like UUIDField: a UUID string or its integer value"""
+        if token.kind == "literal" and token.text == "null":
+            raise self._error(f"{path}: this field may not be null", token)
+        try:
+            if token.kind == "string":
+                uuid.UUID(hex=self._string(token))
+            elif token.kind == "number" and _INTEGER.fullmatch(token.text):
+                uuid.UUID(int=int(token.text))
+            # booleans are integers to Python, so UUIDField takes them as 0 and 1
+            elif token.kind != "literal":
+                raise ValueError
+        except ValueError:
+            raise self._error(f"{path}: must be a valid UUID", token)
+
+    def _number(self, token: _Token, path: str) -> float:
+        """converts a coordinate like FloatField: a number, numeric string or bool"""
+        if token.kind == "literal":
+            if token.text == "null":
+                raise self._error(f"{path}: this field may not be null", token)
+            return float(token.text == "true")
+
+        text = token.text if token.kind == "number" else ""
+        if token.kind == "string":
+            text = self._string(token)
+            if len(text) > MAX_NUMBER_STRING_LENGTH:
+                raise self._error(f"{path}: string value too large", token)
+        try:
+            number = float(text)
+        except ValueError:
+            number = math.nan
+
+        if not math.isfinite(number):
+            raise self._error(f"{path}: a valid number is required", token)
+        return number
+
+    def parse(self) -> None:
+        self._expect("{", "request body")
+        found_solution = False
+
+        token = self._first_item("}")
+        while token is not None:
+            key = self._key(token, "request body")
+
+            if key == "solution":
+                if found_solution:
+                    raise self._error("solution: duplicated key", token)
+                found_solution = True
+                self._parse_solution()
+            else:
+                self._skip(self._tokens.next(), key, 0)
+
+            token = self._next_item("}", "request body")
+
+        token = self._tokens.next()
+        if token.kind != "eof":
+            raise self._error("unexpected data after the request body", token)
+        if not found_solution:
+            raise self._error("solution: this field is required", token)
+
+    def _parse_solution(self) -> None:
+        token = self._tokens.next()
+        if token.kind == "literal" and token.text == "null":
+            raise self._error("solution: this field may not be null", token)
+        if token.kind != "[":
+            raise self._error("solution: expected a list of points", token)
+
+        item = self._first_item("]")
+        while item is not None:
+            self._parse_point(item, f"solution[{self.count}]")
+            item = self._next_item("]", "solution")
+
+    def _parse_point(self, token: _Token, path: str) -> None:
+        if token.kind != "{":
+            raise self._error(f"{path}: expected a point", token)
+
+        seen = set()
+        y = 0.0
+
+        item = self._first_item("}")
+        while item is not None:
+            key = self._key(item, path)
+            value = self._tokens.next()
+
+            if key == "id":
+                self._check_uuid(value, f"{path}.id")
+            elif key in POINT_FIELDS:
+                number = self._number(value, f"{path}.{key}")
+                if key == "y":
+                    y = number
+            else:
+                self._skip(value, f"{path}.{key}", 0)
+            seen.add(key)
+
+            item = self._next_item("}", path)
+
+        for field in POINT_FIELDS:
+            if field not in seen:
+                raise self._error(f"{path}.{field}: this field is required", token)
+
+        self.count += 1
+        self.min_y = y if self.min_y is None else min(self.min_y, y)
+        self.max_y = y if self.max_y is None else max(self.max_y, y)
+
+    def _skip(self, token: _Token, path: str, depth: int) -> None:
+        """consumes the value of a field that isn't used, validating its syntax"""
+        if token.kind in ("string", "number", "literal"):
+            return
+        if depth >= MAX_DEPTH:
+            raise self._error(f"{path}: nested too deeply", token)
+
+        if token.kind == "[":
+            item = self._first_item("]")
+            while item is not None:
+                self._skip(item, path, depth + 1)
+                item = self._next_item("]", path)
+        elif token.kind == "{":
+            item = self._first_item("}")
+            while item is not None:
+                self._key(item, path)
+                self._skip(self._tokens.next(), path, depth + 1)
+                item = self._next_item("}", path)
+        else:
+            raise self._error(f"{path}: expected a value", token)
+
+
+def parse_solution(stream: BinaryIO, chunk_size: int = 16 * 1024) -> SolutionSummaryDto:
+    """Parses an evaluate request body from `stream`, see the module docstring"""
+    parser = _Parser(_Tokenizer(stream, chunk_size))
+    parser.parse()
+
+    return SolutionSummaryDto(
+        count=parser.count, min_y=parser.min_y, max_y=parser.max_y
+    )
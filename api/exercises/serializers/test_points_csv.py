@@ -0,0 +1,99 @@
+import io
+
+from django.test import SimpleTestCase
+
+from exercises.serializers.points_csv import (
+    MAX_ERRORS,
+    PointsCsvError,
+    parse_points_csv,
+)
+from exercises.services.service import CreateExerciseDataPointDto
+
+
+def _parse(text: str, encoding: str = "utf-8"):
+    return list(parse_points_csv(io.BytesIO(text.encode(encoding))))
+
+
+class CountingStream(io.RawIOBase):
+    """An endless upload that counts the bytes read from it"""
+
+    def __init__(self):
+        self.read_bytes = 0
+        self._pending = b"x,y,size\n"
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while len(self._pending) < len(buffer):
+            self._pending += b"1,2,3\n"
+        buffer[:] = self._pending[: len(buffer)]
+        self._pending = self._pending[len(buffer) :]
+        self.read_bytes += len(buffer)
+        return len(buffer)
+
+
+class PointsCsvTest(SimpleTestCase):
+    def test_csv(self):
+        points = _parse("x,y,size\n1,2.5,3\n-1e2,0,0\n")
+
+        self.assertEqual(
+            points,
+            [
+                CreateExerciseDataPointDto(x=1, y=2.5, size=3),
+                CreateExerciseDataPointDto(x=-100, y=0, size=0),
+            ],
+        )
+
+    def test_tsv_with_any_column_order(self):
+        points = _parse("\ufeffSize\tlabel\ty\tx\r\n3\tfirst\t2\t1\r\n\r\n6\t\t5\t4")
+
+        self.assertEqual(
+            points,
+            [
+                CreateExerciseDataPointDto(x=1, y=2, size=3),
+                CreateExerciseDataPointDto(x=4, y=5, size=6),
+            ],
+        )
+
+    def test_errors_by_line(self):
+        with self.assertRaises(PointsCsvError) as cm:
+            _parse("x,y,size\n1,2,3\n\n1,a,3\n1,2\n1,2,-1\n1,inf,1\n")
+
+        self.assertEqual(
+            cm.exception.messages,
+            [
+                "line 4: y is not a number: 'a'",
+                "line 5: size is missing",
+                "line 6: size can't be negative",
+                "line 7: y has to be finite",
+            ],
+        )
+
+    def test_errors_are_capped(self):
+        with self.assertRaises(PointsCsvError) as cm:
+            _parse("x,y,size\n" + "a,1,1\n" * (MAX_ERRORS + 5))
+
+        self.assertEqual(len(cm.exception.messages), MAX_ERRORS + 1)
+        self.assertEqual(cm.exception.messages[-1], "and 5 more invalid rows")
+
+    def test_header(self):
+        with self.assertRaisesMessage(PointsCsvError, "the file is empty"):
+            _parse("")
+        with self.assertRaisesMessage(PointsCsvError, "line 1: the header has no size"):
+            _parse("x,y\n1,2\n")
+
+    def test_not_utf8(self):
+        with self.assertRaisesMessage(PointsCsvError, "the file isn't UTF-8"):
+            _parse("x,y,size\n1,2,3\n\xff", encoding="latin-1")
+
+    def test_streams(self):
+        """points are yielded as the upload is read, not after reading all of it"""
+        stream = CountingStream()
+        points = parse_points_csv(io.BufferedReader(stream))
+
+        for _ in range(10_000):
+            next(points)
+
+        # 10000 rows of 6 bytes, and at most a couple of chunks ahead
+        self.assertLess(stream.read_bytes, 100_000)
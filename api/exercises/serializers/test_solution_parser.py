@@ -0,0 +1,170 @@
+import io
+import json
+import tracemalloc
+from uuid import uuid4
+from django.test import SimpleTestCase
+
+from exercises.serializers.exercises import EvaluateSolutionSerializer
+from exercises.serializers.solution_parser import SolutionParseError, parse_solution
+
+
+def _body(points, **extra) -> io.BytesIO:
+    return io.BytesIO(json.dumps({"solution": points, **extra}).encode())
+
+
+def _point(y, **kwargs) -> dict:
+    return {"id": str(uuid4()), "x": 1, "y": y, "size": 2.5, **kwargs}
+
+
+class SolutionParserTest(SimpleTestCase):
+    def test_summary(self):
+        summary = parse_solution(_body([_point(3), _point(-1.5e2), _point(7.25)]))
+
+        self.assertEqual(summary.count, 3)
+        self.assertEqual(summary.min_y, -150)
+        self.assertEqual(summary.max_y, 7.25)
+
+    def test_every_chunk_boundary(self):
+        """tokens split across chunks are parsed the same as whole ones"""
+        body = json.dumps(
+            {
+                "extra": {"nested": [1, "two", None, True, {"a": "\\u00e9"}]},
+                "solution": [_point(-12.5e-1, note='café "x"\u00e9'), _point(40)],
+            },
+            ensure_ascii=False,
+        ).encode()
+
+        for chunk_size in range(1, 12):
+            with self.subTest(chunk_size=chunk_size):
+                summary = parse_solution(io.BytesIO(body), chunk_size=chunk_size)
+                self.assertEqual(
+                    (summary.count, summary.min_y, summary.max_y), (2, -1.25, 40)
+                )
+
+    def test_empty_solution(self):
+        summary = parse_solution(_body([]))
+        self.assertEqual(summary.count, 0)
+        self.assertIsNone(summary.min_y)
+
+    def test_errors(self):
+        cases = {
+            "missing solution": (b'{"points": []}', "solution: this field is required"),
+            "null solution": (b'{"solution": null}', "may not be null"),
+            "missing field": (
+                json.dumps(
+                    {"solution": [_point(1), {"id": str(uuid4()), "x": 1, "y": 2}]}
+                ),
+                "solution[1].size: this field is required",
+            ),
+            "invalid uuid": (
+                json.dumps({"solution": [_point(1, id="not-a-uuid")]}),
+                "solution[0].id: must be a valid UUID",
+            ),
+            "not a number": (
+                json.dumps({"solution": [_point("one")]}),
+                "solution[0].y: a valid number is required",
+            ),
+            "null number": (
+                json.dumps({"solution": [_point(None)]}),
+                "solution[0].y: this field may not be null",
+            ),
+            "trailing comma": (
+                '{"solution": [' + json.dumps(_point(1)) + ",]}",
+                "solution[1]: expected a point",
+            ),
+            "invalid number": (b'{"solution": [{"y": -x}]}', "invalid number"),
+            "trailing data": (b'{"solution": []} []', "unexpected data"),
+            "truncated": (b'{"solution": [', "expected a point"),
+            "not json": (b"solution=1", "unexpected character"),
+            "invalid utf-8": (b'{"solution": ["\xff"]}', "not valid UTF-8"),
+        }
+
+        for name, (body, message) in cases.items():
+            with self.subTest(name):
+                if isinstance(body, str):
+                    body = body.encode()
+                with self.assertRaisesMessage(SolutionParseError, message):
+                    parse_solution(io.BytesIO(body), chunk_size=4)
+
+    def test_error_position(self):
+        body = b'{"solution": [{"id": "1"}]}'
+        with self.assertRaisesMessage(SolutionParseError, "at character 21"):
+            parse_solution(io.BytesIO(body))
+
+    def test_validates_like_the_serializer(self):
+        """the same points are accepted as by EvaluateSolutionSerializer, same y"""
+        point_id = uuid4()
+        values = {
+            "number": {"y": -1.5e2},
+            "integer": {"y": 3},
+            "numeric string": {"y": "1.5"},
+            "padded string": {"y": " 2e3 "},
+            "escaped string": {"y": "\u0031"},
+            "true": {"y": True},
+            "false": {"x": False},
+            "long string": {"y": "1" * 1001},
+            "word": {"y": "one"},
+            "empty string": {"size": ""},
+            "nan string": {"y": "NaN"},
+            "infinity string": {"x": "-Infinity"},
+            "overflow": {"y": 1e308 * 10},
+            "null": {"size": None},
+            "list": {"y": [1]},
+            "object": {"x": {"value": 1}},
+            "hex id": {"id": point_id.hex},
+            "braced id": {"id": "{" + str(point_id) + "}"},
+            "urn id": {"id": point_id.urn},
+            "integer id": {"id": point_id.int},
+            "negative id": {"id": -1},
+            "float id": {"id": 1.0},
+            "bool id": {"id": True},
+            "null id": {"id": None},
+            "invalid id": {"id": "not-a-uuid"},
+        }
+
+        for name, fields in values.items():
+            with self.subTest(name):
+                solution = [_point(4), {**_point(0), **fields}]
+                try:
+                    body = json.dumps({"solution": solution}, allow_nan=False)
+                except ValueError:
+                    body = json.dumps({"solution": solution}).replace(
+                        "Infinity", "1e999"
+                    )
+
+                serializer = EvaluateSolutionSerializer(data=json.loads(body))
+                try:
+                    summary = parse_solution(io.BytesIO(body.encode()), chunk_size=5)
+                except SolutionParseError:
+                    self.assertFalse(serializer.is_valid())
+                    continue
+
+                self.assertTrue(serializer.is_valid(), serializer.errors)
+                ys = [point["y"] for point in serializer.validated_data["solution"]]
+                self.assertEqual((summary.min_y, summary.max_y), (min(ys), max(ys)))
+
+    def test_memory_does_not_grow_with_the_solution(self):
+        point = json.dumps(_point(1)).encode()
+
+        def points(n):
+            yield b'{"solution": ['
+            for i in range(n):
+                yield point if i == 0 else b"," + point
+            yield b"]}"
+
+        class Stream:
+            def __init__(self, chunks):
+                self._chunks = chunks
+
+            def read(self, _):
+                return next(self._chunks, b"")
+
+        peaks = []
+        for n in (100, 5000):
+            tracemalloc.start()
+            summary = parse_solution(Stream(points(n)))
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            self.assertEqual(summary.count, n)
+
+        self.assertLess(peaks[1], peaks[0] * 2)
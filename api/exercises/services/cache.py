@@ -0,0 +1,223 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.db import transaction
+
+T = TypeVar("T")
+
+_MISSING = object()
+
+# (kind, exercise id, version) of a load in flight
+_FlightKey = Tuple[str, UUID, int]
+
+
+class ExerciseCache:
+    """
+    Two tier cache for data derived from an exercise: a small in-process LRU in front
+    of a Django cache backend that is shared by every worker.
+
+    Entries are stamped with the exercise's version, which lives in the shared backend
+    and is bumped on every write, so invalidating an exercise only takes one write and
+    stale entries in other workers' LRUs are simply never matched again.
+
+    The LRU is bounded by entries and by the points they hold (the `point_count` of
+    the values that have one), so a worker doesn't grow with the size of exercises.
+
+    Misses are coalesced: while an entry is being loaded, other threads of the worker
+    missing the same entry wait for that load instead of running their own.
+    """
+
+    def __init__(
+        self,
+        alias: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        max_points: Optional[int] = None,
+    ):
+        self._alias = alias
+        self._max_entries = max_entries
+        self._max_points = max_points
+        self._lock = threading.Lock()
+        # (version, value, points) by (kind, exercise id)
+        self._local: OrderedDict[Tuple[str, UUID], Tuple[int, Any, int]] = OrderedDict()
+        self._points = 0
+        self._flights: Dict[_FlightKey, Future] = {}
+        self._last_stamp = 0
+
+    @property
+    def shared(self) -> BaseCache:
+        return caches[
+            self._alias or getattr(settings, "EXERCISES_CACHE_ALIAS", "exercises")
+        ]
+
+    @property
+    def max_entries(self) -> int:
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, "EXERCISES_CACHE_LRU_SIZE", 256)
+
+    @property
+    def max_points(self) -> int:
+        if self._max_points is not None:
+            return self._max_points
+        return getattr(settings, "EXERCISES_CACHE_LRU_POINTS", 500_000)
+
+    _GENERATION_KEY = "exercises:generation"
+
+    @staticmethod
+    def _version_key(exercise_id: UUID) -> str:
+        return f"exercise:{exercise_id}:version"
+
+    @staticmethod
+    def _entry_key(kind: str, exercise_id: UUID, version: int) -> str:
+        return f"exercise:{exercise_id}:{kind}:{version}"
+
+    def _counter(self, key: str) -> int:
+        value = self.shared.get(key)
+        if value is None:
+            # start from the current time rather than 0, so if the key is ever evicted
+            # the new value can't collide with the ones entries were stamped with
+            self.shared.add(key, time.time_ns(), timeout=None)
+            value = self.shared.get(key)
+        return value
+
+    def _bump(self, key: str) -> None:
+        # a fresh stamp rather than incr(): on backends like FileBasedCache incr is a
+        # read-modify-write, so concurrent bumps could both land on the same value,
+        # and it drops the timeout=None. Versions are only compared for equality, so
+        # any value that wasn't used before invalidates, whichever write wins
+        with self._lock:
+            # the clock can be coarser than back to back bumps
+            self._last_stamp = max(time.time_ns(), self._last_stamp + 1)
+            stamp = self._last_stamp
+        self.shared.set(key, stamp, timeout=None)
+
+    def version(self, exercise_id: UUID) -> int:
+        return self._counter(self._version_key(exercise_id))
+
+    def generation(self) -> int:
+        """Bumped together with the version of any exercise, e.g. by every write"""
+        return self._counter(self._GENERATION_KEY)
+
+    def _get_local(self, kind: str, exercise_id: UUID, version: int) -> Any:
+        local_key = (kind, exercise_id)
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is not None and entry[0] == version:
+                self._local.move_to_end(local_key)
+                return entry[1]
+        return _MISSING
+
+    def _join_flight(self, key: _FlightKey) -> Tuple[Future, bool]:
+        """the in-flight load of `key`, and whether the caller has to run it"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Future()
+            return flight, True
+
+    def _lead_flight(
+        self, key: _FlightKey, flight: Future, loader: Callable[[], T]
+    ) -> T:
+        """loads the entry for every caller waiting on `flight`"""
+        kind, exercise_id, version = key
+        try:
+            value = self._load(kind, exercise_id, version, loader)
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    def _load(
+        self, kind: str, exercise_id: UUID, version: int, loader: Callable[[], T]
+    ) -> T:
+        entry_key = self._entry_key(kind, exercise_id, version)
+        value = self.shared.get(entry_key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.shared.set(entry_key, value)
+
+        self._store_local((kind, exercise_id), version, value)
+        return value
+
+    @property
+    def flight_timeout(self) -> float:
+        return getattr(settings, "EXERCISES_CACHE_FLIGHT_TIMEOUT", 30)
+
+    def get_or_load(self, kind: str, exercise_id: UUID, loader: Callable[[], T]) -> T:
+        """
+        The cached entry, or the result of `loader`. Concurrent misses for the same
+        entry and version wait for a single load and share its result (or exception)
+        """
+        # read the version before loading, so a write that happens while loading
+        # leaves the result under the old version instead of serving it as new
+        version = self.version(exercise_id)
+
+        value = self._get_local(kind, exercise_id, version)
+        if value is not _MISSING:
+            return value
+
+        key = (kind, exercise_id, version)
+        flight, leader = self._join_flight(key)
+        if leader:
+            return self._lead_flight(key, flight, loader)
+
+        try:
+            return flight.result(timeout=self.flight_timeout)
+        except FutureTimeoutError:
+            # don't wait forever on a stuck load, do it ourselves instead
+            return self._load(kind, exercise_id, version, loader)
+
+    def get_stored(self, kind: str, exercise_id: UUID, version: int) -> Any:
+        """
+        The shared entry of a given version, e.g. an older one, without loading it.
+        None once the shared backend evicted it
+        """
+        return self.shared.get(self._entry_key(kind, exercise_id, version))
+
+    def _store_local(self, key: Tuple[str, UUID], version: int, value: Any) -> None:
+        points = getattr(value, "point_count", 0)
+        with self._lock:
+            previous = self._local.pop(key, None)
+            if previous is not None:
+                self._points -= previous[2]
+            if points > self.max_points:
+                # bigger than the whole LRU, it's only kept in the shared cache
+                return
+
+            self._local[key] = (version, value, points)
+            self._points += points
+            while len(self._local) > self.max_entries or self._points > self.max_points:
+                _, (_, _, evicted) = self._local.popitem(last=False)
+                self._points -= evicted
+
+    def invalidate(self, exercise_id: UUID) -> None:
+        self._bump(self._version_key(exercise_id))
+        self._bump(self._GENERATION_KEY)
+
+    def invalidate_on_commit(self, exercise_id: UUID) -> None:
+        """Invalidates now and again once the current transaction commits"""
+        self.invalidate(exercise_id)
+        # bump again once the transaction commits, otherwise another worker could cache
+        # the old rows under the new version before they are replaced
+        transaction.on_commit(lambda: self.invalidate(exercise_id))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._local.clear()
+            self._points = 0
+        self.shared.clear()
+
+
+exercise_cache = ExerciseCache()
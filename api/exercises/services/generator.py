@@ -0,0 +1,196 @@
+import functools
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, replace
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from django.conf import settings
+
+from exercises.models.range_exercise import (
+    GeneratorDistribution,
+    assert_never,
+    validate_generator_spec,
+)
+
+if TYPE_CHECKING:
+    # numpy is only needed by generated exercises, so it's imported on first use
+    import numpy as np
+
+    from exercises.services.service import ExerciseDataPointDto
+
+
+@dataclass(frozen=True)
+class GeneratorSpecDto:
+    distribution: GeneratorDistribution
+    seed: int
+    count: int
+    x: Tuple[float, float]
+    y: Tuple[float, float]
+    size: Tuple[float, float]
+
+    @classmethod
+    def from_json(cls, spec: dict) -> "GeneratorSpecDto":
+        validate_generator_spec(spec)
+        return cls(
+            distribution=GeneratorDistribution(spec["distribution"]),
+            seed=spec["seed"],
+            count=spec["count"],
+            x=(float(spec["x"][0]), float(spec["x"][1])),
+            y=(float(spec["y"][0]), float(spec["y"][1])),
+            size=(float(spec["size"][0]), float(spec["size"][1])),
+        )
+
+    def to_json(self) -> dict:
+        spec = asdict(self)
+        spec["distribution"] = self.distribution.value
+        spec["x"], spec["y"], spec["size"] = list(self.x), list(self.y), list(self.size)
+        return spec
+
+    def with_seed(self, seed: int) -> "GeneratorSpecDto":
+        return replace(self, seed=seed)
+
+    @functools.cached_property
+    def digest(self) -> str:
+        canonical = json.dumps(self.to_json(), sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class GeneratedPoints:
+    # ids are base ^ index, see generate_points
+    base: int
+    x: "np.ndarray"
+    y: "np.ndarray"
+    size: "np.ndarray"
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def _ids(self, start: int, end: int) -> Iterator[UUID]:
+        return (UUID(int=self.base ^ i) for i in range(start, end))
+
+    @property
+    def ids(self) -> List[UUID]:
+        """Built on every call, only the arrays are kept in the cache"""
+        return list(self._ids(0, len(self)))
+
+    def dtos(self) -> List["ExerciseDataPointDto"]:
+        """The points as DTOs, built on every call like `ids`"""
+        from exercises.services.service import ExerciseDataPointDto
+
+        return [
+            ExerciseDataPointDto(id=id, x=x, y=y, size=size)
+            for id, x, y, size in zip(
+                self._ids(0, len(self)),
+                self.x.tolist(),
+                self.y.tolist(),
+                self.size.tolist(),
+            )
+        ]
+
+    def rows(self, chunk_size: int) -> Iterator[List[Tuple[UUID, float, float, float]]]:
+        """yields (id, x, y, size) rows in chunks, like the ones read from the DB"""
+        for start in range(0, len(self), chunk_size):
+            end = min(start + chunk_size, len(self))
+            yield list(
+                zip(
+                    self._ids(start, end),
+                    self.x[start:end].tolist(),
+                    self.y[start:end].tolist(),
+                    self.size[start:end].tolist(),
+                )
+            )
+
+
+class _GeneratedPointsCache:
+    """
+    The arrays of recently used specs, least recently used first, evicted once they
+    hold more than EXERCISES_GENERATOR_CACHE_POINTS points in total
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[GeneratorSpecDto, GeneratedPoints]" = OrderedDict()
+        self._points = 0
+
+    @property
+    def max_points(self) -> int:
+        return getattr(settings, "EXERCISES_GENERATOR_CACHE_POINTS", 1_000_000)
+
+    def get(self, spec: GeneratorSpecDto) -> Optional[GeneratedPoints]:
+        with self._lock:
+            points = self._entries.get(spec)
+            if points is not None:
+                self._entries.move_to_end(spec)
+            return points
+
+    def put(self, spec: GeneratorSpecDto, points: GeneratedPoints) -> None:
+        if len(points) > self.max_points:
+            return
+        with self._lock:
+            if spec in self._entries:
+                return
+            self._entries[spec] = points
+            self._points += len(points)
+            while self._points > self.max_points:
+                _, evicted = self._entries.popitem(last=False)
+                self._points -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._points = 0
+
+
+_cache = _GeneratedPointsCache()
+
+
+def _sample(
+    rng: "np.random.Generator",
+    distribution: GeneratorDistribution,
+    params: Tuple[float, float],
+    count: int,
+) -> "np.ndarray":
+    match distribution:
+        case GeneratorDistribution.UNIFORM:
+            return rng.uniform(params[0], params[1], count)
+        case GeneratorDistribution.NORMAL:
+            return rng.normal(params[0], params[1], count)
+        case _ as unexpected:
+            assert_never(unexpected)  # exhaustiveness check
+
+
+def generate_points(spec: GeneratorSpecDto, cached: bool = True) -> GeneratedPoints:
+    """
+    Generates the data points described by `spec`. The same spec always produces
+    the same points and ids. The arrays of recently used specs are kept in memory
+    unless `cached` is False, e.g. for the variants of a seed chosen by the client
+    """
+    points = _cache.get(spec)
+    if points is not None:
+        return points
+
+    import numpy as np
+
+    rng = np.random.default_rng(spec.seed)
+
+    x = _sample(rng, spec.distribution, spec.x, spec.count)
+    y = _sample(rng, spec.distribution, spec.y, spec.count)
+    # bubbles can't have a negative size
+    size = np.maximum(_sample(rng, spec.distribution, spec.size, spec.count), 0)
+
+    for array in (x, y, size):
+        array.setflags(write=False)
+
+    # ids are derived from the spec, so they are stable across requests and workers
+    points = GeneratedPoints(base=int(spec.digest[:32], 16), x=x, y=y, size=size)
+    if cached:
+        _cache.put(spec, points)
+    return points
+
+
+def clear_cache() -> None:
+    _cache.clear()
@@ -0,0 +1,123 @@
+"""
+Content-addressed exercise payloads.
+
+The rendered JSON of each exercise version is addressed by the hash of its bytes, so
+it can be served from `/api/exercises/<id>/v/<digest>/` with a year long immutable
+Cache-Control: a new version gets a new URL, so browsers and CDNs never have to
+revalidate the old one.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+from uuid import UUID
+
+from django.urls import reverse
+
+from exercises.services.cache import exercise_cache
+from exercises.services.service import ExerciseService
+from exercises.tracing import traced
+
+# hex characters of the sha256 kept in the URLs
+DIGEST_LENGTH = 32
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@dataclass(frozen=True)
+class ExercisePayloadDto:
+    exercise_id: UUID
+    digest: str
+    body: bytes
+    # of the rendered exercise, bounds what the cache keeps in memory
+    point_count: int = 0
+
+    @property
+    def url(self) -> str:
+        return payload_url(self.exercise_id, self.digest)
+
+
+def payload_url(exercise_id: UUID, digest: str) -> str:
+    return reverse(
+        "exercise-retrieve-version", kwargs={"pk": exercise_id, "digest": digest}
+    )
+
+
+def _digest_key(exercise_id: UUID, digest: str) -> str:
+    # the version whose payload has the digest
+    return f"exercise:{exercise_id}:payload:{digest}"
+
+
+def _version_digest_key(exercise_id: UUID, version: int) -> str:
+    # the digest of the payload of the version
+    return f"exercise:{exercise_id}:payload-digest:{version}"
+
+
+def _render(exercise_id: UUID) -> ExercisePayloadDto:
+    # imported here, the serializers depend on the services
+    from exercises.serializers.exercises import ExerciseResponseSerializer
+    from exercises.serializers.renderers import TracedJSONRenderer
+
+    # read before rendering like get_or_load does, a write in between leaves the
+    # digest under the old version. Readers check the digest of what they find
+    version = exercise_cache.version(exercise_id)
+
+    # stored under the current version, like the response cache and the snapshot
+    # `get` reads from, which are both loaded from the primary database
+    exercise = ExerciseService.get(exercise_id)
+    body = TracedJSONRenderer().render(ExerciseResponseSerializer.from_dto(exercise))
+    digest = hashlib.sha256(body).hexdigest()[:DIGEST_LENGTH]
+
+    # the body itself is only stored in the versioned entry of get_payload, these map
+    # digests and versions to each other, so the URLs of older versions keep working
+    # while the shared cache has them and URLs can be built without rendering
+    exercise_cache.shared.set_many(
+        {
+            _digest_key(exercise_id, digest): version,
+            _version_digest_key(exercise_id, version): digest,
+        }
+    )
+    return ExercisePayloadDto(
+        exercise_id=exercise_id,
+        digest=digest,
+        body=body,
+        point_count=exercise.point_count,
+    )
+
+
+@traced()
+def get_payload(exercise_id: UUID) -> ExercisePayloadDto:
+    """The rendered current version of the exercise, rendered once per version"""
+    return exercise_cache.get_or_load(
+        "payload", exercise_id, lambda: _render(exercise_id)
+    )
+
+
+@traced()
+def get_payload_version(exercise_id: UUID, digest: str) -> Optional[bytes]:
+    """
+    The payload of the exercise with that digest, None when it isn't the current
+    version and is no longer stored. Raises ObjectDoesNotExist for exercises that
+    don't exist (anymore)
+    """
+    current = get_payload(exercise_id)
+    if current.digest == digest:
+        return current.body
+
+    version = exercise_cache.shared.get(_digest_key(exercise_id, digest))
+    if version is None:
+        return None
+    payload = exercise_cache.get_stored("payload", exercise_id, version)
+    if payload is None or payload.digest != digest:
+        return None
+    return payload.body
+
+
+def cached_payload_url(exercise_id: UUID) -> Optional[str]:
+    """
+    The immutable URL of the current version if it was rendered already, None
+    otherwise: it's never rendered just to build the URL
+    """
+    version = exercise_cache.version(exercise_id)
+    digest = exercise_cache.shared.get(_version_digest_key(exercise_id, version))
+    return payload_url(exercise_id, digest) if digest is not None else None
@@ -0,0 +1,193 @@
+"""
+Full-text search over the title and description of exercises.
+
+On SQLite the exercises are indexed in an FTS5 table kept in sync by triggers (see
+migration 0006 and ensure_search_index), and results are ranked with bm25. Databases without it fall back to
+matching every term with icontains, in navigation order.
+
+Results are paginated by keyset: the cursor holds the rank and order of the last
+result, so every page costs the same whatever its depth.
+"""
+
+import base64
+import binascii
+import json
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import connection, connections, transaction
+from django.db.models import Q
+
+from exercises.models import Exercise
+from exercises.services.service import ExerciseListItemDto
+
+FTS_TABLE = "exercises_exercise_fts"
+
+# the triggers of migration 0006, keeping the index in sync with exercises_exercise
+TRIGGERS = {
+    f"{FTS_TABLE}_insert": f"""
+        CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON exercises_exercise BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, description)
+            VALUES (new.rowid, new.title, new.description);
+        END
+    """,
+    f"{FTS_TABLE}_delete": f"""
+        CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON exercises_exercise BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.rowid, old.title, old.description);
+        END
+    """,
+    f"{FTS_TABLE}_update": f"""
+        CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF title, description
+        ON exercises_exercise
+        WHEN old.title IS NOT new.title OR old.description IS NOT new.description
+        BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.rowid, old.title, old.description);
+            INSERT INTO {FTS_TABLE}(rowid, title, description)
+            VALUES (new.rowid, new.title, new.description);
+        END
+    """,
+}
+
+_TERM = re.compile(r"\w+")
+
+# (rank, order) of the last result of a page, rank is None without FTS5
+_Keyset = Tuple[Optional[float], int]
+
+
+def terms(query: str) -> List[str]:
+    return _TERM.findall(query.lower())
+
+
+def encode_cursor(keyset: _Keyset) -> str:
+    return base64.urlsafe_b64encode(json.dumps(keyset).encode()).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> _Keyset:
+    try:
+        rank, order = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if (rank is not None and not isinstance(rank, (int, float))) or not isinstance(
+            order, int
+        ):
+            raise ValueError
+        return rank, order
+    except (ValueError, TypeError, binascii.Error, UnicodeError):
+        raise ValidationError("invalid cursor")
+
+
+@dataclass
+class ExerciseSearchPageDto:
+    # best match first
+    exercises: List[ExerciseListItemDto]
+    next_cursor: Optional[str]
+
+
+class Fts5SearchBackend:
+    @staticmethod
+    def _match_expression(query_terms: List[str]) -> str:
+        # every term has to match, the last one as a prefix since it may be incomplete
+        quoted = [f'"{term}"' for term in query_terms]
+        quoted[-1] += "*"
+        return " ".join(quoted)
+
+    def search(
+        self, query_terms: List[str], limit: int, after: Optional[_Keyset]
+    ) -> List[Tuple[Exercise, _Keyset]]:
+        columns = ", ".join(f'e."{field}"' for field in ExerciseListItemDto.FIELDS)
+        params: list = [self._match_expression(query_terms)]
+        keyset = ""
+        if after is not None:
+            keyset = 'AND (f.rank > %s OR (f.rank = %s AND e."order" > %s))'
+            params += [after[0], after[0], after[1]]
+
+        # rank is bm25 with the column weights configured on the table, lower is better
+        sql = f"""
+            SELECT {columns}, f.rank AS search_rank
+            FROM {FTS_TABLE} f
+            JOIN exercises_exercise e ON e.rowid = f.rowid
+            WHERE {FTS_TABLE} MATCH %s {keyset}
+            ORDER BY f.rank, e."order"
+            LIMIT %s
+        """
+        params.append(limit)
+
+        return [
+            (exercise, (exercise.search_rank, exercise.order))
+            for exercise in Exercise.objects.raw(sql, params)
+        ]
+
+
+class LikeSearchBackend:
+    def search(
+        self, query_terms: List[str], limit: int, after: Optional[_Keyset]
+    ) -> List[Tuple[Exercise, _Keyset]]:
+        exercises = Exercise.objects.only(*ExerciseListItemDto.FIELDS).order_by("order")
+        for term in query_terms:
+            exercises = exercises.filter(
+                Q(title__icontains=term) | Q(description__icontains=term)
+            )
+        if after is not None:
+            exercises = exercises.filter(order__gt=after[1])
+
+        return [(exercise, (None, exercise.order)) for exercise in exercises[:limit]]
+
+
+_fts5_available: Optional[bool] = None
+
+
+def backend() -> Fts5SearchBackend | LikeSearchBackend:
+    """FTS5 when the index exists, it's only created on SQLite builds supporting it"""
+    global _fts5_available
+    if _fts5_available is None:
+        _fts5_available = connection.vendor == "sqlite" and (
+            FTS_TABLE in connection.introspection.table_names()
+        )
+    return Fts5SearchBackend() if _fts5_available else LikeSearchBackend()
+
+
+def ensure_search_index(using: str) -> bool:
+    """
+    Recreates the triggers of the index and rebuilds it if any trigger is missing.
+    SQLite's schema editor rebuilds exercises_exercise for most changes to its
+    columns, which drops the triggers and renumbers the rowids the index refers to.
+    Runs after every migrate, returns whether the index had to be rebuilt
+    """
+    db = connections[using]
+    if db.vendor != "sqlite":
+        return False
+
+    with transaction.atomic(using=using), db.cursor() as cursor:
+        if FTS_TABLE not in db.introspection.table_names(cursor):
+            return False
+        cursor.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type = 'trigger' AND tbl_name = 'exercises_exercise'"
+        )
+        existing = {name for name, in cursor.fetchall()}
+        missing = [name for name in TRIGGERS if name not in existing]
+        if not missing:
+            return False
+
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def search_exercises(
+    query: str, limit: int, cursor: Optional[str] = None
+) -> ExerciseSearchPageDto:
+    query_terms = terms(query)
+    if not query_terms:
+        raise ValidationError("the query has to contain at least one word")
+
+    after = decode_cursor(cursor) if cursor is not None else None
+    results = backend().search(query_terms, limit, after)
+
+    return ExerciseSearchPageDto(
+        exercises=[ExerciseListItemDto.from_model(exercise) for exercise, _ in results],
+        next_cursor=encode_cursor(results[-1][1]) if len(results) == limit else None,
+    )
@@ -1,16 +1,57 @@
+import base64
 import datetime
-from typing import List, Optional, cast
-from dataclasses import dataclass, field
+from itertools import islice
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    cast,
+)
+from dataclasses import asdict, dataclass, field, replace
 from uuid import UUID, uuid4
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from django.db import transaction
-from django.db.models import Max
-from exercises.models import Exercise
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.conf import settings
+from django.utils import timezone
+from django.db import IntegrityError
+from django.db.models import Count, Exists, F, Max, Min, OuterRef, Sum
+from django.db.models.functions import Coalesce
+from exercises import routers
+from exercises.models import Exercise, LearnerProgress
 from exercises.models.range_exercise import (
     ExerciseDataPoint,
     ConstraintType,
     assert_never,
 )
+from exercises.models.exercise_stats import ExerciseStats
+from exercises.services.cache import exercise_cache
+from exercises.services.snapshot import snapshots
+from exercises.tracing import current_span, span, traced
+from exercises.services.generator import (
+    GeneratedPoints,
+    GeneratorSpecDto,
+    generate_points,
+)
+from exercises.services.stats import (
+    ExerciseStatsDelta,
+    ExerciseStatsDto,
+    stats_recorder,
+)
+
+if TYPE_CHECKING:
+    # numpy is imported on first use, see generator.py
+    import numpy as np
+
+# SQL generating a new UUID and the placeholder for a UUID parameter, on the databases
+# clone_exercises copies the points of inside the database
+_UUID_SQL = {
+    "sqlite": ("lower(hex(randomblob(16)))", "%s"),
+    "postgresql": ("gen_random_uuid()", "CAST(%s AS uuid)"),
+}
 
 
 @dataclass
@@ -36,10 +77,137 @@ class CreateExerciseDto:
     lower_bound: Optional[float] = None
     upper_bound: Optional[float] = None
     is_active: bool = True
+    generator: Optional[GeneratorSpecDto] = None
 
     points: List[CreateExerciseDataPointDto] = field(default_factory=list)
 
 
+@dataclass
+class UpsertExerciseDataPointDto:
+    """Updates the point with `id` if the exercise has it, otherwise creates it"""
+
+    x: float
+    y: float
+    size: float
+    id: Optional[UUID] = None
+
+
+@dataclass
+class PatchExerciseDataPointsDto:
+    upsert: List[UpsertExerciseDataPointDto] = field(default_factory=list)
+    delete: List[UUID] = field(default_factory=list)
+
+
+@dataclass
+class ExerciseSummaryDto:
+    point_count: int = 0
+    min_x: Optional[float] = None
+    max_x: Optional[float] = None
+    min_y: Optional[float] = None
+    max_y: Optional[float] = None
+    total_size: float = 0
+
+    @classmethod
+    def from_model(cls, exercise: Exercise) -> "ExerciseSummaryDto":
+        return cls(
+            point_count=exercise.point_count,
+            min_x=exercise.min_x,
+            max_x=exercise.max_x,
+            min_y=exercise.min_y,
+            max_y=exercise.max_y,
+            total_size=exercise.total_size,
+        )
+
+    @classmethod
+    def from_points(
+        cls, points: Sequence[CreateExerciseDataPointDto]
+    ) -> "ExerciseSummaryDto":
+        if not points:
+            return cls()
+
+        xs = [point.x for point in points]
+        ys = [point.y for point in points]
+        return cls(
+            point_count=len(points),
+            min_x=min(xs),
+            max_x=max(xs),
+            min_y=min(ys),
+            max_y=max(ys),
+            total_size=sum(point.size for point in points),
+        )
+
+    @classmethod
+    def from_generated(cls, points: GeneratedPoints) -> "ExerciseSummaryDto":
+        if not len(points):
+            return cls()
+
+        return cls(
+            point_count=len(points),
+            min_x=float(points.x.min()),
+            max_x=float(points.x.max()),
+            min_y=float(points.y.min()),
+            max_y=float(points.y.max()),
+            total_size=float(points.size.sum()),
+        )
+
+    def apply_diff(
+        self,
+        removed: Sequence[Tuple[float, float, float]],
+        added: Sequence[Tuple[float, float, float]],
+    ) -> Optional["ExerciseSummaryDto"]:
+        """
+        The summary after removing and adding (x, y, size) points, or None if it
+        can't be known without the other points: when a removed point was on an edge
+        of the bounding box, the new edge could be any of them
+        """
+        point_count = self.point_count - len(removed) + len(added)
+        if point_count == 0:
+            return ExerciseSummaryDto()
+
+        for x, y, _ in removed:
+            if x in (self.min_x, self.max_x) or y in (self.min_y, self.max_y):
+                return None
+
+        xs = [x for x, _, _ in added]
+        ys = [y for _, y, _ in added]
+        return ExerciseSummaryDto(
+            point_count=point_count,
+            min_x=min(xs + ([self.min_x] if self.min_x is not None else [])),
+            max_x=max(xs + ([self.max_x] if self.max_x is not None else [])),
+            min_y=min(ys + ([self.min_y] if self.min_y is not None else [])),
+            max_y=max(ys + ([self.max_y] if self.max_y is not None else [])),
+            total_size=self.total_size
+            - sum(size for _, _, size in removed)
+            + sum(size for _, _, size in added),
+        )
+
+
+@dataclass
+class ExerciseListItemDto:
+    id: UUID
+    order: int
+    title: str
+    constraint_type: ConstraintType
+    is_active: bool
+    summary: ExerciseSummaryDto
+
+    # the only columns needed to build the DTO, none of them requires a join
+    FIELDS = ("id", "order", "title", "constraint_type", "is_active") + tuple(
+        ExerciseSummaryDto.__dataclass_fields__
+    )
+
+    @classmethod
+    def from_model(cls, exercise: Exercise) -> "ExerciseListItemDto":
+        return cls(
+            id=exercise.id,
+            order=exercise.order,
+            title=exercise.title,
+            constraint_type=ConstraintType(exercise.constraint_type),
+            is_active=exercise.is_active,
+            summary=ExerciseSummaryDto.from_model(exercise),
+        )
+
+
 @dataclass
 class ExerciseResponseDto:
     id: UUID
@@ -53,9 +221,31 @@ class ExerciseResponseDto:
     created_at: datetime.datetime
     updated_at: datetime.datetime
     data_points: List[ExerciseDataPointDto]
+    generator: Optional[GeneratorSpecDto] = None
+    summary: ExerciseSummaryDto = field(default_factory=ExerciseSummaryDto)
 
     @classmethod
-    def from_model(cls, exercise: Exercise) -> "ExerciseResponseDto":
+    def from_model(
+        cls,
+        exercise: Exercise,
+        data_points: Optional[List[ExerciseDataPointDto]] = None,
+    ) -> "ExerciseResponseDto":
+        generator = (
+            GeneratorSpecDto.from_json(exercise.generator_spec)
+            if exercise.generator_spec is not None
+            else None
+        )
+
+        if data_points is None and generator is not None:
+            data_points = generate_points(generator).dtos()
+        elif data_points is None:
+            data_points = [
+                ExerciseDataPointDto(
+                    id=point.id, x=point.x, y=point.y, size=point.size
+                )
+                for point in exercise.data_points.all()
+            ]
+
         return cls(
             id=exercise.id,
             order=exercise.order,
@@ -67,17 +257,144 @@ class ExerciseResponseDto:
             is_active=exercise.is_active,
             created_at=exercise.created_at,
             updated_at=exercise.updated_at,
-            data_points=[
-                ExerciseDataPointDto(
-                    id=point.id, x=point.x, y=point.y, size=point.size
-                )
-                for point in exercise.data_points.all()
-            ],
+            data_points=data_points,
+            generator=generator,
+            summary=ExerciseSummaryDto.from_model(exercise),
+        )
+
+    @property
+    def point_count(self) -> int:
+        return len(self.data_points)
+
+    def with_variant(self, seed: Optional[int] = None) -> "ExerciseResponseDto":
+        """
+        Fills in the points of a generated exercise, optionally generating the
+        variant for another seed. Exercises with stored points are returned as is
+        """
+        if self.generator is None:
+            if seed is not None:
+                raise ValidationError("only generated exercises have variants")
+            return self
+
+        if seed is None:
+            return replace(self, data_points=generate_points(self.generator).dtos())
+
+        generator = self.generator.with_seed(seed)
+        # every seed is a new spec, caching them would let clients fill the cache
+        points = generate_points(generator, cached=False)
+        return replace(
+            self,
+            generator=generator,
+            data_points=points.dtos(),
+            summary=ExerciseSummaryDto.from_generated(points),
+        )
+
+
+@dataclass
+class PatchExerciseDataPointsResultDto:
+    created: List[UUID]  # ids of the created points, in the order they were sent
+    updated: int
+    deleted: int
+    summary: ExerciseSummaryDto
+
+
+@dataclass
+class DeleteExercisesResultDto:
+    exercises: int
+    points: int
+
+
+@dataclass
+class CloneTransformDto:
+    """Applied to the copies: points become `value * scale + shift`, so do the bounds"""
+
+    x_scale: float = 1
+    x_shift: float = 0
+    y_scale: float = 1
+    y_shift: float = 0
+    size_scale: float = 1
+    bound_scale: float = 1
+    bound_shift: float = 0
+
+    @property
+    def moves_points(self) -> bool:
+        scales = (self.x_scale, self.y_scale, self.size_scale)
+        return scales != (1, 1, 1) or (self.x_shift, self.y_shift) != (0, 0)
+
+
+@dataclass
+class CloneExercisesResultDto:
+    # the copies, in the order of the exercises they were cloned from
+    exercises: List["ExerciseListItemDto"]
+    points: int
+
+
+@dataclass
+class SolutionSummaryDto:
+    """The only parts of a solution needed to evaluate it"""
+
+    count: int
+    min_y: Optional[float]
+    max_y: Optional[float]
+
+
+@dataclass
+class SolutionViolationsDto:
+    """Which points of a solution are out of the exercise's range"""
+
+    # True for each violating point, in the order of the solution
+    mask: "np.ndarray"
+    count: int
+    # how far the worst violating point is past the bound
+    worst_margin: Optional[float]
+
+    @property
+    def is_correct(self) -> bool:
+        return self.count == 0
+
+    def indices(self) -> List[int]:
+        import numpy as np
+
+        return np.flatnonzero(self.mask).tolist()
+
+    def runs(self) -> List[Tuple[int, int]]:
+        """The violating points as (start, length) runs of consecutive indices"""
+        import numpy as np
+
+        edges = np.flatnonzero(np.diff(self.mask, prepend=False, append=False))
+        starts, ends = edges[0::2], edges[1::2]
+        return list(zip(starts.tolist(), (ends - starts).tolist()))
+
+    def bitset(self) -> str:
+        """The mask as a base64 bitset, bit i % 8 of byte i // 8 is point i"""
+        import numpy as np
+
+        return base64.b64encode(
+            np.packbits(self.mask, bitorder="little").tobytes()
+        ).decode("ascii")
+
+
+@dataclass
+class ExerciseConstraintDto:
+    constraint_type: ConstraintType
+    lower_bound: Optional[float]
+    upper_bound: Optional[float]
+
+    @classmethod
+    def from_model(cls, exercise: Exercise) -> "ExerciseConstraintDto":
+        return cls(
+            constraint_type=ConstraintType(exercise.constraint_type),
+            lower_bound=exercise.lower_bound,
+            upper_bound=exercise.upper_bound,
         )
 
 
+DataPointRow = Tuple[UUID, float, float, float]
+
+
 class ExerciseService:
     @staticmethod
+    @traced()
     def _get_next_exercise_order() -> int:
         """Get the next order value for exercises, preventing a race condition"""
         max_order = Exercise.objects.select_for_update().aggregate(  # lock DB to prevent a race condition
@@ -88,30 +405,152 @@ class ExerciseService:
         return (max_order or 0) + 1
 
     @staticmethod
-    def get(exercise_id: UUID) -> ExerciseResponseDto:
+    def _load_response(exercise_id: UUID) -> ExerciseResponseDto:
         try:
-            exercise = Exercise.objects.prefetch_related("data_points").get(
-                id=exercise_id
+            # the result is cached under the current version, which a lagging replica
+            # could still have the previous row for
+            exercise = Exercise.objects.using(DEFAULT_DB_ALIAS).get(id=exercise_id)
+        except Exercise.DoesNotExist:
+            raise ObjectDoesNotExist(f"Exercise with id {exercise_id} not found")
+
+        # generated points are cheaper to generate again than to store in the cache
+        if exercise.generator_spec is not None:
+            return ExerciseResponseDto.from_model(exercise, data_points=[])
+        return ExerciseResponseDto.from_model(exercise)
+
+    @staticmethod
+    @traced()
+    def get(exercise_id: UUID, seed: Optional[int] = None) -> ExerciseResponseDto:
+        snapshot = snapshots.current()
+        if snapshot is not None:
+            exercise = snapshot.get(exercise_id)
+            if exercise is not None:
+                return exercise.with_variant(seed)
+
+        exercise = exercise_cache.get_or_load(
+            "response", exercise_id, lambda: ExerciseService._load_response(exercise_id)
+        )
+        exercise = exercise.with_variant(seed)
+        current_span().set_attribute("point_count", len(exercise.data_points))
+        return exercise
+
+    @staticmethod
+    @traced()
+    def _get_constraint(exercise_id: UUID) -> ExerciseConstraintDto:
+        snapshot = snapshots.current()
+        if snapshot is not None:
+            constraint = snapshot.get_constraint(exercise_id)
+            if constraint is not None:
+                return constraint
+
+        def load() -> ExerciseConstraintDto:
+            return ExerciseConstraintDto.from_model(
+                # from the primary, like _load_response
+                Exercise.objects.using(DEFAULT_DB_ALIAS)
+                .only("constraint_type", "lower_bound", "upper_bound")
+                .get(id=exercise_id)
             )
-            return ExerciseResponseDto.from_model(exercise)
+
+        return exercise_cache.get_or_load("constraint", exercise_id, load)
+
+    @staticmethod
+    @traced()
+    def get_streaming(
+        exercise_id: UUID, chunk_size: Optional[int] = None, seed: Optional[int] = None
+    ) -> Tuple[ExerciseResponseDto, Iterator[List[DataPointRow]]]:
+        """
+        Returns the exercise without its data points, and a lazy iterator that reads
+        the points in chunks of (id, x, y, size) rows, so that they never have to be
+        held in memory all at once
+        """
+        try:
+            exercise = Exercise.objects.get(id=exercise_id)
         except Exercise.DoesNotExist:
             raise ObjectDoesNotExist(f"Exercise with id {exercise_id} not found")
 
+        if chunk_size is None:
+            chunk_size = getattr(settings, "EXERCISES_STREAM_CHUNK_SIZE", 2000)
+
+        def chunks() -> Iterator[List[DataPointRow]]:
+            rows = (
+                ExerciseDataPoint.objects.filter(exercise_id=exercise_id)
+                .values_list("id", "x", "y", "size")
+                .iterator(chunk_size=chunk_size)
+            )
+            chunk: List[DataPointRow] = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        header = ExerciseResponseDto.from_model(exercise, data_points=[])
+
+        if header.generator is not None:
+            if seed is None:
+                return header, generate_points(header.generator).rows(chunk_size)
+
+            generator = header.generator.with_seed(seed)
+            points = generate_points(generator, cached=False)
+            header = replace(
+                header,
+                generator=generator,
+                summary=ExerciseSummaryDto.from_generated(points),
+            )
+            return header, points.rows(chunk_size)
+        if seed is not None:
+            raise ValidationError("only generated exercises have variants")
+
+        return header, chunks()
+
     @staticmethod
+    @traced()
+    def list(
+        after_order: Optional[int] = None, limit: int = 100
+    ) -> List[ExerciseListItemDto]:
+        """Exercises ordered by `order`, without their points, paginated by keyset"""
+        exercises = Exercise.objects.only(*ExerciseListItemDto.FIELDS).order_by("order")
+
+        if after_order is not None:
+            exercises = exercises.filter(order__gt=after_order)
+
+        return [
+            ExerciseListItemDto.from_model(exercise) for exercise in exercises[:limit]
+        ]
+
+    @staticmethod
+    @traced()
     def get_first() -> ExerciseResponseDto:
-        exercise = (
-            Exercise.objects.prefetch_related("data_points")
+        snapshot = snapshots.current()
+        if snapshot is not None:
+            exercise_id = snapshot.first_id()
+            if exercise_id is None:
+                raise ObjectDoesNotExist(f"could not find any exercise")
+            return ExerciseService.get(exercise_id)
+
+        exercise_id = (
+            Exercise.objects.filter(is_active=True)
             .order_by("order")
+            .values_list("id", flat=True)
             .first()
         )
 
-        if exercise is None:
+        if exercise_id is None:
             raise ObjectDoesNotExist(f"could not find any exercise")
 
-        return ExerciseResponseDto.from_model(exercise)
+        return ExerciseService.get(exercise_id)
 
     @staticmethod
+    @traced()
     def get_next(exercise_id: UUID) -> UUID | None:
+        snapshot = snapshots.current()
+        if snapshot is not None:
+            found, next_id = snapshot.next_id(exercise_id)
+            if found:
+                return next_id
+
         current = Exercise.objects.get(id=exercise_id)
 
         if current is None:
@@ -119,7 +558,7 @@ class ExerciseService:
 
         next = (
             Exercise.objects.prefetch_related("data_points")
-            .filter(order__gt=current.order)
+            .filter(order__gt=current.order, is_active=True)
             .order_by("order")
             .values_list("id", flat=True)
             .first()
@@ -128,13 +567,47 @@ class ExerciseService:
         return next
 
     @staticmethod
+    @traced()
+    def get_stats(exercise_id: UUID) -> ExerciseStatsDto:
+        """Stats for an exercise, including counters not yet flushed by this worker"""
+        stats = ExerciseStats.objects.filter(exercise_id=exercise_id).first()
+
+        if stats is None:
+            if not Exercise.objects.filter(id=exercise_id).exists():
+                raise ObjectDoesNotExist(f"Exercise with id {exercise_id} not found")
+            delta = ExerciseStatsDelta()
+        else:
+            delta = ExerciseStatsDelta.from_model(stats)
+
+        pending = stats_recorder.pending(exercise_id)
+        if pending is not None:
+            delta = delta.merge(pending)
+
+        return ExerciseStatsDto.from_delta(exercise_id, delta)
+
+    @staticmethod
+    @traced()
     def create_exercises(
         exercises_req: List[CreateExerciseDto],
     ) -> List[ExerciseResponseDto]:
         exercises: List[ExerciseResponseDto] = []
+        current_span().set_attribute("exercise_count", len(exercises_req))
 
         with transaction.atomic():
             for exercise_req in exercises_req:
+                if exercise_req.generator is not None and exercise_req.points:
+                    raise ValidationError(
+                        "an exercise can either have points or a generator, not both"
+                    )
+
+                summary = (
+                    ExerciseSummaryDto.from_generated(
+                        generate_points(exercise_req.generator)
+                    )
+                    if exercise_req.generator is not None
+                    else ExerciseSummaryDto.from_points(exercise_req.points)
+                )
+
                 # TODO: allow exercise reordering, maybe on a separate endpoint
                 order = ExerciseService._get_next_exercise_order()
 
@@ -147,9 +620,16 @@ class ExerciseService:
                     description=exercise_req.description,
                     is_active=exercise_req.is_active,
                     order=order,
+                    generator_spec=(
+                        exercise_req.generator.to_json()
+                        if exercise_req.generator is not None
+                        else None
+                    ),
+                    **asdict(summary),
                 )
 
-                exercise.save()
+                with span("Exercise.save"):
+                    exercise.save()
 
                 points = [
                     ExerciseDataPoint(
@@ -161,29 +641,685 @@ class ExerciseService:
                     for point in exercise_req.points
                 ]
 
-                ExerciseDataPoint.objects.bulk_create(points)
+                with span("ExerciseDataPoint.bulk_create", point_count=len(points)):
+                    ExerciseDataPoint.objects.bulk_create(points)
 
-                exercise.refresh_from_db()
+                with span("Exercise.refresh_from_db"):
+                    exercise.refresh_from_db()
 
                 exercises.append(ExerciseResponseDto.from_model(exercise))
 
         return exercises
 
     @staticmethod
+    @traced()
+    def _compute_summary(exercise_id: UUID) -> ExerciseSummaryDto:
+        summary = ExerciseDataPoint.objects.filter(exercise_id=exercise_id).aggregate(
+            point_count=Count("id"),
+            min_x=Min("x"),
+            max_x=Max("x"),
+            min_y=Min("y"),
+            max_y=Max("y"),
+            total_size=Sum("size"),
+        )
+        summary["total_size"] = summary["total_size"] or 0
+        return ExerciseSummaryDto(**summary)
+
+    @staticmethod
+    @traced()
+    def refresh_summary(exercise_id: UUID) -> None:
+        """
+        Recomputes the summary of an exercise from its stored points. Needed after
+        mutations whose effect on the summary can't be derived incrementally
+        """
+        summary = ExerciseService._compute_summary(exercise_id)
+
+        # generated exercises have no stored points, their summary never changes
+        Exercise.objects.filter(id=exercise_id, generator_spec__isnull=True).update(
+            **asdict(summary)
+        )
+        exercise_cache.invalidate(exercise_id)
+
+    @staticmethod
+    @traced()
+    def patch_data_points(
+        exercise_id: UUID, patch: PatchExerciseDataPointsDto
+    ) -> PatchExerciseDataPointsResultDto:
+        """
+        Applies point level upserts and deletes to an exercise. Only the points in the
+        patch are read and written, and the summary is updated from them unless a
+        removed point was on an edge of the bounding box
+        """
+        current_span().set_attribute("upsert_count", len(patch.upsert))
+        current_span().set_attribute("delete_count", len(patch.delete))
+
+        upsert_ids = [point.id for point in patch.upsert if point.id is not None]
+        if len(set(upsert_ids)) != len(upsert_ids):
+            raise ValidationError("a point can only be upserted once per patch")
+        if not set(upsert_ids).isdisjoint(patch.delete):
+            raise ValidationError("a point can't be both upserted and deleted")
+
+        with transaction.atomic():
+            try:
+                # locking the exercise serializes patches, so the summary they derive
+                # always starts from the one left by the previous patch
+                exercise = (
+                    Exercise.objects.select_for_update()
+                    .only("generator_spec", *ExerciseSummaryDto.__dataclass_fields__)
+                    .get(id=exercise_id)
+                )
+            except Exercise.DoesNotExist:
+                raise ObjectDoesNotExist(f"Exercise with id {exercise_id} not found")
+
+            if exercise.generator_spec is not None:
+                raise ValidationError("generated exercises have no points to patch")
+
+            existing = {
+                id: (point_exercise_id, (x, y, size))
+                for id, point_exercise_id, x, y, size in ExerciseDataPoint.objects.filter(
+                    id__in=upsert_ids + list(patch.delete)
+                ).values_list("id", "exercise_id", "x", "y", "size")
+            }
+            foreign = sorted(
+                str(id)
+                for id, (point_exercise_id, _) in existing.items()
+                if point_exercise_id != exercise.id
+            )
+            if foreign:
+                raise ValidationError(
+                    f"points {', '.join(foreign)} belong to another exercise"
+                )
+
+            to_update: List[ExerciseDataPoint] = []
+            to_create: List[ExerciseDataPoint] = []
+            for point in patch.upsert:
+                row = ExerciseDataPoint(
+                    id=point.id or uuid4(),
+                    x=point.x,
+                    y=point.y,
+                    size=point.size,
+                    exercise_id=exercise.id,
+                )
+                (to_update if point.id in existing else to_create).append(row)
+
+            # deleting points the exercise doesn't have is a no-op, so retries are safe
+            to_delete = list(dict.fromkeys(id for id in patch.delete if id in existing))
+
+            if to_update:
+                ExerciseDataPoint.objects.bulk_update(to_update, ["x", "y", "size"])
+            if to_create:
+                ExerciseDataPoint.objects.bulk_create(to_create)
+            if to_delete:
+                ExerciseDataPoint.objects.filter(id__in=to_delete).delete(
+                    notify=False
+                )
+
+            summary = ExerciseSummaryDto.from_model(exercise).apply_diff(
+                removed=[existing[point.id][1] for point in to_update]
+                + [existing[id][1] for id in to_delete],
+                added=[(point.x, point.y, point.size) for point in patch.upsert],
+            )
+            if summary is None:
+                summary = ExerciseService._compute_summary(exercise.id)
+
+            Exercise.objects.filter(id=exercise.id).update(
+                updated_at=timezone.now(), **asdict(summary)
+            )
+            exercise_cache.invalidate_on_commit(exercise.id)
+
+        return PatchExerciseDataPointsResultDto(
+            created=[point.id for point in to_create],
+            updated=len(to_update),
+            deleted=len(to_delete),
+            summary=summary,
+        )
+
+    @staticmethod
+    @traced()
+    def replace_data_points(
+        exercise_id: UUID,
+        points: Iterable[CreateExerciseDataPointDto],
+        batch_size: Optional[int] = None,
+    ) -> ExerciseSummaryDto:
+        """
+        Replaces every point of an exercise with `points`, which are consumed lazily
+        and inserted in batches, so only one batch is held in memory at a time. If
+        the iterable raises, e.g. a ValidationError of an upload, nothing changes
+        """
+        if batch_size is None:
+            batch_size = getattr(settings, "EXERCISES_IMPORT_BATCH_SIZE", 5000)
+
+        with transaction.atomic():
+            try:
+                exercise = (
+                    Exercise.objects.select_for_update()
+                    .only("generator_spec")
+                    .get(id=exercise_id)
+                )
+            except Exercise.DoesNotExist:
+                raise ObjectDoesNotExist(f"Exercise with id {exercise_id} not found")
+
+            if exercise.generator_spec is not None:
+                raise ValidationError("generated exercises have no points to replace")
+
+            # a single DELETE, the points are never collected, see delete_exercises
+            ExerciseDataPoint.objects.filter(exercise_id=exercise.id).delete(
+                notify=False
+            )
+
+            summary = ExerciseSummaryDto()
+            iterator = iter(points)
+            while batch := list(islice(iterator, batch_size)):
+                with span("ExerciseDataPoint.bulk_create", point_count=len(batch)):
+                    ExerciseDataPoint.objects.bulk_create(
+                        ExerciseDataPoint(
+                            x=point.x, y=point.y, size=point.size, exercise=exercise
+                        )
+                        for point in batch
+                    )
+                # adding points never needs the other ones
+                summary = cast(
+                    ExerciseSummaryDto,
+                    summary.apply_diff(
+                        removed=[],
+                        added=[(point.x, point.y, point.size) for point in batch],
+                    ),
+                )
+
+            Exercise.objects.filter(id=exercise.id).update(
+                updated_at=timezone.now(), **asdict(summary)
+            )
+            exercise_cache.invalidate_on_commit(exercise.id)
+
+        current_span().set_attribute("point_count", summary.point_count)
+        return summary
+
+    @staticmethod
+    @traced()
+    def clone_exercises(
+        exercise_ids: Sequence[UUID],
+        transform: Optional[CloneTransformDto] = None,
+        title_suffix: str = "",
+    ) -> CloneExercisesResultDto:
+        """
+        Copies exercises and their points inside the database, with one INSERT ...
+        SELECT for the exercises and another for every point, so the points are never
+        loaded (in batches on other databases than SQLite and PostgreSQL). The same id
+        can be given several times to make several copies
+        """
+        transform = transform or CloneTransformDto()
+        if transform.bound_scale <= 0:
+            raise ValidationError("bound_scale has to be positive")
+        if transform.size_scale < 0:
+            raise ValidationError("size_scale can't be negative")
+
+        db = router.db_for_write(Exercise)
+        with transaction.atomic(using=db):
+            sources = Exercise.objects.using(db).filter(id__in=exercise_ids)
+            found = set(sources.values_list("id", flat=True))
+            missing = [str(id) for id in exercise_ids if id not in found]
+            if missing:
+                raise ObjectDoesNotExist(f"Exercises not found: {', '.join(missing)}")
+            if (
+                transform.moves_points
+                and sources.filter(generator_spec__isnull=False).exists()
+            ):
+                raise ValidationError(
+                    "the points of generated exercises can't be transformed"
+                )
+
+            first_order = ExerciseService._get_next_exercise_order()
+            clone_ids = [uuid4() for _ in exercise_ids]
+            copy_exercises = (
+                ExerciseService._insert_copies
+                if connections[db].vendor in _UUID_SQL
+                else ExerciseService._copy_exercises
+            )
+            points = copy_exercises(
+                db, exercise_ids, clone_ids, first_order, transform, title_suffix
+            )
+
+            for clone_id in clone_ids:
+                exercise_cache.invalidate_on_commit(clone_id)
+
+            clones = {
+                exercise.id: ExerciseListItemDto.from_model(exercise)
+                for exercise in Exercise.objects.using(db)
+                .only(*ExerciseListItemDto.FIELDS)
+                .filter(id__in=clone_ids)
+            }
+
+        current_span().set_attribute("point_count", points)
+        return CloneExercisesResultDto(
+            exercises=[clones[clone_id] for clone_id in clone_ids], points=points
+        )
+
+    @staticmethod
+    def _insert_copies(
+        db: str,
+        exercise_ids: Sequence[UUID],
+        clone_ids: List[UUID],
+        first_order: int,
+        transform: CloneTransformDto,
+        title_suffix: str,
+    ) -> int:
+        """
+        Inserts the copies of clone_exercises with one INSERT ... SELECT for the
+        exercises and another for every point. Returns the number of points copied
+        """
+        connection = connections[db]
+        new_uuid, uuid_param = _UUID_SQL[connection.vendor]
+
+        def prep(exercise_id: UUID):
+            return Exercise._meta.pk.get_db_prep_value(exercise_id, connection)
+
+        mapping_params: list = []
+        for i, (source_id, clone_id) in enumerate(zip(exercise_ids, clone_ids)):
+            mapping_params += [prep(source_id), prep(clone_id), first_order + i]
+        rows = ", ".join(f"({uuid_param}, {uuid_param}, %s)" for _ in clone_ids)
+        mapping = f"WITH mapping(source_id, clone_id, clone_order) AS (VALUES {rows})"
+
+        def extreme(column: str, scale: float, lowest: bool) -> str:
+            # a negative scale swaps the min and max
+            side = "min" if lowest == (scale >= 0) else "max"
+            return f"e.{side}_{column} * %s + %s"
+
+        now = Exercise._meta.get_field("created_at").get_db_prep_value(
+            timezone.now(), connection
+        )
+        # the WITH is part of the SELECT, so the statement starts with INSERT and
+        # drivers report the inserted rows
+        exercises_sql = f"""
+            INSERT INTO exercises_exercise (
+                id, "order", title, created_at, updated_at, is_active,
+                description, constraint_type, upper_bound, lower_bound,
+                generator_spec, point_count, min_x, max_x, min_y, max_y, total_size
+            )
+            {mapping}
+            SELECT
+                m.clone_id, m.clone_order, substr(e.title || %s, 1, 200), %s, %s,
+                e.is_active, e.description, e.constraint_type,
+                e.upper_bound * %s + %s, e.lower_bound * %s + %s,
+                e.generator_spec, e.point_count,
+                {extreme("x", transform.x_scale, True)},
+                {extreme("x", transform.x_scale, False)},
+                {extreme("y", transform.y_scale, True)},
+                {extreme("y", transform.y_scale, False)},
+                e.total_size * %s
+            FROM mapping m JOIN exercises_exercise e ON e.id = m.source_id
+        """
+        exercises_params = mapping_params + [
+            title_suffix,
+            now,
+            now,
+            transform.bound_scale,
+            transform.bound_shift,
+            transform.bound_scale,
+            transform.bound_shift,
+            transform.x_scale,
+            transform.x_shift,
+            transform.x_scale,
+            transform.x_shift,
+            transform.y_scale,
+            transform.y_shift,
+            transform.y_scale,
+            transform.y_shift,
+            transform.size_scale,
+        ]
+
+        points_sql = f"""
+            INSERT INTO exercises_exercisedatapoint (id, x, y, size, exercise_id)
+            {mapping}
+            SELECT {new_uuid}, p.x * %s + %s, p.y * %s + %s, p.size * %s, m.clone_id
+            FROM mapping m
+            JOIN exercises_exercisedatapoint p ON p.exercise_id = m.source_id
+        """
+        points_params = mapping_params + [
+            transform.x_scale,
+            transform.x_shift,
+            transform.y_scale,
+            transform.y_shift,
+            transform.size_scale,
+        ]
+
+        with connection.cursor() as cursor:
+            with span("insert exercises", exercise_count=len(clone_ids)):
+                cursor.execute(exercises_sql, exercises_params)
+            with span("insert points"):
+                cursor.execute(points_sql, points_params)
+                points = cursor.rowcount
+        return points
+
+    @staticmethod
+    def _copy_exercises(
+        db: str,
+        exercise_ids: Sequence[UUID],
+        clone_ids: List[UUID],
+        first_order: int,
+        transform: CloneTransformDto,
+        title_suffix: str,
+    ) -> int:
+        """
+        clone_exercises on databases we can't generate ids in SQL on: the exercises
+        are copied one by one and their points in batches, so only a batch of points
+        is loaded at once. Returns the number of points copied
+        """
+        batch_size = getattr(settings, "EXERCISES_IMPORT_BATCH_SIZE", 5000)
+        title_length = Exercise._meta.get_field("title").max_length
+        sources = Exercise.objects.using(db).in_bulk(set(exercise_ids))
+
+        def scaled(value: Optional[float], scale: float, shift: float):
+            return None if value is None else value * scale + shift
+
+        def extremes(low: Optional[float], high: Optional[float], scale, shift):
+            # a negative scale swaps the min and max
+            low, high = scaled(low, scale, shift), scaled(high, scale, shift)
+            return (low, high) if scale >= 0 else (high, low)
+
+        points = 0
+        for i, (source_id, clone_id) in enumerate(zip(exercise_ids, clone_ids)):
+            source = sources[source_id]
+            clone = Exercise(
+                **{
+                    field.attname: getattr(source, field.attname)
+                    for field in Exercise._meta.concrete_fields
+                }
+            )
+            clone.id = clone_id
+            clone.order = first_order + i
+            clone.title = (source.title + title_suffix)[:title_length]
+            clone.upper_bound = scaled(
+                source.upper_bound, transform.bound_scale, transform.bound_shift
+            )
+            clone.lower_bound = scaled(
+                source.lower_bound, transform.bound_scale, transform.bound_shift
+            )
+            clone.min_x, clone.max_x = extremes(
+                source.min_x, source.max_x, transform.x_scale, transform.x_shift
+            )
+            clone.min_y, clone.max_y = extremes(
+                source.min_y, source.max_y, transform.y_scale, transform.y_shift
+            )
+            clone.total_size = source.total_size * transform.size_scale
+            clone.save(using=db, force_insert=True)
+
+            rows = (
+                ExerciseDataPoint.objects.using(db)
+                .filter(exercise_id=source_id)
+                .values_list("x", "y", "size")
+                .iterator(chunk_size=batch_size)
+            )
+            with span("insert points", exercise_id=str(clone_id)):
+                while batch := list(islice(rows, batch_size)):
+                    ExerciseDataPoint.objects.using(db).bulk_create(
+                        ExerciseDataPoint(
+                            exercise_id=clone_id,
+                            x=x * transform.x_scale + transform.x_shift,
+                            y=y * transform.y_scale + transform.y_shift,
+                            size=size * transform.size_scale,
+                        )
+                        for x, y, size in batch
+                    )
+                    points += len(batch)
+        return points
+
+    @staticmethod
+    @traced()
+    def archive_exercises(exercise_ids: Sequence[UUID]) -> int:
+        """
+        Deactivates exercises, which takes them out of the navigation without
+        touching their points. Returns how many were active
+        """
+        with transaction.atomic():
+            archived = list(
+                Exercise.objects.select_for_update()
+                .filter(id__in=exercise_ids, is_active=True)
+                .values_list("id", flat=True)
+            )
+            Exercise.objects.filter(id__in=archived).update(
+                is_active=False, updated_at=timezone.now()
+            )
+            for exercise_id in archived:
+                exercise_cache.invalidate_on_commit(exercise_id)
+
+        return len(archived)
+
+    @staticmethod
+    @traced()
+    def delete_exercises(
+        exercise_ids: Sequence[UUID], batch_size: Optional[int] = None
+    ) -> DeleteExercisesResultDto:
+        """
+        Deletes exercises and their points. The exercises are archived first, so
+        they leave the navigation at once, then their points are deleted in batches
+        of set based DELETEs, each in its own transaction so locks are held briefly.
+        Points are never loaded, unlike with Django's cascade collector
+        """
+        if batch_size is None:
+            batch_size = getattr(settings, "EXERCISES_DELETE_BATCH_SIZE", 5000)
+
+        ExerciseService.archive_exercises(exercise_ids)
+        exercise_ids = list(
+            Exercise.objects.filter(id__in=exercise_ids).values_list("id", flat=True)
+        )
+
+        deleted_points = 0
+        for exercise_id in exercise_ids:
+            while True:
+                batch = ExerciseDataPoint.objects.filter(
+                    exercise_id=exercise_id
+                ).values("id")[:batch_size]
+                # a single DELETE ... WHERE id IN (SELECT ... LIMIT): with no delete
+                # signals for data points and nothing referencing them, Django
+                # deletes them without collecting the rows first, see signals.py
+                deleted, _ = ExerciseDataPoint.objects.filter(id__in=batch).delete(
+                    notify=False
+                )
+                deleted_points += deleted
+                if deleted < batch_size:
+                    break
+
+        with transaction.atomic():
+            # the points are gone, so the cascade only has the stats row left
+            deleted_exercises = (
+                Exercise.objects.filter(id__in=exercise_ids)
+                .delete()[1]
+                .get(Exercise._meta.label, 0)
+            )
+
+        current_span().set_attribute("point_count", deleted_points)
+        return DeleteExercisesResultDto(
+            exercises=deleted_exercises, points=deleted_points
+        )
+
+    @staticmethod
+    @traced()
     def evaluate_solution(
-        exercise_id: UUID, solution: List[ExerciseDataPointDto]
+        exercise_id: UUID,
+        solution: List[ExerciseDataPointDto],
+        learner_id: Optional[UUID] = None,
     ) -> bool:
         if not solution:
             raise ValidationError("Solution must contain at least one data point.")
 
         y_values = [point.y for point in solution]
-        min_y, max_y = min(y_values), max(y_values)
 
-        exercise = Exercise.objects.get(id=exercise_id)
+        return ExerciseService.evaluate_summary(
+            exercise_id,
+            SolutionSummaryDto(
+                count=len(y_values), min_y=min(y_values), max_y=max(y_values)
+            ),
+            learner_id,
+        )
+
+    @staticmethod
+    @traced()
+    def evaluate_summary(
+        exercise_id: UUID,
+        solution: SolutionSummaryDto,
+        learner_id: Optional[UUID] = None,
+    ) -> bool:
+        """Evaluates a solution that was already reduced to its count and y range"""
+        current_span().set_attribute("point_count", solution.count)
+        if solution.count == 0 or solution.min_y is None or solution.max_y is None:
+            raise ValidationError("Solution must contain at least one data point.")
+
+        min_y, max_y = solution.min_y, solution.max_y
+
+        constraint = ExerciseService._get_constraint(exercise_id)
+
+        is_correct = ExerciseService._check_constraint(constraint, min_y, max_y)
+
+        stats_recorder.record(exercise_id, min_y, max_y, is_correct)
+        if learner_id is not None:
+            ExerciseService.record_progress(learner_id, exercise_id, is_correct)
+
+        return is_correct
+
+    @staticmethod
+    @traced()
+    def evaluate_violations(
+        exercise_id: UUID,
+        y_values: Sequence[float],
+        learner_id: Optional[UUID] = None,
+    ) -> SolutionViolationsDto:
+        """
+        Evaluates a solution from the y of its points, finding which of them are out
+        of range in one vectorized pass
+        """
+        import numpy as np
+
+        current_span().set_attribute("point_count", len(y_values))
+        if len(y_values) == 0:
+            raise ValidationError("Solution must contain at least one data point.")
+
+        y = np.asarray(y_values, dtype=np.float64)
+        constraint = ExerciseService._get_constraint(exercise_id)
+
+        margins = ExerciseService._violation_margins(constraint, y)
+        # < is strict, so a point on the bound of an LT or GT exercise is a violation
+        # with a margin of 0
+        if constraint.constraint_type == ConstraintType.BETWEEN:
+            mask = margins > 0
+        else:
+            mask = margins >= 0
+        count = int(np.count_nonzero(mask))
+
+        violations = SolutionViolationsDto(
+            mask=mask,
+            count=count,
+            worst_margin=float(margins[mask].max()) if count else None,
+        )
+        stats_recorder.record(
+            exercise_id, float(y.min()), float(y.max()), violations.is_correct
+        )
+        if learner_id is not None:
+            ExerciseService.record_progress(
+                learner_id, exercise_id, violations.is_correct
+            )
+        return violations
+
+    @staticmethod
+    @traced()
+    def record_progress(learner_id: UUID, exercise_id: UUID, is_correct: bool) -> None:
+        """Counts an attempt of the learner, an exercise stays solved once it is"""
+        # bookkeeping, it doesn't pin the learner's client to the primary, resume
+        # reads the progress from the primary instead
+        with routers.unpinned():
+            changes: dict = {
+                "attempts": F("attempts") + 1,
+                "updated_at": timezone.now(),
+            }
+            if is_correct:
+                changes["solved"] = True
+                changes["solved_at"] = Coalesce(F("solved_at"), timezone.now())
+
+            progress = LearnerProgress.objects.filter(
+                learner_id=learner_id, exercise_id=exercise_id
+            )
+            if progress.update(**changes):
+                return
+
+            try:
+                with transaction.atomic():
+                    LearnerProgress.objects.create(
+                        learner_id=learner_id,
+                        exercise_id=exercise_id,
+                        attempts=1,
+                        solved=is_correct,
+                        solved_at=timezone.now() if is_correct else None,
+                    )
+            except IntegrityError:
+                # another request of the same learner created it first, or the
+                # exercise doesn't exist (it was validated with its constraint though)
+                if not progress.update(**changes):
+                    raise
+
+    @staticmethod
+    @traced()
+    def get_resume(learner_id: UUID) -> UUID | None:
+        """
+        The lowest order active exercise the learner hasn't solved. The query walks the
+        partial index of active exercises in order, probing the (learner, exercise)
+        index of the progress for each until one isn't solved, so its cost depends on
+        how far the learner got, not on the number of learners
+        """
+        solved = LearnerProgress.objects.filter(
+            learner_id=learner_id, exercise_id=OuterRef("id"), solved=True
+        )
+        return (
+            Exercise.objects.using(DEFAULT_DB_ALIAS)
+            .filter(~Exists(solved), is_active=True)
+            .order_by("order")
+            .values_list("id", flat=True)
+            .first()
+        )
+
+    @staticmethod
+    def _violation_margins(
+        constraint: ExerciseConstraintDto, y: "np.ndarray"
+    ) -> "np.ndarray":
+        """How far each y is past the bounds, negative when it's within them"""
+        import numpy as np
+
+        lower_bound, upper_bound = constraint.lower_bound, constraint.upper_bound
+
+        match constraint.constraint_type:
+            case ConstraintType.LT:
+                if upper_bound is None:
+                    raise RuntimeError(
+                        "invalid data: 'upper_bound' was unexpectedly None"
+                    )
+                return y - upper_bound
 
-        lower_bound, upper_bound = exercise.lower_bound, exercise.upper_bound
+            case ConstraintType.GT:
+                if lower_bound is None:
+                    raise RuntimeError(
+                        "invalid data: 'lower_bound' was unexpectedly None"
+                    )
+                return lower_bound - y
+
+            case ConstraintType.BETWEEN:
+                if lower_bound is None:
+                    raise RuntimeError(
+                        "invalid data: 'lower_bound' was unexpectedly None"
+                    )
+                if upper_bound is None:
+                    raise RuntimeError(
+                        "invalid data: 'upper_bound' was unexpectedly None"
+                    )
+                return np.maximum(lower_bound - y, y - upper_bound)
+
+            case _ as unexpected:
+                assert_never(unexpected)  # exhaustiveness check
+
+    @staticmethod
+    def _check_constraint(
+        constraint: ExerciseConstraintDto, min_y: float, max_y: float
+    ) -> bool:
+        lower_bound, upper_bound = constraint.lower_bound, constraint.upper_bound
 
-        match cast(ConstraintType, exercise.constraint_type):
+        match constraint.constraint_type:
             case ConstraintType.LT:
                 if upper_bound is None:
                     raise RuntimeError(
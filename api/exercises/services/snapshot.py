@@ -0,0 +1,457 @@
+"""
+Read-only snapshot of the active exercises in a single binary file, which workers
+memory-map to answer reads without going through the ORM. Every worker maps the same
+file, so the OS shares its pages between them.
+
+Layout, all little-endian:
+
+    header          _HEADER
+    records         one _RECORD per exercise, in navigation order
+    id index        one _INDEX_ENTRY per exercise, sorted by id, for binary search
+    metadata        JSON of the fields not needed to navigate or evaluate
+    point ids       16 bytes per point
+    x, y, size      one float64 array each, points of an exercise are contiguous
+
+The snapshot records the exercise cache generation it was built from. Any write
+bumps the generation, so a stale snapshot is ignored, and rebuilt in the
+background, until a new one is built.
+"""
+
+import datetime
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from mmap import ACCESS_READ, mmap
+from struct import Struct
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from exercises.models import Exercise
+from exercises.models.range_exercise import ConstraintType, ExerciseDataPoint
+from exercises.services.cache import exercise_cache
+
+if TYPE_CHECKING:
+    from exercises.services.service import (
+        ExerciseConstraintDto,
+        ExerciseResponseDto,
+    )
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SCHOLSNP"
+FORMAT_VERSION = 1
+
+# magic, format version, exercises, points, metadata size, generation, built at (ns)
+_HEADER = Struct("<8sIIQQqq")
+# id, order, first point, point count, constraint, lower bound, upper bound,
+# metadata offset, metadata length. Missing bounds are stored as NaN
+_RECORD = Struct("<16sQQIB3xddQI")
+_INDEX_ENTRY = Struct("<16sI")
+_FLOAT = 8
+
+_CONSTRAINT_TYPES = list(ConstraintType)
+
+_REBUILD_LOCK_KEY = "exercises:snapshot:rebuilding"
+
+
+class SnapshotError(Exception):
+    pass
+
+
+@dataclass
+class SnapshotInfo:
+    path: str
+    exercises: int
+    points: int
+    generation: int
+    size: int
+
+
+def _align(offset: int) -> int:
+    return (offset + _FLOAT - 1) // _FLOAT * _FLOAT
+
+
+def build_snapshot(path: Optional[str] = None) -> SnapshotInfo:
+    """
+    Writes a snapshot of the active exercises to `path`. The file is replaced
+    atomically, so workers still mapping the previous one keep reading it unchanged
+    """
+    path = path or settings.EXERCISES_SNAPSHOT_FILE
+    if sys.byteorder != "little":
+        raise SnapshotError("snapshots can only be built on little-endian hosts")
+
+    # read before the exercises, so a write during the build leaves it stale
+    generation = exercise_cache.generation()
+
+    # from the primary: the snapshot is stamped with the current generation, which a
+    # lagging replica could still have older rows for
+    exercises = list(
+        Exercise.objects.using(DEFAULT_DB_ALIAS)
+        .filter(is_active=True)
+        .order_by("order")
+        .values_list(
+            "id",
+            "order",
+            "constraint_type",
+            "lower_bound",
+            "upper_bound",
+            "title",
+            "description",
+            "created_at",
+            "updated_at",
+            "generator_spec",
+            "point_count",
+            "min_x",
+            "max_x",
+            "min_y",
+            "max_y",
+            "total_size",
+        )
+    )
+
+    ids = bytearray()
+    xs, ys, sizes = array("d"), array("d"), array("d")
+    metadata = bytearray()
+    records: List[Tuple] = []
+
+    for (
+        id,
+        order,
+        constraint_type,
+        lower_bound,
+        upper_bound,
+        title,
+        description,
+        created_at,
+        updated_at,
+        generator_spec,
+        *summary,
+    ) in exercises:
+        first_point = len(xs)
+        # generated exercises have no stored points, they are generated when read
+        if generator_spec is None:
+            rows = (
+                ExerciseDataPoint.objects.using(DEFAULT_DB_ALIAS)
+                .filter(exercise_id=id)
+                .values_list("id", "x", "y", "size")
+                .iterator(chunk_size=2000)
+            )
+            for point_id, x, y, size in rows:
+                ids += point_id.bytes
+                xs.append(x)
+                ys.append(y)
+                sizes.append(size)
+
+        meta = json.dumps(
+            {
+                "title": title,
+                "description": description,
+                "created_at": created_at.isoformat(),
+                "updated_at": updated_at.isoformat(),
+                "generator": generator_spec,
+                "summary": summary,
+            },
+            separators=(",", ":"),
+        ).encode()
+
+        records.append(
+            (
+                id.bytes,
+                order,
+                first_point,
+                len(xs) - first_point,
+                _CONSTRAINT_TYPES.index(ConstraintType(constraint_type)),
+                float("nan") if lower_bound is None else lower_bound,
+                float("nan") if upper_bound is None else upper_bound,
+                len(metadata),
+                len(meta),
+            )
+        )
+        metadata += meta
+
+    index = sorted((record[0], position) for position, record in enumerate(records))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(
+                _HEADER.pack(
+                    MAGIC,
+                    FORMAT_VERSION,
+                    len(records),
+                    len(xs),
+                    len(metadata),
+                    generation,
+                    time.time_ns(),
+                )
+            )
+            for record in records:
+                f.write(_RECORD.pack(*record))
+            for entry in index:
+                f.write(_INDEX_ENTRY.pack(*entry))
+            f.write(metadata)
+            f.write(ids)
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            for column in (xs, ys, sizes):
+                column.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    return SnapshotInfo(
+        path=path,
+        exercises=len(records),
+        points=len(xs),
+        generation=generation,
+        size=size,
+    )
+
+
+class ExerciseSnapshot:
+    """A snapshot file mapped in memory"""
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise SnapshotError("snapshots can only be read on little-endian hosts")
+
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self._map = mmap(f.fileno(), 0, access=ACCESS_READ)
+
+        if len(self._map) < _HEADER.size:
+            raise SnapshotError(f"{path} is not a snapshot")
+        (
+            magic,
+            format_version,
+            self.exercises,
+            self.points,
+            metadata_size,
+            self.generation,
+            self.built_at,
+        ) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise SnapshotError(f"{path} is not a version {FORMAT_VERSION} snapshot")
+
+        self._records = _HEADER.size
+        self._index = self._records + self.exercises * _RECORD.size
+        self._metadata = self._index + self.exercises * _INDEX_ENTRY.size
+        self._point_ids = self._metadata + metadata_size
+        self._x = _align(self._point_ids + 16 * self.points)
+        self._y = self._x + _FLOAT * self.points
+        self._size = self._y + _FLOAT * self.points
+
+        if self._size + _FLOAT * self.points != len(self._map):
+            raise SnapshotError(f"{path} is truncated or corrupt")
+
+    def _record(self, position: int) -> Tuple:
+        return _RECORD.unpack_from(self._map, self._records + position * _RECORD.size)
+
+    def _position(self, exercise_id: UUID) -> Optional[int]:
+        """binary search of the id index"""
+        try:
+            # ids from URLs are strings, invalid ones are left for the ORM to reject
+            key = UUID(str(exercise_id)).bytes
+        except ValueError:
+            return None
+
+        lo, hi = 0, self.exercises
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry_id, position = _INDEX_ENTRY.unpack_from(
+                self._map, self._index + mid * _INDEX_ENTRY.size
+            )
+            if entry_id == key:
+                return position
+            if entry_id < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def _column(self, start: int, first: int, count: int) -> List[float]:
+        offset = start + first * _FLOAT
+        with memoryview(self._map)[offset : offset + count * _FLOAT] as view:
+            with view.cast("d") as floats:
+                return floats.tolist()
+
+    def first_id(self) -> Optional[UUID]:
+        if not self.exercises:
+            return None
+        return UUID(bytes=self._record(0)[0])
+
+    def next_id(self, exercise_id: UUID) -> Tuple[bool, Optional[UUID]]:
+        """whether the exercise is in the snapshot, and the id of the next one"""
+        position = self._position(exercise_id)
+        if position is None:
+            return False, None
+        if position + 1 == self.exercises:
+            return True, None
+        return True, UUID(bytes=self._record(position + 1)[0])
+
+    def get_constraint(self, exercise_id: UUID) -> Optional["ExerciseConstraintDto"]:
+        from exercises.services.service import ExerciseConstraintDto
+
+        position = self._position(exercise_id)
+        if position is None:
+            return None
+
+        record = self._record(position)
+        return ExerciseConstraintDto(
+            constraint_type=_CONSTRAINT_TYPES[record[4]],
+            lower_bound=None if record[5] != record[5] else record[5],  # NaN
+            upper_bound=None if record[6] != record[6] else record[6],
+        )
+
+    def get(self, exercise_id: UUID) -> Optional["ExerciseResponseDto"]:
+        from exercises.services.generator import GeneratorSpecDto
+        from exercises.services.service import (
+            ExerciseDataPointDto,
+            ExerciseResponseDto,
+            ExerciseSummaryDto,
+        )
+
+        position = self._position(exercise_id)
+        if position is None:
+            return None
+
+        (
+            id,
+            order,
+            first,
+            count,
+            constraint,
+            lower_bound,
+            upper_bound,
+            meta_offset,
+            meta_length,
+        ) = self._record(position)
+        start = self._metadata + meta_offset
+        meta: Dict = json.loads(self._map[start : start + meta_length])
+
+        ids_start = self._point_ids + 16 * first
+        point_ids = self._map[ids_start : ids_start + 16 * count]
+        data_points = [
+            ExerciseDataPointDto(
+                id=UUID(bytes=point_ids[i * 16 : i * 16 + 16]), x=x, y=y, size=size
+            )
+            for i, (x, y, size) in enumerate(
+                zip(
+                    self._column(self._x, first, count),
+                    self._column(self._y, first, count),
+                    self._column(self._size, first, count),
+                )
+            )
+        ]
+
+        return ExerciseResponseDto(
+            id=UUID(bytes=id),
+            order=order,
+            title=meta["title"],
+            description=meta["description"],
+            constraint_type=_CONSTRAINT_TYPES[constraint],
+            lower_bound=None if lower_bound != lower_bound else lower_bound,
+            upper_bound=None if upper_bound != upper_bound else upper_bound,
+            is_active=True,
+            created_at=datetime.datetime.fromisoformat(meta["created_at"]),
+            updated_at=datetime.datetime.fromisoformat(meta["updated_at"]),
+            data_points=data_points,
+            generator=(
+                GeneratorSpecDto.from_json(meta["generator"])
+                if meta["generator"] is not None
+                else None
+            ),
+            summary=ExerciseSummaryDto(*meta["summary"]),
+        )
+
+
+class SnapshotStore:
+    """
+    Gives the current snapshot, if snapshots are enabled and it's up to date. The
+    file is checked for replacements every EXERCISES_SNAPSHOT_CHECK_INTERVAL seconds,
+    the generation on every call so writes are never hidden by a stale snapshot
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[ExerciseSnapshot] = None
+        self._path: Optional[str] = None
+        self._checked_at = 0.0
+
+    def current(self) -> Optional[ExerciseSnapshot]:
+        path = getattr(settings, "EXERCISES_SNAPSHOT_FILE", None)
+        if not path:
+            return None
+
+        interval = getattr(settings, "EXERCISES_SNAPSHOT_CHECK_INTERVAL", 1.0)
+        if path != self._path or time.monotonic() - self._checked_at >= interval:
+            self._reload(path)
+
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.generation != exercise_cache.generation():
+            if getattr(settings, "EXERCISES_SNAPSHOT_AUTO_REBUILD", True):
+                self._rebuild_in_background(path)
+            return None
+        return snapshot
+
+    def _reload(self, path: str) -> None:
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self._path, self._snapshot = path, None
+                return
+
+            snapshot = self._snapshot
+            if (
+                path == self._path
+                and snapshot is not None
+                and (snapshot.stat.st_ino, snapshot.stat.st_mtime_ns)
+                == (stat.st_ino, stat.st_mtime_ns)
+            ):
+                return
+
+            self._path = path
+            try:
+                # the previous map is closed once no request is reading it anymore
+                self._snapshot = ExerciseSnapshot(path)
+            except (OSError, ValueError, SnapshotError):
+                logger.exception("could not load snapshot %s", path)
+                self._snapshot = None
+
+    def _rebuild_in_background(self, path: str) -> None:
+        # one rebuild at a time across all the workers
+        if not exercise_cache.shared.add(_REBUILD_LOCK_KEY, True, timeout=60):
+            return
+
+        def rebuild() -> None:
+            try:
+                build_snapshot(path)
+            except Exception:
+                logger.exception("could not rebuild snapshot %s", path)
+            finally:
+                exercise_cache.shared.delete(_REBUILD_LOCK_KEY)
+                connections.close_all()
+            self._checked_at = 0.0
+
+        threading.Thread(
+            target=rebuild, name="exercises-snapshot-rebuild", daemon=True
+        ).start()
+
+
+snapshots = SnapshotStore()
@@ -0,0 +1,254 @@
+import atexit
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+from uuid import UUID
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from exercises import routers
+from exercises.models import Exercise, ExerciseStats
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ExerciseStatsDelta:
+    attempts: int = 0
+    successes: int = 0
+    min_y_sum: float = 0
+    min_y_sq_sum: float = 0
+    max_y_sum: float = 0
+    max_y_sq_sum: float = 0
+    lowest_min_y: Optional[float] = None
+    highest_max_y: Optional[float] = None
+
+    def add(self, min_y: float, max_y: float, is_correct: bool) -> None:
+        self.attempts += 1
+        self.successes += int(is_correct)
+        self.min_y_sum += min_y
+        self.min_y_sq_sum += min_y * min_y
+        self.max_y_sum += max_y
+        self.max_y_sq_sum += max_y * max_y
+        self.lowest_min_y = (
+            min_y if self.lowest_min_y is None else min(self.lowest_min_y, min_y)
+        )
+        self.highest_max_y = (
+            max_y if self.highest_max_y is None else max(self.highest_max_y, max_y)
+        )
+
+    def merge(self, other: "ExerciseStatsDelta") -> "ExerciseStatsDelta":
+        def pick(a: Optional[float], b: Optional[float], fn) -> Optional[float]:
+            if a is None or b is None:
+                return a if b is None else b
+            return fn(a, b)
+
+        return ExerciseStatsDelta(
+            attempts=self.attempts + other.attempts,
+            successes=self.successes + other.successes,
+            min_y_sum=self.min_y_sum + other.min_y_sum,
+            min_y_sq_sum=self.min_y_sq_sum + other.min_y_sq_sum,
+            max_y_sum=self.max_y_sum + other.max_y_sum,
+            max_y_sq_sum=self.max_y_sq_sum + other.max_y_sq_sum,
+            lowest_min_y=pick(self.lowest_min_y, other.lowest_min_y, min),
+            highest_max_y=pick(self.highest_max_y, other.highest_max_y, max),
+        )
+
+    @classmethod
+    def from_model(cls, stats: ExerciseStats) -> "ExerciseStatsDelta":
+        return cls(
+            attempts=stats.attempts,
+            successes=stats.successes,
+            min_y_sum=stats.min_y_sum,
+            min_y_sq_sum=stats.min_y_sq_sum,
+            max_y_sum=stats.max_y_sum,
+            max_y_sq_sum=stats.max_y_sq_sum,
+            lowest_min_y=stats.lowest_min_y,
+            highest_max_y=stats.highest_max_y,
+        )
+
+
+@dataclass
+class YDistributionDto:
+    mean: Optional[float]
+    stddev: Optional[float]
+    extreme: Optional[float]
+
+
+@dataclass
+class ExerciseStatsDto:
+    exercise_id: UUID
+    attempts: int
+    successes: int
+    success_rate: Optional[float]
+    min_y: YDistributionDto
+    max_y: YDistributionDto
+
+    @classmethod
+    def from_delta(
+        cls, exercise_id: UUID, delta: ExerciseStatsDelta
+    ) -> "ExerciseStatsDto":
+        def distribution(
+            total: float, sq_total: float, extreme: Optional[float]
+        ) -> YDistributionDto:
+            if delta.attempts == 0:
+                return YDistributionDto(mean=None, stddev=None, extreme=None)
+            mean = total / delta.attempts
+            variance = max(sq_total / delta.attempts - mean * mean, 0.0)
+            return YDistributionDto(
+                mean=mean, stddev=math.sqrt(variance), extreme=extreme
+            )
+
+        return cls(
+            exercise_id=exercise_id,
+            attempts=delta.attempts,
+            successes=delta.successes,
+            success_rate=(
+                delta.successes / delta.attempts if delta.attempts else None
+            ),
+            min_y=distribution(
+                delta.min_y_sum, delta.min_y_sq_sum, delta.lowest_min_y
+            ),
+            max_y=distribution(
+                delta.max_y_sum, delta.max_y_sq_sum, delta.highest_max_y
+            ),
+        )
+
+
+class ExerciseStatsRecorder:
+    """
+    Accumulates evaluation counters in memory and flushes them to the DB in
+    batches, once `flush_size` attempts are pending or `flush_interval` seconds
+    have passed since the last flush. Recording never writes: the batch is flushed
+    by `flush_if_due` when a request has finished (see signals.py), after its
+    response was sent, so evaluations don't wait for it or fail with it.
+    """
+
+    def __init__(
+        self,
+        flush_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+    ):
+        self.flush_size = (
+            flush_size
+            if flush_size is not None
+            else getattr(settings, "EXERCISES_STATS_FLUSH_SIZE", 100)
+        )
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else getattr(settings, "EXERCISES_STATS_FLUSH_INTERVAL", 5.0)
+        )
+        self._lock = threading.Lock()
+        self._pending: Dict[UUID, ExerciseStatsDelta] = {}
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+
+    def record(
+        self, exercise_id: UUID, min_y: float, max_y: float, is_correct: bool
+    ) -> None:
+        with self._lock:
+            self._pending.setdefault(exercise_id, ExerciseStatsDelta()).add(
+                min_y, max_y, is_correct
+            )
+            self._pending_count += 1
+
+    def flush_if_due(self) -> None:
+        """Flushes if the batch is full or old enough, logging failed flushes"""
+        with self._lock:
+            due = self._pending_count and (
+                self._pending_count >= self.flush_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if not due:
+            return
+
+        try:
+            self.flush()
+        except Exception:
+            # the counters were kept, the next flush writes them
+            logger.exception("could not flush exercise stats")
+
+    def pending(self, exercise_id: UUID) -> Optional[ExerciseStatsDelta]:
+        """Counters recorded by this process that haven't been flushed yet"""
+        with self._lock:
+            delta = self._pending.get(exercise_id)
+            return None if delta is None else ExerciseStatsDelta().merge(delta)
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_count = 0
+            self._last_flush = time.monotonic()
+
+        if not pending:
+            return
+
+        try:
+            self._write(pending)
+        except Exception:
+            # e.g. the database is locked by an import, keep them for the next flush
+            with self._lock:
+                for exercise_id, delta in pending.items():
+                    newer = self._pending.get(exercise_id)
+                    self._pending[exercise_id] = (
+                        delta if newer is None else delta.merge(newer)
+                    )
+                    self._pending_count += delta.attempts
+            raise
+
+    def _write(self, pending: Dict[UUID, ExerciseStatsDelta]) -> None:
+        # the counters aren't read back by the client, they don't pin it to the primary
+        with routers.unpinned(), transaction.atomic():
+            # exercises deleted since their attempts were recorded are skipped, their
+            # stats would be deleted with them anyway
+            existing = Exercise.objects.filter(id__in=pending).values_list(
+                "id", flat=True
+            )
+            ExerciseStats.objects.bulk_create(
+                [ExerciseStats(exercise_id=exercise_id) for exercise_id in existing],
+                ignore_conflicts=True,
+            )
+
+            for exercise_id, delta in pending.items():
+                ExerciseStats.objects.filter(exercise_id=exercise_id).update(
+                    attempts=F("attempts") + delta.attempts,
+                    successes=F("successes") + delta.successes,
+                    min_y_sum=F("min_y_sum") + delta.min_y_sum,
+                    min_y_sq_sum=F("min_y_sq_sum") + delta.min_y_sq_sum,
+                    max_y_sum=F("max_y_sum") + delta.max_y_sum,
+                    max_y_sq_sum=F("max_y_sq_sum") + delta.max_y_sq_sum,
+                    # the columns start as NULL, which Least/Greatest would propagate
+                    lowest_min_y=Least(
+                        Coalesce("lowest_min_y", Value(delta.lowest_min_y)),
+                        Value(delta.lowest_min_y),
+                    ),
+                    highest_max_y=Greatest(
+                        Coalesce("highest_max_y", Value(delta.highest_max_y)),
+                        Value(delta.highest_max_y),
+                    ),
+                )
+
+    def clear(self) -> None:
+        """Drop pending counters without writing them, mostly useful for tests"""
+        with self._lock:
+            self._pending = {}
+            self._pending_count = 0
+
+
+stats_recorder = ExerciseStatsRecorder()
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    try:
+        stats_recorder.flush()
+    except Exception:
+        # the DB may already be gone during interpreter shutdown
+        pass
@@ -0,0 +1,202 @@
+import threading
+import time
+from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from exercises.models import Exercise
+from exercises.models.range_exercise import ConstraintType, ExerciseDataPoint
+from exercises.services.cache import ExerciseCache, exercise_cache
+from exercises.services.service import (
+    ExerciseService,
+    CreateExerciseDto,
+    CreateExerciseDataPointDto,
+)
+from exercises.testing import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestExerciseCache(TestCase):
+    def setUp(self):
+        exercise_cache.clear()
+        self.exercise = ExerciseService.create_exercises(
+            [
+                CreateExerciseDto(
+                    title="Cache Test",
+                    description="less than 20",
+                    constraint_type=ConstraintType.LT,
+                    upper_bound=20,
+                    points=[CreateExerciseDataPointDto(x=1, y=2, size=3)],
+                )
+            ]
+        )[0]
+
+    def test_get_is_served_from_cache(self):
+        ExerciseService.get(self.exercise.id)
+
+        with self.assertNumQueries(0):
+            cached = ExerciseService.get(self.exercise.id)
+
+        self.assertEqual(cached.title, "Cache Test")
+
+    def test_exercise_save_invalidates(self):
+        ExerciseService.get(self.exercise.id)
+
+        exercise = Exercise.objects.get(id=self.exercise.id)
+        exercise.title = "Renamed"
+        exercise.save()
+
+        self.assertEqual(ExerciseService.get(self.exercise.id).title, "Renamed")
+
+    def test_data_point_save_invalidates(self):
+        ExerciseService.get(self.exercise.id)
+
+        point = ExerciseDataPoint.objects.get(exercise_id=self.exercise.id)
+        point.y = 42
+        point.save()
+
+        self.assertEqual(ExerciseService.get(self.exercise.id).data_points[0].y, 42)
+
+    def test_data_point_delete_invalidates(self):
+        ExerciseService.get(self.exercise.id)
+
+        ExerciseDataPoint.objects.filter(exercise_id=self.exercise.id).delete()
+
+        exercise = ExerciseService.get(self.exercise.id)
+        self.assertEqual(exercise.data_points, [])
+        self.assertEqual(exercise.summary.point_count, 0)
+
+    def test_invalidation_reaches_other_workers(self):
+        """a cache with its own LRU but the same shared backend sees invalidations"""
+        other_worker = ExerciseCache()
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return len(loads)
+
+        self.assertEqual(other_worker.get_or_load("x", self.exercise.id, loader), 1)
+        self.assertEqual(other_worker.get_or_load("x", self.exercise.id, loader), 1)
+
+        exercise_cache.invalidate(self.exercise.id)
+
+        self.assertEqual(other_worker.get_or_load("x", self.exercise.id, loader), 2)
+
+    def test_every_invalidation_gets_a_new_version(self):
+        versions = {exercise_cache.version(self.exercise.id)}
+        # even when the clock doesn't move between them
+        with mock.patch("exercises.services.cache.time.time_ns", return_value=1):
+            for _ in range(3):
+                exercise_cache.invalidate(self.exercise.id)
+                versions.add(exercise_cache.version(self.exercise.id))
+
+        self.assertEqual(len(versions), 4)
+
+    def test_shared_tier_is_used_on_local_miss(self):
+        exercise_cache.get_or_load("x", self.exercise.id, lambda: "shared")
+
+        other_worker = ExerciseCache()
+        self.assertEqual(
+            other_worker.get_or_load("x", self.exercise.id, lambda: "reloaded"),
+            "shared",
+        )
+
+    def test_lru_is_bounded(self):
+        cache = ExerciseCache(max_entries=2)
+        for kind in ("a", "b", "c"):
+            cache.get_or_load(kind, self.exercise.id, lambda: kind)
+
+        self.assertEqual(len(cache._local), 2)
+        self.assertNotIn(("a", self.exercise.id), cache._local)
+
+    def test_lru_is_bounded_by_points(self):
+        cache = ExerciseCache(max_points=10)
+        big = ExerciseService.get(self.exercise.id)
+        big = replace(big, data_points=big.data_points * 6)
+        for kind in ("a", "b"):
+            cache.get_or_load(kind, self.exercise.id, lambda: big)
+
+        # 12 points, the first one is evicted
+        self.assertEqual(list(cache._local), [("b", self.exercise.id)])
+        self.assertEqual(cache._points, 6)
+
+        # an entry bigger than the whole LRU is only kept in the shared cache
+        huge = replace(big, data_points=big.data_points * 2)
+        self.assertIs(cache.get_or_load("c", self.exercise.id, lambda: huge), huge)
+        self.assertNotIn(("c", self.exercise.id), cache._local)
+        self.assertEqual(
+            cache.get_or_load("c", self.exercise.id, lambda: None).point_count, 12
+        )
+
+    def _blocking_loader(self, result=None, error=None):
+        """a loader that blocks until released, counting its calls"""
+        calls = []
+        started, release = threading.Event(), threading.Event()
+
+        def loader():
+            calls.append(1)
+            started.set()
+            release.wait(timeout=5)
+            if error is not None:
+                raise error
+            return result
+
+        return loader, calls, started, release
+
+    def test_concurrent_misses_are_coalesced(self):
+        cache = ExerciseCache()
+        loader, calls, started, release = self._blocking_loader(result=["payload"])
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            leader = pool.submit(cache.get_or_load, "x", self.exercise.id, loader)
+            started.wait(timeout=5)
+            waiters = [
+                pool.submit(cache.get_or_load, "x", self.exercise.id, loader)
+                for _ in range(7)
+            ]
+            time.sleep(0.05)
+            release.set()
+            results = [leader.result()] + [waiter.result() for waiter in waiters]
+
+        self.assertEqual(len(calls), 1)
+        for result in results:
+            self.assertIs(result, results[0])
+
+    def test_coalesced_load_errors_are_shared(self):
+        cache = ExerciseCache()
+        loader, calls, started, release = self._blocking_loader(
+            error=ValueError("boom")
+        )
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            leader = pool.submit(cache.get_or_load, "x", self.exercise.id, loader)
+            started.wait(timeout=5)
+            waiters = [
+                pool.submit(cache.get_or_load, "x", self.exercise.id, loader)
+                for _ in range(3)
+            ]
+            time.sleep(0.05)
+            release.set()
+
+            for future in [leader] + waiters:
+                with self.assertRaisesMessage(ValueError, "boom"):
+                    future.result()
+
+        # nothing was cached, so every waiter would have called it otherwise
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache._flights, {})
+
+    def test_new_versions_are_not_coalesced_with_old_loads(self):
+        cache = ExerciseCache()
+        loader, calls, started, release = self._blocking_loader(result="old")
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            old = pool.submit(cache.get_or_load, "x", self.exercise.id, loader)
+            started.wait(timeout=5)
+            exercise_cache.invalidate(self.exercise.id)
+            new = cache.get_or_load("x", self.exercise.id, lambda: "new")
+            release.set()
+
+            self.assertEqual((old.result(), new), ("old", "new"))
@@ -0,0 +1,155 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from exercises.models.range_exercise import (
+    ConstraintType,
+    ExerciseDataPoint,
+    GeneratorDistribution,
+)
+from exercises.services import generator
+from exercises.services.generator import GeneratorSpecDto, generate_points
+from exercises.services.service import (
+    ExerciseService,
+    CreateExerciseDto,
+    CreateExerciseDataPointDto,
+)
+
+
+def _spec(**kwargs) -> GeneratorSpecDto:
+    params = dict(
+        distribution=GeneratorDistribution.UNIFORM,
+        seed=7,
+        count=500,
+        x=(0.0, 100.0),
+        y=(10.0, 20.0),
+        size=(1.0, 5.0),
+    )
+    params.update(kwargs)
+    return GeneratorSpecDto(**params)
+
+
+class TestGenerator(TestCase):
+    def test_generation_is_deterministic(self):
+        first = generate_points(_spec())
+        generator.clear_cache()
+        second = generate_points(_spec())
+
+        self.assertIsNot(first, second)
+        self.assertEqual(first.ids, second.ids)
+        self.assertEqual(first.y.tolist(), second.y.tolist())
+
+    def test_uniform_within_bounds(self):
+        points = generate_points(_spec())
+
+        self.assertEqual(len(points.ids), 500)
+        self.assertEqual(len(set(points.ids)), 500)
+        self.assertTrue(((points.y >= 10) & (points.y <= 20)).all())
+
+    def test_normal_sizes_are_not_negative(self):
+        points = generate_points(
+            _spec(distribution=GeneratorDistribution.NORMAL, size=(0.0, 10.0))
+        )
+        self.assertTrue((points.size >= 0).all())
+
+    def test_seeds_produce_different_variants(self):
+        spec = _spec()
+        variant = spec.with_seed(8)
+
+        self.assertNotEqual(spec.digest, variant.digest)
+        self.assertNotEqual(
+            generate_points(spec).x.tolist(), generate_points(variant).x.tolist()
+        )
+
+    def test_cache_is_bounded_by_points(self):
+        generator.clear_cache()
+        self.addCleanup(generator.clear_cache)
+
+        with self.settings(EXERCISES_GENERATOR_CACHE_POINTS=1000):
+            first = generate_points(_spec(seed=1))
+            self.assertIs(generate_points(_spec(seed=1)), first)
+
+            generate_points(_spec(seed=2))
+            generate_points(_spec(seed=3))
+            # 1500 points, the least recently used spec was evicted
+            self.assertIsNot(generate_points(_spec(seed=1)), first)
+
+            # larger than the whole cache
+            big = generate_points(_spec(count=1001))
+            self.assertIsNot(generate_points(_spec(count=1001)), big)
+
+    def test_uncached_variants(self):
+        generator.clear_cache()
+        self.addCleanup(generator.clear_cache)
+
+        variant = generate_points(_spec(seed=99), cached=False)
+        self.assertIsNot(generate_points(_spec(seed=99)), variant)
+
+    def test_spec_json_round_trip(self):
+        spec = _spec()
+        self.assertEqual(GeneratorSpecDto.from_json(spec.to_json()), spec)
+
+    def test_invalid_spec(self):
+        with self.assertRaises(ValidationError):
+            GeneratorSpecDto.from_json({**_spec().to_json(), "y": [20, 10]})
+        with self.assertRaises(ValidationError):
+            GeneratorSpecDto.from_json({**_spec().to_json(), "distribution": "beta"})
+        with self.assertRaises(ValidationError):
+            GeneratorSpecDto.from_json({**_spec().to_json(), "count": -1})
+        with self.assertRaisesMessage(ValidationError, "count should be a positive"):
+            GeneratorSpecDto.from_json({**_spec().to_json(), "count": 0})
+        with self.assertRaisesMessage(ValidationError, "seed should be a non-negative"):
+            GeneratorSpecDto.from_json({**_spec().to_json(), "seed": -1})
+
+        self.assertEqual(GeneratorSpecDto.from_json(_spec(seed=0).to_json()).seed, 0)
+
+
+class TestGeneratedExercises(TestCase):
+    def _create(self, **kwargs):
+        params = dict(
+            title="Generated",
+            description="between 10 and 20",
+            constraint_type=ConstraintType.BETWEEN,
+            lower_bound=10,
+            upper_bound=20,
+            generator=_spec(),
+        )
+        params.update(kwargs)
+        return ExerciseService.create_exercises([CreateExerciseDto(**params)])[0]
+
+    def test_generated_exercise_stores_no_points(self):
+        exercise = self._create()
+
+        self.assertEqual(len(exercise.data_points), 500)
+        self.assertFalse(ExerciseDataPoint.objects.exists())
+
+        retrieved = ExerciseService.get(exercise.id)
+        self.assertEqual(retrieved.generator, _spec())
+        self.assertEqual(retrieved.data_points, exercise.data_points)
+
+    def test_variants(self):
+        exercise = self._create()
+
+        variant = ExerciseService.get(exercise.id, seed=99)
+        self.assertEqual(variant.generator.seed, 99)
+        self.assertEqual(len(variant.data_points), 500)
+        self.assertNotEqual(variant.data_points, exercise.data_points)
+        self.assertEqual(ExerciseService.get(exercise.id, seed=99), variant)
+
+    def test_variants_of_stored_exercises(self):
+        exercise = self._create(generator=None)
+
+        with self.assertRaises(ValidationError):
+            ExerciseService.get(exercise.id, seed=99)
+
+    def test_points_and_generator(self):
+        with self.assertRaises(ValidationError):
+            self._create(points=[CreateExerciseDataPointDto(x=1, y=2, size=3)])
+
+    def test_streaming_generated_points(self):
+        exercise = self._create()
+
+        header, chunks = ExerciseService.get_streaming(exercise.id, chunk_size=200)
+        rows = [row for chunk in chunks for row in chunk]
+
+        self.assertEqual(header.data_points, [])
+        self.assertEqual(rows, [(p.id, p.x, p.y, p.size) for p in exercise.data_points])
@@ -0,0 +1,145 @@
+from unittest import mock
+from uuid import uuid4
+from django.test import TestCase, override_settings
+
+from exercises.perf_budget import Budget, PerformanceBudgetMixin
+from exercises.services.service import (
+    ExerciseService,
+    ExerciseDataPointDto,
+)
+from exercises.services.cache import exercise_cache
+from exercises.services.stats import stats_recorder
+from exercises.testing import LOCMEM_CACHES, exercise_dto
+
+# number of data points of the exercises used to measure each method
+SIZES = (0, 10, 1000)
+
+
+def _read_budget(queries: int, size: int) -> Budget:
+    """reads are allowed to scale linearly with the number of points they return"""
+    return Budget(queries=queries, max_kib=128 + 2 * size, max_ms=250 + 0.5 * size)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestExerciseServiceBudget(PerformanceBudgetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        exercise_cache.clear()
+        stats_recorder.clear()
+        # keep the stats recorder from flushing in the middle of a measurement
+        patcher = mock.patch.multiple(
+            stats_recorder, flush_size=float("inf"), flush_interval=float("inf")
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get(self):
+        for size in SIZES:
+            with self.subTest(size=size):
+                exercise = ExerciseService.create_exercises([exercise_dto(size)])[0]
+                exercise_cache.clear()
+
+                with self.assertWithinBudget(
+                    f"get[size={size}]", _read_budget(2, size)
+                ):
+                    ExerciseService.get(exercise.id)
+
+                with self.assertWithinBudget(
+                    f"get_cached[size={size}]", _read_budget(0, size)
+                ):
+                    ExerciseService.get(exercise.id)
+
+    def test_get_streaming(self):
+        for size in SIZES:
+            with self.subTest(size=size):
+                exercise = ExerciseService.create_exercises([exercise_dto(size)])[0]
+
+                with self.assertWithinBudget(
+                    f"get_streaming[size={size}]", _read_budget(2, size)
+                ):
+                    _, chunks = ExerciseService.get_streaming(exercise.id)
+                    for _ in chunks:
+                        pass
+
+    def test_get_first_and_next(self):
+        """navigation never loads data points, so its cost doesn't depend on them"""
+        for size in SIZES:
+            with self.subTest(size=size):
+                exercise = ExerciseService.create_exercises([exercise_dto(size)])[0]
+                ExerciseService.create_exercises([exercise_dto(size)])
+                exercise_cache.clear()
+
+                # the first exercise is always the one created for size 0
+                with self.assertWithinBudget(
+                    f"get_first[size={size}]", _read_budget(3, 0)
+                ):
+                    ExerciseService.get_first()
+
+                with self.assertWithinBudget(
+                    f"get_first_cached[size={size}]", _read_budget(1, 0)
+                ):
+                    ExerciseService.get_first()
+
+                with self.assertWithinBudget(
+                    f"get_next[size={size}]", _read_budget(2, 0)
+                ):
+                    ExerciseService.get_next(exercise.id)
+
+    def test_evaluate_solution(self):
+        exercise = ExerciseService.create_exercises([exercise_dto(0)])[0]
+
+        for size in SIZES[1:]:
+            with self.subTest(size=size):
+                solution = [
+                    ExerciseDataPointDto(id=uuid4(), x=i, y=i % 20, size=1)
+                    for i in range(size)
+                ]
+                exercise_cache.clear()
+
+                with self.assertWithinBudget(
+                    f"evaluate_solution[size={size}]",
+                    Budget(queries=1, max_kib=128, max_ms=250 + 0.1 * size),
+                ):
+                    ExerciseService.evaluate_solution(exercise.id, solution)
+
+                with self.assertWithinBudget(
+                    f"evaluate_solution_cached[size={size}]",
+                    Budget(queries=0, max_kib=128, max_ms=250 + 0.1 * size),
+                ):
+                    ExerciseService.evaluate_solution(exercise.id, solution)
+
+    def test_get_stats(self):
+        exercise = ExerciseService.create_exercises([exercise_dto(0)])[0]
+
+        # an exercise that was never evaluated also checks that it exists
+        with self.assertWithinBudget("get_stats[empty]", _read_budget(2, 0)):
+            ExerciseService.get_stats(exercise.id)
+
+        ExerciseService.evaluate_solution(
+            exercise.id, [ExerciseDataPointDto(id=uuid4(), x=1, y=1, size=1)]
+        )
+        stats_recorder.flush()
+
+        with self.assertWithinBudget("get_stats[flushed]", _read_budget(1, 0)):
+            ExerciseService.get_stats(exercise.id)
+
+    def test_create_exercises(self):
+        # per exercise: next order, 2 uniqueness checks from full_clean, insert,
+        # refresh and loading the points back. SQLite inserts at most 199 points
+        # per statement, so the sizes are kept below that to make counts exact
+        for size in (0, 10, 150):
+            with self.subTest(size=size):
+                num_exercises = 3
+                point_inserts = num_exercises if size else 0
+
+                with self.assertWithinBudget(
+                    f"create_exercises[size={size}]",
+                    Budget(
+                        queries=6 * num_exercises + point_inserts,
+                        max_kib=256 + 4 * size * num_exercises,
+                        max_ms=500 + size * num_exercises,
+                    ),
+                ):
+                    ExerciseService.create_exercises(
+                        [exercise_dto(size) for _ in range(num_exercises)]
+                    )
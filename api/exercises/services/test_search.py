@@ -0,0 +1,137 @@
+from django.core.exceptions import ValidationError
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection, models
+from django.test import TestCase, TransactionTestCase
+
+from exercises.models import Exercise
+from exercises.services import search
+from exercises.services.search import (
+    Fts5SearchBackend,
+    LikeSearchBackend,
+    search_exercises,
+)
+from exercises.services.service import ExerciseService
+from exercises.testing import create_exercise
+
+
+def _create(title: str, description: str = "no match here"):
+    return create_exercise(title=title, description=description)
+
+
+class SearchTest(TestCase):
+    def test_uses_fts5_on_sqlite(self):
+        self.assertIsInstance(search.backend(), Fts5SearchBackend)
+
+    def test_ranks_title_matches_first(self):
+        in_description = _create("Bubbles", "find the temperature of the week")
+        in_title = _create("Temperature readings")
+        _create("Unrelated")
+
+        page = search_exercises("temperature", limit=10)
+
+        self.assertEqual(
+            [exercise.id for exercise in page.exercises],
+            [in_title.id, in_description.id],
+        )
+        self.assertIsNone(page.next_cursor)
+
+    def test_matches_every_term_and_prefixes(self):
+        both = _create("Rainfall in Spain", "monthly rainfall")
+        _create("Rainfall in France")
+
+        page = search_exercises("rainfall spa", limit=10)
+
+        self.assertEqual([exercise.id for exercise in page.exercises], [both.id])
+
+    def test_ignores_operators_in_the_query(self):
+        exercise = _create("Cost AND price")
+
+        # they are searched as plain words
+        page = search_exercises('cost" AND (price*', limit=10)
+
+        self.assertEqual([exercise.id for exercise in page.exercises], [exercise.id])
+
+    def test_keyset_pagination(self):
+        created = {_create(f"Population {i}").id for i in range(5)}
+
+        seen = []
+        cursor = None
+        while True:
+            page = search_exercises("population", limit=2, cursor=cursor)
+            seen += [exercise.id for exercise in page.exercises]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(set(seen), created)
+
+    def test_index_follows_writes(self):
+        exercise = _create("Speed of light")
+
+        Exercise.objects.filter(id=exercise.id).update(title="Speed of sound")
+        self.assertEqual(search_exercises("light", limit=10).exercises, [])
+        self.assertEqual(len(search_exercises("sound", limit=10).exercises), 1)
+
+        ExerciseService.delete_exercises([exercise.id])
+        self.assertEqual(search_exercises("sound", limit=10).exercises, [])
+
+    def test_like_backend_matches_the_same_exercises(self):
+        for i in range(3):
+            _create(f"Height {i}", "of the students")
+        _create("Weight", "of the students")
+
+        fts = Fts5SearchBackend().search(["students", "heig"], 10, None)
+        like = LikeSearchBackend().search(["students", "heig"], 10, None)
+
+        self.assertEqual(
+            {exercise.id for exercise, _ in fts}, {exercise.id for exercise, _ in like}
+        )
+        self.assertEqual(len(like), 3)
+
+    def test_invalid_queries(self):
+        with self.assertRaises(ValidationError):
+            search_exercises("  !? ", limit=10)
+        with self.assertRaises(ValidationError):
+            search_exercises("height", limit=10, cursor="not a cursor")
+
+
+class SearchIndexMigrationTest(TransactionTestCase):
+    def _alter_title(self, max_length: int) -> None:
+        # SQLite's schema editor rebuilds the table, like a migration would
+        old = Exercise._meta.get_field("title")
+        new = models.CharField(max_length=max_length)
+        new.set_attributes_from_name("title")
+        new.model = Exercise
+        with connection.schema_editor() as editor:
+            editor.alter_field(Exercise, old, new)
+
+    def _restore_title(self) -> None:
+        self._alter_title(200)
+        search.ensure_search_index("default")
+
+    def test_index_survives_table_rebuilds(self):
+        before = _create("Rainfall before")
+        self._alter_title(250)
+        self.addCleanup(self._restore_title)
+        self.assertNotIn(
+            f"{search.FTS_TABLE}_insert",
+            {
+                trigger
+                for trigger, in connection.cursor().execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+                )
+            },
+        )
+
+        emit_post_migrate_signal(verbosity=0, interactive=False, db="default")
+        after = _create("Rainfall after")
+        renamed = _create("Snowfall")
+        Exercise.objects.filter(id=renamed.id).update(title="Rainfall renamed")
+
+        page = search_exercises("rainfall", limit=10)
+        self.assertEqual(
+            {exercise.id for exercise in page.exercises},
+            {before.id, after.id, renamed.id},
+        )
+        self.assertFalse(search.ensure_search_index("default"))
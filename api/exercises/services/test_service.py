@@ -1,9 +1,15 @@
+from unittest import mock
 from uuid import uuid4
-from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
-from exercises.models.range_exercise import ConstraintType
-from exercises.services.service import ExerciseService, CreateExerciseDto, CreateExerciseDataPointDto, ExerciseDataPointDto
+from exercises.models import Exercise, ExerciseStats, LearnerProgress
+from exercises.models.range_exercise import ConstraintType, ExerciseDataPoint
+from exercises.services.service import ExerciseService, CreateExerciseDto, CreateExerciseDataPointDto, ExerciseDataPointDto, PatchExerciseDataPointsDto, UpsertExerciseDataPointDto, CloneTransformDto, ExerciseSummaryDto
+from exercises.models.range_exercise import GeneratorDistribution
+from exercises.services.generator import GeneratorSpecDto
 
 
 class TestExerciseService(TestCase):
@@ -145,3 +151,474 @@ class TestExerciseService(TestCase):
 
         with self.assertRaises(ValidationError):
             ExerciseService.evaluate_solution(ex.id, [])
+
+    def test_evaluate_violations(self):
+        ex = ExerciseService.create_exercises([
+            CreateExerciseDto(
+                title="Violations Test",
+                description="between 10 and 20",
+                constraint_type=ConstraintType.BETWEEN,
+                lower_bound=10,
+                upper_bound=20,
+            )
+        ])[0]
+
+        violations = ExerciseService.evaluate_violations(
+            ex.id, [12, 7, 9, 10, 20, 23.5, 15, 21]
+        )
+
+        self.assertFalse(violations.is_correct)
+        self.assertEqual(violations.count, 4)
+        self.assertEqual(violations.worst_margin, 3.5)
+        self.assertEqual(violations.indices(), [1, 2, 5, 7])
+        self.assertEqual(violations.runs(), [(1, 2), (5, 1), (7, 1)])
+        # bits 1, 2, 5 and 7
+        self.assertEqual(violations.bitset(), "pg==")
+
+    def test_evaluate_violations_matches_evaluate_solution(self):
+        for constraint_type, bounds in [
+            (ConstraintType.LT, {"upper_bound": 20}),
+            (ConstraintType.GT, {"lower_bound": 20}),
+            (ConstraintType.BETWEEN, {"lower_bound": 10, "upper_bound": 20}),
+        ]:
+            ex = ExerciseService.create_exercises([
+                CreateExerciseDto(
+                    title="Violations Test",
+                    description="violations",
+                    constraint_type=constraint_type,
+                    **bounds,
+                )
+            ])[0]
+            for ys in ([12, 13], [21, 31], [20], [10], [5, 25]):
+                solution = [ExerciseDataPointDto(id=uuid4(), x=1, y=y, size=1) for y in ys]
+                violations = ExerciseService.evaluate_violations(ex.id, ys)
+                self.assertEqual(
+                    violations.is_correct,
+                    ExerciseService.evaluate_solution(ex.id, solution),
+                    f"{constraint_type} {ys}",
+                )
+
+    def test_record_progress(self):
+        ex = ExerciseService.create_exercises([
+            CreateExerciseDto(
+                title="Progress Test",
+                description="less than 20",
+                constraint_type=ConstraintType.LT,
+                upper_bound=20,
+            )
+        ])[0]
+        learner = uuid4()
+        wrong = [ExerciseDataPointDto(id=uuid4(), x=1, y=25, size=1)]
+        right = [ExerciseDataPointDto(id=uuid4(), x=1, y=5, size=1)]
+
+        ExerciseService.evaluate_solution(ex.id, wrong, learner)
+        progress = LearnerProgress.objects.get(learner_id=learner, exercise=ex.id)
+        self.assertEqual(progress.attempts, 1)
+        self.assertFalse(progress.solved)
+
+        ExerciseService.evaluate_solution(ex.id, right, learner)
+        progress.refresh_from_db()
+        solved_at = progress.solved_at
+        self.assertTrue(progress.solved)
+        self.assertIsNotNone(solved_at)
+
+        # a wrong solution after solving it doesn't unsolve it
+        ExerciseService.evaluate_solution(ex.id, wrong, learner)
+        progress.refresh_from_db()
+        self.assertEqual(progress.attempts, 3)
+        self.assertTrue(progress.solved)
+        self.assertEqual(progress.solved_at, solved_at)
+
+        # other learners and anonymous evaluations aren't affected
+        ExerciseService.evaluate_solution(ex.id, right)
+        self.assertEqual(LearnerProgress.objects.count(), 1)
+
+    def test_get_resume(self):
+        exercises = ExerciseService.create_exercises([
+            CreateExerciseDto(
+                title=f"Resume Test {i}",
+                description="less than 20",
+                constraint_type=ConstraintType.LT,
+                upper_bound=20,
+            )
+            for i in range(4)
+        ])
+        ExerciseService.archive_exercises([exercises[1].id])
+        learner = uuid4()
+
+        self.assertEqual(ExerciseService.get_resume(learner), exercises[0].id)
+
+        ExerciseService.record_progress(learner, exercises[0].id, True)
+        ExerciseService.record_progress(learner, exercises[2].id, False)
+        # the archived exercise is skipped, the attempted one isn't solved yet
+        self.assertEqual(ExerciseService.get_resume(learner), exercises[2].id)
+        self.assertEqual(ExerciseService.get_resume(uuid4()), exercises[0].id)
+
+        ExerciseService.record_progress(learner, exercises[2].id, True)
+        ExerciseService.record_progress(learner, exercises[3].id, True)
+        self.assertIsNone(ExerciseService.get_resume(learner))
+
+        with self.assertNumQueries(1):
+            ExerciseService.get_resume(learner)
+
+    def test_clone_exercises(self):
+        source = ExerciseService.create_exercises([
+            CreateExerciseDto(
+                title="Clone Test",
+                description="between 10 and 20",
+                constraint_type=ConstraintType.BETWEEN,
+                lower_bound=10,
+                upper_bound=20,
+                is_active=False,
+                points=[
+                    CreateExerciseDataPointDto(x=1, y=12, size=2),
+                    CreateExerciseDataPointDto(x=3, y=18, size=4),
+                ],
+            )
+        ])[0]
+        other = ExerciseService.create_exercises([
+            CreateExerciseDto(
+                title="Other",
+                description="less than 20",
+                constraint_type=ConstraintType.LT,
+                upper_bound=20,
+            )
+        ])[0]
+
+        # savepoint, sources, generated check, order, 2 inserts, copies, release
+        with self.assertNumQueries(8):
+            result = ExerciseService.clone_exercises(
+                [source.id, other.id, source.id],
+                CloneTransformDto(x_scale=-2, y_shift=5, size_scale=0.5, bound_shift=5),
+                title_suffix=" (v2)",
+            )
+
+        self.assertEqual(result.points, 4)
+        self.assertEqual([c.order for c in result.exercises], [3, 4, 5])
+        first, second, third = result.exercises
+        self.assertEqual(first.title, "Clone Test (v2)")
+        self.assertNotEqual(first.id, third.id)
+
+        clone = Exercise.objects.get(id=first.id)
+        self.assertEqual((clone.lower_bound, clone.upper_bound), (15, 25))
+        self.assertFalse(clone.is_active)
+        self.assertEqual(
+            sorted(clone.data_points.values_list("x", "y", "size")),
+            [(-6, 23, 2), (-2, 17, 1)],
+        )
+        self.assertEqual(
+            ExerciseSummaryDto.from_model(clone),
+            ExerciseService._compute_summary(clone.id),
+        )
+        self.assertEqual(Exercise.objects.get(id=second.id).upper_bound, 25)
+
+        # the sources are untouched
+        self.assertEqual(
+            sorted(
+                ExerciseDataPoint.objects.filter(exercise_id=source.id).values_list(
+                    "x", "y", "size"
+                )
+            ),
+            [(1, 12, 2), (3, 18, 4)],
+        )
+
+    @override_settings(EXERCISES_IMPORT_BATCH_SIZE=2)
+    def test_clone_exercises_on_other_databases(self):
+        source = self._create_for_patch([1, 5, 10])
+
+        # copied through the ORM where the ids can't be generated in SQL
+        with mock.patch.object(connection, "vendor", "other"):
+            result = ExerciseService.clone_exercises(
+                [source.id, source.id],
+                CloneTransformDto(y_scale=-1, bound_shift=1),
+                title_suffix=" (v2)",
+            )
+
+        self.assertEqual(result.points, 6)
+        first, second = result.exercises
+        self.assertEqual(first.title, "Patch Test (v2)")
+        self.assertEqual(second.order, first.order + 1)
+        clone = Exercise.objects.get(id=first.id)
+        self.assertEqual((clone.lower_bound, clone.upper_bound), (6, None))
+        self.assertEqual(
+            sorted(clone.data_points.values_list("y", flat=True)), [-10, -5, -1]
+        )
+        self.assertEqual(
+            ExerciseSummaryDto.from_model(clone),
+            ExerciseService._compute_summary(clone.id),
+        )
+
+    def test_clone_exercises_errors(self):
+        ex = ExerciseService.create_exercises([
+            CreateExerciseDto(
+                title="Clone Errors",
+                description="greater than 5",
+                constraint_type=ConstraintType.GT,
+                lower_bound=5,
+                generator=GeneratorSpecDto(
+                    distribution=GeneratorDistribution.UNIFORM,
+                    seed=1,
+                    count=10,
+                    x=(0, 10),
+                    y=(0, 10),
+                    size=(1, 2),
+                ),
+            )
+        ])[0]
+
+        with self.assertRaises(ObjectDoesNotExist):
+            ExerciseService.clone_exercises([ex.id, uuid4()])
+        with self.assertRaises(ValidationError):
+            ExerciseService.clone_exercises([ex.id], CloneTransformDto(y_scale=2))
+        with self.assertRaises(ValidationError):
+            ExerciseService.clone_exercises([ex.id], CloneTransformDto(bound_scale=0))
+
+        # generated exercises can still be cloned as they are
+        clone = ExerciseService.clone_exercises([ex.id]).exercises[0]
+        self.assertEqual(
+            ExerciseService.get(clone.id).data_points,
+            ExerciseService.get(ex.id).data_points,
+        )
+
+    def test_create_exercise_summary(self):
+        ex = ExerciseService.create_exercises([
+            CreateExerciseDto(
+                title="Summary Test",
+                description="summary",
+                constraint_type=ConstraintType.GT,
+                lower_bound=5,
+                points=[
+                    CreateExerciseDataPointDto(x=1, y=15, size=2),
+                    CreateExerciseDataPointDto(x=-3, y=18, size=1.5),
+                ],
+            )
+        ])[0]
+
+        self.assertEqual(ex.summary.point_count, 2)
+        self.assertEqual((ex.summary.min_x, ex.summary.max_x), (-3, 1))
+        self.assertEqual((ex.summary.min_y, ex.summary.max_y), (15, 18))
+        self.assertEqual(ex.summary.total_size, 3.5)
+        self.assertEqual(ExerciseService.get(ex.id).summary, ex.summary)
+
+    def test_point_save_updates_summary(self):
+        ex = ExerciseService.create_exercises([
+            CreateExerciseDto(
+                title="Summary Test",
+                description="summary",
+                constraint_type=ConstraintType.GT,
+                lower_bound=5,
+                points=[CreateExerciseDataPointDto(x=1, y=15, size=2)],
+            )
+        ])[0]
+        ExerciseService.get(ex.id)
+
+        ExerciseDataPoint(exercise_id=ex.id, x=10, y=-1, size=1).save()
+
+        summary = ExerciseService.get(ex.id).summary
+        self.assertEqual(summary.point_count, 2)
+        self.assertEqual((summary.min_x, summary.max_x), (1, 10))
+        self.assertEqual((summary.min_y, summary.max_y), (-1, 15))
+
+    def test_point_delete_updates_summary(self):
+        ex = ExerciseService.create_exercises([
+            CreateExerciseDto(
+                title="Summary Test",
+                description="summary",
+                constraint_type=ConstraintType.GT,
+                lower_bound=5,
+                points=[
+                    CreateExerciseDataPointDto(x=1, y=15, size=2),
+                    CreateExerciseDataPointDto(x=-3, y=18, size=1.5),
+                    CreateExerciseDataPointDto(x=7, y=6, size=1),
+                ],
+            )
+        ])[0]
+        ExerciseService.get(ex.id)
+
+        ExerciseDataPoint.objects.get(exercise_id=ex.id, x=-3).delete()
+
+        summary = ExerciseService.get(ex.id).summary
+        self.assertEqual(summary.point_count, 2)
+        self.assertEqual((summary.min_x, summary.max_x), (1, 7))
+        self.assertEqual((summary.min_y, summary.max_y), (6, 15))
+
+        ExerciseDataPoint.objects.filter(exercise_id=ex.id, x__gt=0).delete()
+
+        summary = ExerciseService.get(ex.id).summary
+        self.assertEqual(summary.point_count, 0)
+        self.assertEqual(summary.total_size, 0)
+        self.assertEqual(ExerciseService.get(ex.id).data_points, [])
+
+    def test_list(self):
+        created = ExerciseService.create_exercises([
+            CreateExerciseDto(
+                title=f"List {i}",
+                description="list",
+                constraint_type=ConstraintType.GT,
+                lower_bound=5,
+                points=[CreateExerciseDataPointDto(x=1, y=6, size=1)] * i,
+            )
+            for i in range(3)
+        ])
+
+        with self.assertNumQueries(1):
+            first_page = ExerciseService.list(limit=2)
+        second_page = ExerciseService.list(after_order=first_page[-1].order, limit=2)
+
+        self.assertEqual(
+            [ex.id for ex in first_page + second_page], [ex.id for ex in created]
+        )
+        self.assertEqual([ex.summary.point_count for ex in first_page], [0, 1])
+
+    def _create_for_patch(self, ys):
+        return ExerciseService.create_exercises([
+            CreateExerciseDto(
+                title="Patch Test",
+                description="patch",
+                constraint_type=ConstraintType.GT,
+                lower_bound=5,
+                points=[CreateExerciseDataPointDto(x=y, y=y, size=1) for y in ys],
+            )
+        ])[0]
+
+    def test_patch_data_points(self):
+        ex = self._create_for_patch([1, 5, 10])
+        low, mid, high = sorted(ex.data_points, key=lambda point: point.y)
+        ExerciseService.get(ex.id)
+
+        result = ExerciseService.patch_data_points(ex.id, PatchExerciseDataPointsDto(
+            upsert=[
+                UpsertExerciseDataPointDto(id=mid.id, x=6, y=6, size=2),
+                UpsertExerciseDataPointDto(x=20, y=20, size=3),
+            ],
+            delete=[low.id, uuid4()],
+        ))
+
+        self.assertEqual((result.updated, result.deleted), (1, 1))
+        self.assertEqual(len(result.created), 1)
+
+        retrieved = ExerciseService.get(ex.id)
+        self.assertEqual(
+            sorted((p.id, p.y) for p in retrieved.data_points),
+            sorted([(mid.id, 6), (high.id, 10), (result.created[0], 20)]),
+        )
+        self.assertEqual(retrieved.summary, result.summary)
+        self.assertEqual(result.summary.point_count, 3)
+        self.assertEqual((result.summary.min_y, result.summary.max_y), (6, 20))
+        self.assertEqual(result.summary.total_size, 6)
+
+    def test_patch_summary_is_incremental(self):
+        ex = self._create_for_patch([1, 5, 10])
+        mid = next(point for point in ex.data_points if point.y == 5)
+        patch = PatchExerciseDataPointsDto(
+            upsert=[UpsertExerciseDataPointDto(id=mid.id, x=7, y=7, size=1)]
+        )
+
+        with self.assertNumQueries(6):
+            # savepoint, lock, read the patched points, update, summary and release,
+            # without aggregating the other points
+            result = ExerciseService.patch_data_points(ex.id, patch)
+
+        self.assertEqual((result.summary.min_y, result.summary.max_y), (1, 10))
+
+    def test_patch_invalid(self):
+        ex = self._create_for_patch([1])
+        other = self._create_for_patch([2])
+        point_id = ex.data_points[0].id
+
+        invalid_patches = [
+            PatchExerciseDataPointsDto(
+                upsert=[UpsertExerciseDataPointDto(id=point_id, x=1, y=1, size=1)],
+                delete=[point_id],
+            ),
+            PatchExerciseDataPointsDto(
+                upsert=[UpsertExerciseDataPointDto(id=point_id, x=1, y=1, size=1)] * 2
+            ),
+            PatchExerciseDataPointsDto(delete=[other.data_points[0].id]),
+        ]
+        for patch in invalid_patches:
+            with self.assertRaises(ValidationError):
+                ExerciseService.patch_data_points(ex.id, patch)
+
+        self.assertEqual(ExerciseDataPoint.objects.count(), 2)
+
+    def test_archived_exercises_leave_navigation(self):
+        first, second, third = (self._create_for_patch([1]) for _ in range(3))
+
+        self.assertEqual(ExerciseService.archive_exercises([first.id, second.id]), 2)
+        self.assertEqual(ExerciseService.archive_exercises([first.id]), 0)
+
+        self.assertEqual(ExerciseService.get_first().id, third.id)
+        self.assertEqual(ExerciseService.get_next(first.id), third.id)
+        self.assertFalse(ExerciseService.get(first.id).is_active)
+
+    def test_delete_exercises_in_batches(self):
+        doomed = self._create_for_patch(range(25))
+        kept = self._create_for_patch(range(3))
+        ExerciseStats.objects.create(exercise_id=doomed.id, attempts=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = ExerciseService.delete_exercises([doomed.id], batch_size=10)
+
+        self.assertEqual((result.exercises, result.points), (1, 25))
+        point_deletes = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith('DELETE FROM "exercises_exercisedatapoint"')
+        ]
+        # 10 + 10 + 5, then the cascade finds nothing left
+        self.assertEqual(len(point_deletes), 4)
+        self.assertFalse(
+            any(
+                query["sql"].startswith("SELECT")
+                and '"exercises_exercisedatapoint"' in query["sql"]
+                for query in queries
+            )
+        )
+
+        self.assertFalse(Exercise.objects.filter(id=doomed.id).exists())
+        self.assertFalse(ExerciseStats.objects.exists())
+        self.assertEqual(ExerciseDataPoint.objects.count(), 3)
+        self.assertEqual(ExerciseService.get_first().id, kept.id)
+
+    def test_replace_data_points_in_batches(self):
+        ex = self._create_for_patch([1, 5, 10])
+        ExerciseService.get(ex.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            summary = ExerciseService.replace_data_points(
+                ex.id,
+                (CreateExerciseDataPointDto(x=i, y=-i, size=0.5) for i in range(25)),
+                batch_size=10,
+            )
+
+        self.assertEqual(summary, ExerciseSummaryDto(
+            point_count=25, min_x=0, max_x=24, min_y=-24, max_y=0, total_size=12.5
+        ))
+        inserts = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith('INSERT INTO "exercises_exercisedatapoint"')
+        ]
+        self.assertEqual(len(inserts), 3)
+
+        refreshed = ExerciseService.get(ex.id)
+        self.assertEqual(refreshed.summary, summary)
+        self.assertEqual(sorted(point.x for point in refreshed.data_points), list(range(25)))
+
+    def test_replace_data_points_rolls_back_on_error(self):
+        ex = self._create_for_patch([1, 5, 10])
+
+        def points():
+            yield CreateExerciseDataPointDto(x=1, y=1, size=1)
+            raise ValidationError("line 3: y is not a number")
+
+        with self.assertRaises(ValidationError):
+            ExerciseService.replace_data_points(ex.id, points(), batch_size=1)
+
+        self.assertEqual(ExerciseDataPoint.objects.filter(exercise_id=ex.id).count(), 3)
+        self.assertEqual(Exercise.objects.get(id=ex.id).point_count, 3)
+
+    def test_replace_data_points_of_missing_exercise(self):
+        with self.assertRaises(ObjectDoesNotExist):
+            ExerciseService.replace_data_points(uuid4(), [])
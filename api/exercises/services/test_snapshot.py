@@ -0,0 +1,167 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from exercises.models.range_exercise import ConstraintType, GeneratorDistribution
+from exercises.services.cache import exercise_cache
+from exercises.services.generator import GeneratorSpecDto
+from exercises.services.service import (
+    ExerciseService,
+    CreateExerciseDto,
+    CreateExerciseDataPointDto,
+    ExerciseDataPointDto,
+    PatchExerciseDataPointsDto,
+    UpsertExerciseDataPointDto,
+)
+from exercises.services.snapshot import ExerciseSnapshot, build_snapshot, snapshots
+from exercises.services.stats import stats_recorder
+from exercises.testing import LOCMEM_CACHES
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    EXERCISES_SNAPSHOT_AUTO_REBUILD=False,
+    EXERCISES_SNAPSHOT_CHECK_INTERVAL=0,
+)
+class TestSnapshot(TestCase):
+    def setUp(self):
+        exercise_cache.clear()
+        self.addCleanup(stats_recorder.clear)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "exercises.snapshot")
+
+        self.stored, self.archived, self.generated = ExerciseService.create_exercises(
+            [
+                CreateExerciseDto(
+                    title="Stored",
+                    description="between 10 and 20",
+                    constraint_type=ConstraintType.BETWEEN,
+                    lower_bound=10,
+                    upper_bound=20,
+                    points=[
+                        CreateExerciseDataPointDto(x=i, y=i / 2, size=1)
+                        for i in range(50)
+                    ],
+                ),
+                CreateExerciseDto(
+                    title="Archived",
+                    description="less than 5",
+                    constraint_type=ConstraintType.LT,
+                    upper_bound=5,
+                    is_active=False,
+                    points=[CreateExerciseDataPointDto(x=1, y=1, size=1)],
+                ),
+                CreateExerciseDto(
+                    title="Generated",
+                    description="less than 5",
+                    constraint_type=ConstraintType.LT,
+                    upper_bound=5,
+                    generator=GeneratorSpecDto(
+                        distribution=GeneratorDistribution.UNIFORM,
+                        seed=3,
+                        count=20,
+                        x=(0, 1),
+                        y=(0, 1),
+                        size=(1, 2),
+                    ),
+                ),
+            ]
+        )
+
+    def _serving(self):
+        return self.settings(EXERCISES_SNAPSHOT_FILE=self.path)
+
+    def test_round_trip(self):
+        info = build_snapshot(self.path)
+        self.assertEqual((info.exercises, info.points), (2, 50))
+
+        snapshot = ExerciseSnapshot(self.path)
+        for exercise in (self.stored, self.generated):
+            from_snapshot = snapshot.get(exercise.id)
+            from_db = ExerciseService.get(exercise.id)
+
+            self.assertEqual(from_snapshot.with_variant(), from_db)
+            self.assertEqual(
+                snapshot.get_constraint(str(exercise.id)),
+                ExerciseService._get_constraint(exercise.id),
+            )
+
+        self.assertIsNone(snapshot.get(self.archived.id))
+        self.assertIsNone(snapshot.get("not an id"))
+        self.assertEqual(snapshot.first_id(), self.stored.id)
+        self.assertEqual(snapshot.next_id(self.stored.id), (True, self.generated.id))
+        self.assertEqual(snapshot.next_id(self.generated.id), (True, None))
+        self.assertEqual(snapshot.next_id(self.archived.id), (False, None))
+
+    def test_reads_are_served_from_the_snapshot(self):
+        build_snapshot(self.path)
+
+        with self._serving(), self.assertNumQueries(0):
+            self.assertEqual(ExerciseService.get_first().id, self.stored.id)
+            self.assertEqual(
+                ExerciseService.get_next(self.stored.id), self.generated.id
+            )
+            self.assertIsNone(ExerciseService.get_next(self.generated.id))
+            self.assertEqual(
+                len(ExerciseService.get(self.generated.id, seed=4).data_points), 20
+            )
+            self.assertTrue(
+                ExerciseService.evaluate_solution(
+                    self.stored.id,
+                    [ExerciseDataPointDto(id=self.stored.id, x=1, y=15, size=1)],
+                )
+            )
+
+        with self._serving():
+            # exercises missing from the snapshot are read from the DB
+            self.assertEqual(ExerciseService.get(self.archived.id).title, "Archived")
+            self.assertEqual(
+                ExerciseService.get_next(self.archived.id), self.generated.id
+            )
+
+    def test_writes_make_the_snapshot_stale(self):
+        build_snapshot(self.path)
+        point = self.stored.data_points[0]
+
+        ExerciseService.patch_data_points(
+            self.stored.id,
+            PatchExerciseDataPointsDto(
+                upsert=[UpsertExerciseDataPointDto(id=point.id, x=0, y=99, size=1)]
+            ),
+        )
+
+        with self._serving():
+            self.assertIsNone(snapshots.current())
+            patched = ExerciseService.get(self.stored.id)
+            self.assertIn(99, [p.y for p in patched.data_points])
+
+            build_snapshot(self.path)
+            self.assertIsNotNone(snapshots.current())
+            with self.assertNumQueries(0):
+                self.assertEqual(ExerciseService.get(self.stored.id), patched)
+
+    def test_invalid_file_is_ignored(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a snapshot")
+
+        with self._serving(), self.assertLogs("exercises.services.snapshot", "ERROR"):
+            self.assertIsNone(snapshots.current())
+            self.assertEqual(ExerciseService.get_first().id, self.stored.id)
+
+    def test_stale_snapshot_is_rebuilt_once(self):
+        build_snapshot(self.path)
+        exercise_cache.invalidate(self.stored.id)
+
+        with self._serving(), self.settings(
+            EXERCISES_SNAPSHOT_AUTO_REBUILD=True
+        ), mock.patch("exercises.services.snapshot.threading.Thread") as thread:
+            self.assertIsNone(snapshots.current())
+            self.assertIsNone(snapshots.current())
+
+        # the second call finds the rebuild lock taken
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
@@ -0,0 +1,114 @@
+from unittest import mock
+from uuid import uuid4
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.signals import request_finished
+from django.db import OperationalError
+from django.test import TestCase
+
+from exercises.models import ExerciseStats
+from exercises.models.range_exercise import ConstraintType
+from exercises.services.service import (
+    ExerciseService,
+    CreateExerciseDto,
+    ExerciseDataPointDto,
+)
+from exercises.services.stats import ExerciseStatsRecorder, stats_recorder
+
+
+class TestExerciseStats(TestCase):
+    def setUp(self):
+        stats_recorder.clear()
+        self.exercise = ExerciseService.create_exercises(
+            [
+                CreateExerciseDto(
+                    title="Stats Test",
+                    description="between 10 and 20",
+                    constraint_type=ConstraintType.BETWEEN,
+                    lower_bound=10,
+                    upper_bound=20,
+                )
+            ]
+        )[0]
+
+    def _solution(self, *ys):
+        return [ExerciseDataPointDto(id=uuid4(), x=1, y=y, size=1) for y in ys]
+
+    def test_recorder_flushes_in_batches(self):
+        """counters are only written once flush_size attempts are pending"""
+        recorder = ExerciseStatsRecorder(flush_size=3, flush_interval=3600)
+
+        recorder.record(self.exercise.id, 10, 15, True)
+        recorder.record(self.exercise.id, 5, 25, False)
+        recorder.flush_if_due()
+        self.assertFalse(ExerciseStats.objects.exists())
+
+        recorder.record(self.exercise.id, 12, 18, True)
+        # recording alone never writes
+        self.assertFalse(ExerciseStats.objects.exists())
+        recorder.flush_if_due()
+        stats = ExerciseStats.objects.get(exercise_id=self.exercise.id)
+        self.assertEqual(stats.attempts, 3)
+        self.assertEqual(stats.successes, 2)
+        self.assertEqual(stats.lowest_min_y, 5)
+        self.assertEqual(stats.highest_max_y, 25)
+        self.assertEqual(stats.min_y_sum, 27)
+
+        recorder.record(self.exercise.id, 1, 30, False)
+        recorder.flush()
+        stats.refresh_from_db()
+        self.assertEqual(stats.attempts, 4)
+        self.assertEqual(stats.lowest_min_y, 1)
+        self.assertEqual(stats.highest_max_y, 30)
+
+    def test_failed_flush_keeps_the_counters(self):
+        recorder = ExerciseStatsRecorder(flush_size=1, flush_interval=3600)
+        recorder.record(self.exercise.id, 10, 15, True)
+
+        with mock.patch.object(
+            recorder, "_write", side_effect=OperationalError("database is locked")
+        ), self.assertLogs("exercises.services.stats", "ERROR"):
+            recorder.flush_if_due()
+
+        recorder.record(self.exercise.id, 5, 25, False)
+        self.assertEqual(recorder.pending(self.exercise.id).attempts, 2)
+        recorder.flush_if_due()
+        stats = ExerciseStats.objects.get(exercise_id=self.exercise.id)
+        self.assertEqual((stats.attempts, stats.successes), (2, 1))
+
+    def test_flushed_when_a_request_finishes(self):
+        with mock.patch.object(stats_recorder, "flush_size", 1):
+            ExerciseService.evaluate_solution(self.exercise.id, self._solution(12))
+            self.assertFalse(ExerciseStats.objects.exists())
+
+            request_finished.send(sender=None)
+
+        self.assertEqual(
+            ExerciseStats.objects.get(exercise_id=self.exercise.id).attempts, 1
+        )
+
+    def test_evaluate_updates_stats(self):
+        """evaluating a solution is reflected in the stats, even before a flush"""
+        ExerciseService.evaluate_solution(self.exercise.id, self._solution(12, 14))
+        ExerciseService.evaluate_solution(self.exercise.id, self._solution(8, 14))
+
+        stats = ExerciseService.get_stats(self.exercise.id)
+        self.assertEqual(stats.attempts, 2)
+        self.assertEqual(stats.successes, 1)
+        self.assertEqual(stats.success_rate, 0.5)
+        self.assertEqual(stats.min_y.mean, 10)
+        self.assertEqual(stats.min_y.stddev, 2)
+        self.assertEqual(stats.min_y.extreme, 8)
+        self.assertEqual(stats.max_y.extreme, 14)
+
+        stats_recorder.flush()
+        self.assertEqual(ExerciseService.get_stats(self.exercise.id), stats)
+
+    def test_get_stats_without_attempts(self):
+        stats = ExerciseService.get_stats(self.exercise.id)
+        self.assertEqual(stats.attempts, 0)
+        self.assertIsNone(stats.success_rate)
+        self.assertIsNone(stats.min_y.mean)
+
+    def test_get_stats_not_found(self):
+        with self.assertRaises(ObjectDoesNotExist):
+            ExerciseService.get_stats(uuid4())
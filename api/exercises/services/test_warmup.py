@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from exercises import apps
+
+from exercises.models.range_exercise import ConstraintType
+from exercises.services.cache import exercise_cache
+from exercises.services.service import (
+    ExerciseService,
+    CreateExerciseDto,
+    CreateExerciseDataPointDto,
+)
+from exercises.testing import LOCMEM_CACHES
+from exercises.services.warmup import warm_up
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestWarmup(TestCase):
+    def setUp(self):
+        self.exercises = ExerciseService.create_exercises(
+            [
+                CreateExerciseDto(
+                    title=f"Warmup {i}",
+                    description="less than 20",
+                    constraint_type=ConstraintType.LT,
+                    upper_bound=20,
+                    is_active=i != 1,
+                    points=[CreateExerciseDataPointDto(x=1, y=2, size=3)],
+                )
+                for i in range(3)
+            ]
+        )
+        exercise_cache.clear()
+
+    def test_preloads_active_exercises(self):
+        with self.assertLogs("exercises.services.warmup", "INFO"):
+            report = warm_up(limit=10)
+
+        self.assertEqual(report.exercises, 2)
+        self.assertEqual(
+            list(report.timings), ["connection", "urlconf", "exercises", "serializers"]
+        )
+
+        first, archived, last = self.exercises
+        with self.assertNumQueries(0):
+            ExerciseService.get(first.id)
+            ExerciseService.get(last.id)
+            ExerciseService._get_constraint(last.id)
+        # the exercise and its points
+        with self.assertNumQueries(2):
+            ExerciseService.get(archived.id)
+
+    def test_limit(self):
+        with self.assertLogs("exercises.services.warmup", "INFO"):
+            report = warm_up(limit=1)
+
+        self.assertEqual(report.exercises, 1)
+        with self.assertNumQueries(2):
+            ExerciseService.get(self.exercises[2].id)
+
+
+class TestStartWarmup(SimpleTestCase):
+    @mock.patch("exercises.apps.threading.Thread")
+    def test_only_when_enabled(self, thread):
+        with override_settings(EXERCISES_WARMUP_ON_STARTUP=False):
+            apps.start_warmup()
+        thread.assert_not_called()
+
+        with override_settings(EXERCISES_WARMUP_ON_STARTUP=True):
+            apps.start_warmup()
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once_with()
@@ -0,0 +1,85 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.db import connection
+from django.urls import get_resolver, reverse
+from rest_framework.renderers import JSONRenderer
+
+from exercises.models import Exercise
+from exercises.services.payloads import get_payload
+from exercises.services.service import ExerciseService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmupReportDto:
+    exercises: int = 0
+    # seconds taken by each step, in the order they ran
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def total(self) -> float:
+        return sum(self.timings.values())
+
+
+def warm_up(limit: Optional[int] = None) -> WarmupReportDto:
+    """
+    Does the work a cold worker would otherwise do on its first requests: opens the
+    DB connection, loads the URLconf, and fills the exercise cache with the
+    constraints and rendered payloads of the first `limit` active exercises
+    """
+    if limit is None:
+        limit = getattr(settings, "EXERCISES_WARMUP_LIMIT", 50)
+
+    report = WarmupReportDto()
+
+    def step(name: str, fn: Callable[[], object]) -> None:
+        start = time.perf_counter()
+        fn()
+        report.timings[name] = time.perf_counter() - start
+
+    def load_urlconf() -> None:
+        # compiles the URL patterns, the first request would do it otherwise
+        get_resolver().url_patterns
+        reverse("exercise-list")
+
+    def load_exercises() -> None:
+        # the same ordering the navigation uses
+        exercise_ids = list(
+            Exercise.objects.filter(is_active=True)
+            .order_by("order")
+            .values_list("id", flat=True)[:limit]
+        )
+        for exercise_id in exercise_ids:
+            ExerciseService._get_constraint(exercise_id)
+            # renders the payload too, which loads the exercise
+            get_payload(exercise_id)
+        report.exercises = len(exercise_ids)
+
+    def render_payload() -> None:
+        # imports the serializers and renderer code paths used by the responses
+        from exercises.serializers.exercises import ExerciseListItemSerializer
+
+        JSONRenderer().render(
+            [
+                ExerciseListItemSerializer.from_dto(exercise)
+                for exercise in ExerciseService.list(limit=1)
+            ]
+        )
+
+    step("connection", connection.ensure_connection)
+    step("urlconf", load_urlconf)
+    step("exercises", load_exercises)
+    step("serializers", render_payload)
+
+    logger.info(
+        "warmed up %d exercises in %.1f ms (%s)",
+        report.exercises,
+        report.total * 1000,
+        ", ".join(f"{name} {t * 1000:.1f} ms" for name, t in report.timings.items()),
+    )
+    return report
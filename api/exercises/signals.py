@@ -0,0 +1,47 @@
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from exercises.models import Exercise
+from exercises.models.range_exercise import ExerciseDataPoint, data_points_deleted
+from exercises.services.cache import exercise_cache
+from exercises.services.search import ensure_search_index
+from exercises.services.service import ExerciseService
+from exercises.services.stats import stats_recorder
+
+
+@receiver([post_save, post_delete], sender=Exercise)
+def invalidate_exercise(sender, instance: Exercise, **kwargs) -> None:
+    exercise_cache.invalidate_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=ExerciseDataPoint)
+def invalidate_data_point(sender, instance: ExerciseDataPoint, **kwargs) -> None:
+    # saving a single point can move any edge of the bounding box, so the summary is
+    # recomputed. Bulk writes go through the service, which refreshes it once
+    ExerciseService.refresh_summary(instance.exercise_id)
+    exercise_cache.invalidate_on_commit(instance.exercise_id)
+
+
+# there's intentionally no pre/post_delete receiver for data points: any delete
+# receiver makes Django load every point of an exercise into memory before deleting
+# it, instead of the single DELETE the service's deletes rely on. Point deletes send
+# data_points_deleted instead, except the service's own, which update the summary
+@receiver(data_points_deleted, sender=ExerciseDataPoint)
+def refresh_after_points_deleted(sender, exercise_ids, **kwargs) -> None:
+    for exercise_id in exercise_ids:
+        ExerciseService.refresh_summary(exercise_id)
+        exercise_cache.invalidate_on_commit(exercise_id)
+
+
+@receiver(request_finished)
+def flush_stats(sender, **kwargs) -> None:
+    # after the response was sent, so evaluations never wait for the batch write
+    stats_recorder.flush_if_due()
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using: str, **kwargs) -> None:
+    # a migration may have rebuilt exercises_exercise without the triggers
+    if sender.name == "exercises":
+        ensure_search_index(using)
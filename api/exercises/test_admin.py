@@ -0,0 +1,111 @@
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+
+from exercises.models import Exercise
+from exercises.models.range_exercise import ConstraintType, ExerciseDataPoint
+from exercises.services.service import (
+    CreateExerciseDataPointDto,
+    CreateExerciseDto,
+    ExerciseService,
+)
+
+
+class ExerciseAdminTest(TestCase):
+    def setUp(self):
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "password")
+        )
+        self.exercise = ExerciseService.create_exercises(
+            [
+                CreateExerciseDto(
+                    title="Admin",
+                    description="less than 20",
+                    constraint_type=ConstraintType.LT,
+                    upper_bound=20,
+                    points=[
+                        CreateExerciseDataPointDto(x=i, y=i, size=1) for i in range(150)
+                    ],
+                )
+            ]
+        )[0]
+
+    def _url(self, name: str) -> str:
+        return reverse(f"admin:exercises_exercise_{name}", args=[self.exercise.id])
+
+    def test_change_page_links_to_the_points(self):
+        response = self.client.get(self._url("change"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self._url("points"))
+        # no form per point
+        self.assertNotContains(response, "data_points-TOTAL_FORMS")
+
+    def test_points_are_paged_by_keyset(self):
+        first = self.client.get(self._url("points"))
+        self.assertEqual(len(first.context["points"]), 100)
+        self.assertIsNotNone(first.context["next_after"])
+
+        second = self.client.get(
+            self._url("points"), {"after": first.context["next_after"]}
+        )
+        self.assertEqual(len(second.context["points"]), 50)
+        self.assertIsNone(second.context["next_after"])
+
+        ids = [point[0] for point in first.context["points"] + second.context["points"]]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), 150)
+
+    def test_upload_replaces_the_points(self):
+        upload = SimpleUploadedFile("points.csv", b"x,y,size\n1,2,3\n4,5,6\n")
+
+        response = self.client.post(self._url("upload_points"), {"file": upload})
+
+        self.assertRedirects(response, self._url("points"))
+        exercise = Exercise.objects.get(id=self.exercise.id)
+        self.assertEqual(exercise.point_count, 2)
+        self.assertEqual(
+            sorted(
+                ExerciseDataPoint.objects.filter(exercise=exercise).values_list(
+                    "x", "y", "size"
+                )
+            ),
+            [(1, 2, 3), (4, 5, 6)],
+        )
+
+    def test_upload_reports_errors_by_line(self):
+        upload = SimpleUploadedFile("points.csv", b"x,y,size\n1,2,3\n4,five,6\n")
+
+        response = self.client.post(self._url("upload_points"), {"file": upload})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "line 3: y is not a number")
+        self.assertEqual(
+            ExerciseDataPoint.objects.filter(exercise_id=self.exercise.id).count(), 150
+        )
+
+    def test_delete_doesnt_collect_the_points(self):
+        confirmation = self.client.get(self._url("delete"))
+        self.assertContains(confirmation, "150")
+
+        response = self.client.post(self._url("delete"), {"post": "yes"})
+
+        self.assertRedirects(response, reverse("admin:exercises_exercise_changelist"))
+        self.assertFalse(Exercise.objects.exists())
+        self.assertFalse(ExerciseDataPoint.objects.exists())
+
+    def test_add_gets_the_next_order(self):
+        response = self.client.post(
+            reverse("admin:exercises_exercise_add"),
+            {
+                "title": "Added",
+                "description": "greater than 1",
+                "constraint_type": ConstraintType.GT,
+                "lower_bound": 1,
+                "is_active": "on",
+            },
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Exercise.objects.get(title="Added").order, 2)
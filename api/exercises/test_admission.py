@@ -0,0 +1,193 @@
+import threading
+import time
+
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from exercises import admission
+from exercises.admission import AdmissionController, AdmissionPolicy, Rejected
+from exercises.testing import reload_urlconf
+
+POLICIES = [
+    AdmissionPolicy("read", concurrency=2, queue_size=2, timeout=1.0, priority=0),
+    AdmissionPolicy("create", concurrency=1, queue_size=1, timeout=1.0, priority=2),
+]
+
+
+def _wait_until(condition, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.001)
+
+
+class ClassifyTest(SimpleTestCase):
+    def test_classes(self):
+        factory = RequestFactory()
+        cases = [
+            (factory.get("/api/exercises/"), "read"),
+            (factory.head("/api/exercises/first/"), "read"),
+            (factory.post("/api/exercises/1/evaluate/"), "evaluate"),
+            (factory.post("/api/exercises/"), "create"),
+            (factory.post("/api/exercises/clone/"), "create"),
+            (factory.patch("/api/exercises/1/"), "create"),
+            (factory.post("/api/exercises/archive/"), "create"),
+            (factory.post("/api/exercises/delete/"), "create"),
+            (factory.post("/admin/exercises/exercise/1/points/upload/"), "create"),
+            (factory.get("/admin/exercises/exercise/"), None),
+            (factory.options("/api/exercises/"), None),
+            (factory.get("/metrics/"), None),
+        ]
+        for request, name in cases:
+            with self.subTest(method=request.method, path=request.path):
+                self.assertEqual(admission.classify(request), name)
+
+
+class AdmissionControllerTest(TestCase):
+    def test_admits_up_to_the_concurrency_limit(self):
+        controller = AdmissionController(POLICIES, max_active=10)
+        controller.acquire("read")
+        controller.acquire("read")
+
+        stats = {entry.name: entry for entry in controller.stats()}
+        self.assertEqual(stats["read"].active, 2)
+        self.assertEqual(stats["read"].admitted, 2)
+
+    def test_rejects_when_the_queue_is_full(self):
+        controller = AdmissionController(POLICIES, max_active=10)
+        controller.acquire("create")
+
+        waiter = threading.Thread(target=self._acquire_quietly, args=(controller,))
+        waiter.start()
+        _wait_until(lambda: controller.stats()[1].queued == 1)
+
+        with self.assertRaises(Rejected) as e:
+            controller.acquire("create")
+        self.assertEqual(e.exception.reason, "the queue is full")
+
+        controller.release("create")
+        waiter.join()
+        self.assertEqual(controller.stats()[1].rejected_queue_full, 1)
+
+    def test_rejects_after_the_timeout(self):
+        policies = [
+            AdmissionPolicy(
+                "create", concurrency=1, queue_size=1, timeout=0.01, priority=0
+            )
+        ]
+        controller = AdmissionController(policies, max_active=10)
+        controller.acquire("create")
+
+        with self.assertRaises(Rejected):
+            controller.acquire("create")
+
+        stats = controller.stats()[0]
+        self.assertEqual(stats.rejected_timeout, 1)
+        self.assertEqual(stats.queued, 0)
+
+    def test_release_admits_the_next_request(self):
+        controller = AdmissionController(POLICIES, max_active=10)
+        controller.acquire("create")
+
+        waited = []
+        waiter = threading.Thread(
+            target=lambda: waited.append(controller.acquire("create"))
+        )
+        waiter.start()
+        _wait_until(lambda: controller.stats()[1].queued == 1)
+
+        controller.release("create")
+        waiter.join()
+
+        self.assertEqual(len(waited), 1)
+        self.assertEqual(controller.stats()[1].active, 1)
+
+    def test_reads_are_admitted_before_queued_imports(self):
+        controller = AdmissionController(POLICIES, max_active=1)
+        controller.acquire("read")
+
+        admitted = []
+        lock = threading.Lock()
+
+        def acquire(name: str) -> None:
+            controller.acquire(name)
+            with lock:
+                admitted.append(name)
+
+        create = threading.Thread(target=acquire, args=("create",))
+        create.start()
+        _wait_until(lambda: controller.stats()[1].queued == 1)
+        read = threading.Thread(target=acquire, args=("read",))
+        read.start()
+        _wait_until(lambda: controller.stats()[0].queued == 1)
+
+        # the slot goes to the read even though the import was queued first
+        controller.release("read")
+        _wait_until(lambda: len(admitted) == 1)
+        self.assertEqual(admitted, ["read"])
+
+        controller.release("read")
+        create.join()
+        read.join()
+        self.assertEqual(admitted, ["read", "create"])
+
+    @staticmethod
+    def _acquire_quietly(controller: AdmissionController) -> None:
+        controller.acquire("create")
+        controller.release("create")
+
+
+@override_settings(
+    EXERCISES_ADMISSION_POLICIES={
+        "read": {"concurrency": 4, "queue_size": 4, "timeout": 1.0, "priority": 0},
+        "create": {"concurrency": 1, "queue_size": 0, "timeout": 2.5, "priority": 2},
+    }
+)
+class AdmissionControlMiddlewareTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_sheds_requests_over_the_limit(self):
+        admission.controller().acquire("create")
+        try:
+            response = self.client.post("/api/exercises/", [], format="json")
+        finally:
+            admission.controller().release("create")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "3")
+        self.assertIn("error", response.json())
+
+    def test_admitted_requests_release_their_slot(self):
+        self.client.get("/api/exercises/")
+        self.client.get("/api/exercises/")
+
+        stats = {entry.name: entry for entry in admission.controller().stats()}
+        self.assertEqual(stats["read"].active, 0)
+        self.assertEqual(stats["read"].admitted, 2)
+
+    def test_metrics(self):
+        admission.controller().acquire("create")
+        try:
+            self.client.post("/api/exercises/", [], format="json")
+        finally:
+            admission.controller().release("create")
+
+        with self.settings(EXERCISES_METRICS=True, EXERCISES_INTERNAL_TOKEN="secret"):
+            # only mounted with metrics on, when the URLconf loads
+            reload_urlconf()
+            self.addCleanup(reload_urlconf)
+            self.assertEqual(self.client.get("/metrics/").status_code, 403)
+            response = self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('schole_admission_admitted_total{class="create"} 1', body)
+        self.assertIn(
+            'schole_admission_shed_total{class="create",reason="queue_full"} 1', body
+        )
+        self.assertIn('schole_admission_queue_depth{class="read"} 0', body)
+
+    def test_metrics_are_not_mounted_by_default(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 404)
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import tracemalloc
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from exercises.memory import load_reports, memory_profiler
+from exercises.services.service import ExerciseService, CreateExerciseDto
+from exercises.models.range_exercise import ConstraintType
+from exercises.testing import reload_urlconf
+
+
+class MemoryProfilingTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(memory_profiler.clear)
+        # the rest of the suite runs without tracing
+        self.addCleanup(tracemalloc.stop)
+        memory_profiler.clear()
+
+        ExerciseService.create_exercises(
+            [
+                CreateExerciseDto(
+                    title="Memory",
+                    description="less than 20",
+                    constraint_type=ConstraintType.LT,
+                    upper_bound=20,
+                    points=[],
+                )
+            ]
+        )
+
+    def _profiling(self, **overrides):
+        return self.settings(
+            EXERCISES_MEMORY_PROFILING=True,
+            EXERCISES_MEMORY_DIR=self.directory.name,
+            **overrides,
+        )
+
+    def test_off_by_default(self):
+        APIClient().get("/api/exercises/")
+        self.assertEqual(memory_profiler.report().routes, [])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_records_peaks_by_route(self):
+        with self._profiling():
+            APIClient().get("/api/exercises/")
+            APIClient().get("/api/exercises/")
+            report = memory_profiler.report()
+
+        self.assertTrue(report.profiling)
+        self.assertGreater(report.rss, 0)
+        self.assertGreaterEqual(report.max_rss, report.rss)
+        routes = {route.route: route for route in report.routes}
+        self.assertEqual(routes["api/exercises/$"].requests, 2)
+        self.assertGreater(routes["api/exercises/$"].peak_max, 0)
+        self.assertEqual(report.traced_peak, routes["api/exercises/$"].peak_max)
+
+    def test_keeps_diffs_of_the_worst_requests(self):
+        with self._profiling(EXERCISES_MEMORY_WORST_REQUESTS=2):
+            for _ in range(4):
+                APIClient().get("/api/exercises/")
+            worst = memory_profiler.report().worst
+
+        self.assertEqual(len(worst), 2)
+        self.assertGreaterEqual(worst[0].peak, worst[1].peak)
+        diffs = [
+            name for name in os.listdir(self.directory.name) if name.startswith("diff-")
+        ]
+        # the diffs of the evicted requests are removed
+        self.assertEqual(
+            sorted(diffs), sorted(os.path.basename(r.diff_file) for r in worst)
+        )
+        with open(worst[0].diff_file) as diff:
+            self.assertTrue(diff.readline().startswith("GET /api/exercises/"))
+
+    def test_diagnostics_endpoint(self):
+        staff = APIClient()
+        staff.force_login(
+            User.objects.create_user("staff", password="staff", is_staff=True)
+        )
+        with self._profiling(EXERCISES_INTERNAL_TOKEN="secret"):
+            # only mounted with profiling on, when the URLconf loads
+            reload_urlconf()
+            self.addCleanup(reload_urlconf)
+
+            APIClient().get("/api/exercises/")
+            self.assertEqual(APIClient().get("/diagnostics/memory/").status_code, 403)
+            scraper = APIClient(HTTP_AUTHORIZATION="Bearer secret")
+            self.assertEqual(scraper.get("/diagnostics/memory/").status_code, 200)
+            response = staff.get("/diagnostics/memory/")
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["pid"], os.getpid())
+        self.assertIn("api/exercises/$", [route["route"] for route in body["routes"]])
+
+    def test_diagnostics_endpoint_is_not_mounted_by_default(self):
+        client = APIClient()
+        client.force_login(
+            User.objects.create_user("staff", password="staff", is_staff=True)
+        )
+        self.assertEqual(client.get("/diagnostics/memory/").status_code, 404)
+
+    def test_report_command(self):
+        with self._profiling():
+            APIClient().get("/api/exercises/")
+
+        reports = load_reports(self.directory.name)
+        self.assertEqual([report.pid for report in reports], [os.getpid()])
+
+        out = StringIO()
+        call_command("memory_report", f"--directory={self.directory.name}", stdout=out)
+        self.assertIn(f"pid {os.getpid()}", out.getvalue())
+        self.assertIn("api/exercises/$", out.getvalue())
+        self.assertIn("GET /api/exercises/", out.getvalue())
+
+    def test_report_command_without_reports(self):
+        out = StringIO()
+        call_command("memory_report", f"--directory={self.directory.name}", stdout=out)
+        self.assertIn("no reports", out.getvalue())
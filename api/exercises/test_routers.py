@@ -0,0 +1,198 @@
+import time
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+
+from exercises import routers
+from exercises.middleware import ReplicaRoutingMiddleware
+from exercises.models import Exercise
+from exercises.models.range_exercise import ConstraintType
+from exercises.routers import PrimaryReplicaRouter
+from exercises.services.cache import exercise_cache
+from exercises.services.payloads import get_payload
+from exercises.services.service import (
+    CreateExerciseDataPointDto,
+    CreateExerciseDto,
+    ExerciseService,
+)
+from exercises.testing import LOCMEM_CACHES
+
+# a replica that lags behind, the test copies the primary to it when it wants
+STALE_REPLICA = "stale_replica"
+
+
+@override_settings(EXERCISES_REPLICA_DATABASES=["replica0", "replica1"])
+class PrimaryReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.token = routers.begin()
+        self.addCleanup(routers.end, self.token)
+
+    def test_reads_go_to_the_replicas(self):
+        reads = {self.router.db_for_read(Exercise) for _ in range(50)}
+        self.assertEqual(reads, {"replica0", "replica1"})
+
+    def test_writes_go_to_the_primary_and_pin_reads(self):
+        self.assertEqual(self.router.db_for_write(Exercise), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.router.db_for_read(Exercise), DEFAULT_DB_ALIAS)
+
+    def test_select_for_update_goes_to_the_primary(self):
+        self.assertEqual(Exercise.objects.select_for_update().db, DEFAULT_DB_ALIAS)
+
+    def test_reads_in_a_transaction_go_to_the_primary(self):
+        with mock.patch.object(
+            routers.connections[DEFAULT_DB_ALIAS], "in_atomic_block", True
+        ):
+            self.assertEqual(self.router.db_for_read(Exercise), DEFAULT_DB_ALIAS)
+
+    @override_settings(EXERCISES_REPLICA_DATABASES=[])
+    def test_without_replicas(self):
+        self.assertEqual(self.router.db_for_read(Exercise), DEFAULT_DB_ALIAS)
+
+    def test_unpinned_writes(self):
+        with routers.unpinned():
+            self.router.db_for_write(Exercise)
+            self.assertEqual(self.router.db_for_read(Exercise), DEFAULT_DB_ALIAS)
+
+        self.assertIn(self.router.db_for_read(Exercise), {"replica0", "replica1"})
+
+
+@override_settings(EXERCISES_REPLICA_DATABASES=["replica0"])
+class RoutingOutsideRequestsTest(SimpleTestCase):
+    def test_writes_dont_pin_the_thread(self):
+        router = PrimaryReplicaRouter()
+
+        self.assertEqual(router.db_for_write(Exercise), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_read(Exercise), "replica0")
+        self.assertIsNone(routers._state.get())
+
+
+@override_settings(
+    EXERCISES_REPLICA_DATABASES=["replica0"], EXERCISES_REPLICA_STICKY_SECONDS=5
+)
+class ReplicaRoutingMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.reads = []
+        self.factory = RequestFactory()
+
+    def _middleware(self, write: bool) -> ReplicaRoutingMiddleware:
+        router = PrimaryReplicaRouter()
+
+        def view(request):
+            if write:
+                router.db_for_write(Exercise)
+            self.reads.append(router.db_for_read(Exercise))
+            return HttpResponse()
+
+        return ReplicaRoutingMiddleware(view)
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        response = self._middleware(write=True)(self.factory.post("/api/exercises/"))
+
+        self.assertEqual(self.reads, [DEFAULT_DB_ALIAS])
+        cookie = response.cookies[routers.STICKY_COOKIE]
+        self.assertEqual(cookie["max-age"], 5)
+
+        request = self.factory.get("/api/exercises/first/")
+        request.COOKIES[routers.STICKY_COOKIE] = cookie.value
+        self._middleware(write=False)(request)
+        self.assertEqual(self.reads[-1], DEFAULT_DB_ALIAS)
+
+    def test_reads_go_to_the_replicas_without_recent_writes(self):
+        response = self._middleware(write=False)(self.factory.get("/api/exercises/"))
+        self.assertEqual(self.reads, ["replica0"])
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+        request = self.factory.get("/api/exercises/")
+        request.COOKIES[routers.STICKY_COOKIE] = str(time.time() - 1)
+        self._middleware(write=False)(request)
+        self.assertEqual(self.reads[-1], "replica0")
+
+    def test_unpinned_writes_dont_set_the_cookie(self):
+        router = PrimaryReplicaRouter()
+
+        def view(request):
+            with routers.unpinned():
+                router.db_for_write(Exercise)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(
+            self.factory.post("/api/exercises/1/evaluate/")
+        )
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+    def test_requests_dont_share_their_state(self):
+        self._middleware(write=True)(self.factory.post("/api/exercises/"))
+        self._middleware(write=False)(self.factory.get("/api/exercises/"))
+
+        self.assertEqual(self.reads, [DEFAULT_DB_ALIAS, "replica0"])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, EXERCISES_SNAPSHOT_FILE=None)
+class StaleReplicaTest(TransactionTestCase):
+    """The version-stamped caches are filled from the primary, not a lagging replica"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # registered for this class only, once the test runner set up its databases
+        connections.settings[STALE_REPLICA] = {
+            **connections.settings[DEFAULT_DB_ALIAS],
+            "NAME": f"file:{STALE_REPLICA}?mode=memory&cache=shared",
+        }
+        cls.databases = cls.databases | {STALE_REPLICA}
+        cls.addClassCleanup(cls._remove_stale_replica)
+
+    @staticmethod
+    def _remove_stale_replica():
+        # the in-memory database goes away with its last connection
+        connections[STALE_REPLICA].close()
+        del connections[STALE_REPLICA]
+        del connections.settings[STALE_REPLICA]
+
+    def setUp(self):
+        exercise_cache.clear()
+        self.exercise = ExerciseService.create_exercises(
+            [
+                CreateExerciseDto(
+                    title="Before",
+                    description="less than 20",
+                    constraint_type=ConstraintType.LT,
+                    upper_bound=20,
+                    points=[CreateExerciseDataPointDto(x=1, y=1, size=1)],
+                )
+            ]
+        )[0]
+
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[STALE_REPLICA]
+        primary.ensure_connection()
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
+
+        # written after the copy, so only the primary has it
+        Exercise.objects.filter(id=self.exercise.id).update(
+            title="After", upper_bound=10
+        )
+        exercise_cache.invalidate(self.exercise.id)
+
+        self.token = routers.begin()
+        self.addCleanup(routers.end, self.token)
+
+    @override_settings(EXERCISES_REPLICA_DATABASES=[STALE_REPLICA])
+    def test_caches_are_filled_from_the_primary(self):
+        # reads of this unpinned request do go to the lagging replica
+        self.assertEqual(Exercise.objects.get(id=self.exercise.id).title, "Before")
+
+        self.assertEqual(ExerciseService.get(self.exercise.id).title, "After")
+        self.assertEqual(len(ExerciseService.get(self.exercise.id).data_points), 1)
+        self.assertEqual(
+            ExerciseService._get_constraint(self.exercise.id).upper_bound, 10
+        )
+        self.assertIn(b'"After"', get_payload(self.exercise.id).body)
@@ -0,0 +1,156 @@
+import json
+import os
+import tempfile
+from typing import Dict, List
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from exercises import tracing
+from exercises.testing import LOCMEM_CACHES, create_exercise
+
+
+@override_settings(CACHES=LOCMEM_CACHES, EXERCISES_TRACE_SAMPLE_RATE=1.0)
+class TracingTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "traces.jsonl")
+
+        settings = override_settings(EXERCISES_TRACE_FILE=self.path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.exporter = tracing.SpanExporter()
+        self.addCleanup(self.exporter.close)
+        patcher = mock.patch.object(tracing, "exporter", self.exporter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _traces(self) -> List[List[dict]]:
+        self.exporter.flush()
+        with open(self.path) as f:
+            return [
+                json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+                for line in f
+            ]
+
+    @staticmethod
+    def _attributes(span: dict) -> Dict[str, dict]:
+        return {
+            attribute["key"]: attribute["value"] for attribute in span["attributes"]
+        }
+
+    def test_service_spans(self):
+        create_exercise(num_points=3)
+
+        [trace] = self._traces()
+        spans = {span["name"]: span for span in trace}
+        root = spans["ExerciseService.create_exercises"]
+
+        self.assertEqual(root["parentSpanId"], "")
+        self.assertEqual(self._attributes(root)["exercise_count"], {"intValue": "1"})
+        self.assertEqual(
+            self._attributes(spans["ExerciseDataPoint.bulk_create"])["point_count"],
+            {"intValue": "3"},
+        )
+        for name in (
+            "ExerciseService._get_next_exercise_order",
+            "Exercise.save",
+            "Exercise.full_clean",
+            "Exercise.refresh_from_db",
+            "db INSERT",
+        ):
+            self.assertIn(name, spans)
+
+        span_ids = {span["spanId"] for span in trace}
+        for span in trace:
+            self.assertEqual(span["traceId"], root["traceId"])
+            if span is not root:
+                self.assertIn(span["parentSpanId"], span_ids)
+
+        self.assertEqual(
+            spans["Exercise.full_clean"]["parentSpanId"],
+            spans["Exercise.save"]["spanId"],
+        )
+
+    def test_request_spans(self):
+        exercise = create_exercise(num_points=3)
+
+        res = APIClient().get(f"/api/exercises/{exercise.id}/")
+        self.assertEqual(res.status_code, 200)
+
+        trace = self._traces()[-1]
+        root = next(span for span in trace if span["parentSpanId"] == "")
+        self.assertEqual(root["name"], "HTTP GET")
+        self.assertEqual(root["kind"], int(tracing.SpanKind.SERVER))
+        self.assertEqual(
+            self._attributes(root)["http.status_code"], {"intValue": "200"}
+        )
+        self.assertEqual(
+            self._attributes(root)["http.route"],
+            {"stringValue": "api/exercises/(?P<pk>[^/.]+)/$"},
+        )
+
+        names = {span["name"] for span in trace}
+        self.assertTrue(
+            {
+                "ExerciseService.get",
+                "ExerciseResponseSerializer.from_dto",
+                "render json",
+                "db SELECT",
+            }
+            <= names
+        )
+
+    def test_errors_are_recorded(self):
+        with self.assertRaises(ValueError):
+            with tracing.span("failing"):
+                raise ValueError("boom")
+
+        [[span]] = self._traces()
+        self.assertEqual(span["status"], {"code": 2, "message": "ValueError: boom"})
+
+    def test_file_is_rotated(self):
+        with self.settings(EXERCISES_TRACE_FILE_MAX_BYTES=500):
+            for _ in range(5):
+                with tracing.span("rotated", padding="x" * 200):
+                    pass
+            self.exporter.flush()
+
+        self.assertTrue(os.path.exists(f"{self.path}.1"))
+
+    def test_nothing_is_recorded_without_sampling(self):
+        with self.settings(EXERCISES_TRACE_SAMPLE_RATE=0.0):
+            with tracing.span("unsampled") as span:
+                self.assertFalse(span.recording)
+                self.assertFalse(tracing.current_span().recording)
+            create_exercise(num_points=3)
+
+        self.exporter.flush()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_children_follow_the_sampling_of_their_root(self):
+        @tracing.traced("traced child")
+        def child():
+            with tracing.span("child"):
+                pass
+
+        with self.settings(EXERCISES_TRACE_SAMPLE_RATE=0.5), mock.patch.object(
+            tracing.random, "random", side_effect=[0.9, 0.1]
+        ):
+            # not sampled, the children mustn't sample again as roots of their own
+            with tracing.span("unsampled") as root:
+                self.assertFalse(root.recording)
+                child()
+                create_exercise(num_points=3)
+            self.assertIsNone(tracing._current_span.get())
+
+            with tracing.span("sampled"):
+                child()
+
+        [trace] = self._traces()
+        self.assertEqual(
+            sorted(span["name"] for span in trace), ["child", "sampled", "traced child"]
+        )
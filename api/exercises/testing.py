@@ -0,0 +1,53 @@
+"""Helpers shared by the tests"""
+
+import importlib
+import sys
+
+from django.conf import settings
+from django.urls import clear_url_caches
+
+from exercises.models.range_exercise import ConstraintType
+from exercises.services.service import (
+    CreateExerciseDataPointDto,
+    CreateExerciseDto,
+    ExerciseResponseDto,
+    ExerciseService,
+)
+
+# both cache tiers in memory: the file based backend compresses entries with zlib,
+# whose buffers would dominate the allocation budgets, and tests don't share files
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "exercises": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+
+def reload_urlconf() -> None:
+    """Reloads the URLconf, for URLs only mounted with some settings"""
+    clear_url_caches()
+    importlib.reload(sys.modules[settings.ROOT_URLCONF])
+
+
+def exercise_dto(num_points: int = 0, **fields) -> CreateExerciseDto:
+    """
+    An exercise "less than 20" with `num_points` points on y = x, wrapping at 20 so
+    they stay under the bound. Any field can be overridden
+    """
+    return CreateExerciseDto(
+        **{
+            "title": "Test Exercise",
+            "description": "less than 20",
+            "constraint_type": ConstraintType.LT,
+            "upper_bound": 20,
+            "points": [
+                CreateExerciseDataPointDto(x=i, y=i % 20, size=1)
+                for i in range(num_points)
+            ],
+            **fields,
+        }
+    )
+
+
+def create_exercise(num_points: int = 0, **fields) -> ExerciseResponseDto:
+    """Creates the exercise_dto"""
+    return ExerciseService.create_exercises([exercise_dto(num_points, **fields)])[0]
@@ -0,0 +1,324 @@
+"""
+Lightweight tracing for the service layer, ORM queries and serialization.
+
+Traces are sampled when their root span starts, and every span of a sampled trace is
+written as one line of OTLP/JSON (the format of the OpenTelemetry file exporter) by a
+background thread, to a file rotated by size. Unsampled traces only cost a context
+variable lookup per span.
+"""
+
+import atexit
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# the longest SQL statement kept as a span attribute
+MAX_STATEMENT_LENGTH = 2000
+
+
+class SpanKind(IntEnum):
+    # values from the OTLP protocol
+    INTERNAL = 1
+    SERVER = 2
+    CLIENT = 3
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    kind: SpanKind
+    start_ns: int
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    # every finished span of the trace, shared with the root so it can export them
+    trace: List["Span"] = field(default_factory=list, repr=False)
+
+    recording = True
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": int(self.kind),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": {},
+        }
+        if self.error is not None:
+            span["status"] = {"code": 2, "message": self.error}
+        return span
+
+
+class _NoopSpan:
+    """Returned for spans of traces that aren't sampled"""
+
+    recording = False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+# the no-op span while inside a trace that wasn't sampled, so its children follow the
+# decision instead of sampling again as roots of their own traces
+_current_span: ContextVar[Optional[Span | _NoopSpan]] = ContextVar(
+    "current_span", default=None
+)
+
+
+def _otlp_value(value: Any) -> dict:
+    # bool first, it's a subclass of int
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def sample_rate() -> float:
+    return getattr(settings, "EXERCISES_TRACE_SAMPLE_RATE", 0.0)
+
+
+@contextmanager
+def span(
+    name: str, kind: SpanKind = SpanKind.INTERNAL, **attributes: Any
+) -> Iterator[Span | _NoopSpan]:
+    """
+    Traces the block as a child of the current span. Without a current span it starts
+    a new trace, which is only recorded with probability EXERCISES_TRACE_SAMPLE_RATE,
+    and so are all the spans inside it
+    """
+    parent = _current_span.get()
+
+    if isinstance(parent, _NoopSpan):
+        # inside a trace that wasn't sampled
+        yield _NOOP_SPAN
+        return
+
+    if parent is None:
+        rate = sample_rate()
+        if rate <= 0 or random.random() >= rate:
+            token = _current_span.set(_NOOP_SPAN)
+            try:
+                yield _NOOP_SPAN
+            finally:
+                _current_span.reset(token)
+            return
+        current = Span(
+            trace_id=_new_id(128),
+            span_id=_new_id(64),
+            parent_id=None,
+            name=name,
+            kind=kind,
+            start_ns=time.time_ns(),
+            attributes=attributes,
+        )
+    else:
+        current = Span(
+            trace_id=parent.trace_id,
+            span_id=_new_id(64),
+            parent_id=parent.span_id,
+            name=name,
+            kind=kind,
+            start_ns=time.time_ns(),
+            attributes=attributes,
+            trace=parent.trace,
+        )
+
+    token = _current_span.set(current)
+    try:
+        with ExitStack() as stack:
+            if parent is None:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(_trace_query))
+            yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        current.trace.append(current)
+        if parent is None:
+            exporter.export(current.trace)
+
+
+def traced(name: Optional[str] = None) -> Callable[[F], F]:
+    """Decorator tracing every call of a function as a span named after it"""
+
+    def decorator(fn: F) -> F:
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # fast path: not in a sampled trace and not starting one
+            current = _current_span.get()
+            if isinstance(current, _NoopSpan) or (
+                current is None and sample_rate() <= 0
+            ):
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def current_span() -> Span | _NoopSpan:
+    return _current_span.get() or _NOOP_SPAN
+
+
+def _trace_query(execute, sql, params, many, context):
+    if not current_span().recording:
+        # e.g. a query from another thread sharing the connection
+        return execute(sql, params, many, context)
+
+    statement = sql if len(sql) <= MAX_STATEMENT_LENGTH else sql[:MAX_STATEMENT_LENGTH]
+    operation = sql.split(None, 1)[0].upper() if sql else ""
+    with span(
+        f"db {operation}",
+        SpanKind.CLIENT,
+        **{
+            "db.system": context["connection"].vendor,
+            "db.statement": statement,
+            "db.executemany": many,
+        },
+    ):
+        return execute(sql, params, many, context)
+
+
+class SpanExporter:
+    """
+    Writes traces from a background thread, so requests never wait for the file.
+    Traces are dropped when the queue is full rather than slowing requests down
+    """
+
+    def __init__(self, max_queued: int = 1000):
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue(max_queued)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._handler: Optional[RotatingFileHandler] = None
+        self.dropped = 0
+
+    def export(self, trace: List[Span]) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="exercises-trace-exporter", daemon=True
+                )
+                self._thread.start()
+
+    def _open(self) -> RotatingFileHandler:
+        path = settings.EXERCISES_TRACE_FILE
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=getattr(settings, "EXERCISES_TRACE_FILE_MAX_BYTES", 10 * 2**20),
+            backupCount=getattr(settings, "EXERCISES_TRACE_FILE_BACKUPS", 3),
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        return handler
+
+    def _run(self) -> None:
+        while True:
+            trace = self._queue.get()
+            try:
+                self._write(trace)
+            except Exception:
+                logger.exception("could not export trace")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, trace: List[Span]) -> None:
+        if self._handler is None:
+            self._handler = self._open()
+
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": "schole"}}
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [span.to_otlp() for span in trace],
+                        }
+                    ],
+                }
+            ]
+        }
+        self._handler.emit(
+            logging.makeLogRecord({"msg": json.dumps(request, separators=(",", ":"))})
+        )
+
+    def flush(self) -> None:
+        """Waits until every queued trace has been written"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            if self._handler is not None:
+                self._handler.close()
+                self._handler = None
+
+
+exporter = SpanExporter()
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    exporter.flush()
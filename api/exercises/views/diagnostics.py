@@ -0,0 +1,17 @@
+from dataclasses import asdict
+
+from django.http import HttpRequest, JsonResponse
+from django.views.decorators.http import require_GET
+
+from exercises.memory import memory_profiler
+from exercises.views.internal import internal_view
+
+
+@require_GET
+@internal_view
+def memory_diagnostics(_: HttpRequest) -> JsonResponse:
+    """
+    RSS of this worker, the allocation high-water marks of its routes and its worst
+    requests. Only mounted while memory profiling is on
+    """
+    return JsonResponse(asdict(memory_profiler.report()))
@@ -0,0 +1,40 @@
+import functools
+import hmac
+from typing import Callable
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, JsonResponse
+
+
+def is_internal(request: HttpRequest) -> bool:
+    """Staff users, and callers sending EXERCISES_INTERNAL_TOKEN as a bearer token"""
+    user = getattr(request, "user", None)
+    if user is not None and user.is_active and user.is_staff:
+        return True
+
+    token = getattr(settings, "EXERCISES_INTERNAL_TOKEN", None)
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    return (
+        bool(token)
+        and scheme.lower() == "bearer"
+        and hmac.compare_digest(credentials.encode(), token.encode())
+    )
+
+
+def internal_view(
+    view: Callable[..., HttpResponse],
+) -> Callable[..., HttpResponse]:
+    """
+    Restricts a view exposing worker internals to staff users and to internal callers
+    like scrapers, see is_internal
+    """
+
+    @functools.wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        if not is_internal(request):
+            return JsonResponse(
+                {"error": "only available to staff and internal callers"}, status=403
+            )
+        return view(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,48 @@
+from django.http import HttpRequest, HttpResponse
+from django.views.decorators.http import require_GET
+
+from exercises import admission
+from exercises.views.internal import internal_view
+
+# (metric, type, help, attribute of AdmissionStatsDto)
+_ADMISSION_METRICS = [
+    ("active", "gauge", "Requests being served", "active"),
+    ("queue_depth", "gauge", "Requests waiting for a slot", "queued"),
+    ("admitted_total", "counter", "Requests admitted", "admitted"),
+]
+
+# (reason label, attribute of AdmissionStatsDto)
+_SHED_REASONS = [
+    ("queue_full", "rejected_queue_full"),
+    ("timeout", "rejected_timeout"),
+]
+
+
+@require_GET
+@internal_view
+def metrics(_: HttpRequest) -> HttpResponse:
+    """Admission control metrics of this worker, in the Prometheus text format"""
+    stats = admission.controller().stats()
+    lines = []
+
+    for metric, kind, description, attribute in _ADMISSION_METRICS:
+        lines.append(f"# HELP schole_admission_{metric} {description}")
+        lines.append(f"# TYPE schole_admission_{metric} {kind}")
+        for entry in stats:
+            lines.append(
+                f'schole_admission_{metric}{{class="{entry.name}"}} '
+                f"{getattr(entry, attribute)}"
+            )
+
+    lines.append("# HELP schole_admission_shed_total Requests rejected with a 503")
+    lines.append("# TYPE schole_admission_shed_total counter")
+    for entry in stats:
+        for reason, attribute in _SHED_REASONS:
+            lines.append(
+                f'schole_admission_shed_total{{class="{entry.name}",reason="{reason}"}} '
+                f"{getattr(entry, attribute)}"
+            )
+
+    return HttpResponse(
+        "\n".join(lines) + "\n", content_type="text/plain; version=0.0.4"
+    )
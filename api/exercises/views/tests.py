@@ -1,3 +1,497 @@
-from django.test import TestCase
+import json
+import re
+from unittest import mock
+from uuid import uuid4
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from exercises.middleware import FirstResponseTimerMiddleware
+from exercises.models.range_exercise import ConstraintType
+from exercises.perf_budget import Budget, PerformanceBudgetMixin
+from exercises.services.cache import exercise_cache
+from exercises.services.payloads import cached_payload_url
+from exercises.services.stats import stats_recorder
+from exercises.testing import LOCMEM_CACHES, create_exercise
+
+
+class ExerciseViewSetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_retrieve_stream_matches_retrieve(self):
+        """the streamed response contains exactly the same document as the regular one"""
+        exercise = create_exercise(num_points=25)
+
+        with self.settings(EXERCISES_STREAM_CHUNK_SIZE=10):
+            res = self.client.get(f"/api/exercises/{exercise.id}/", {"stream": "true"})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        chunks = list(res.streaming_content)
+        # header, 3 chunks of points and the closing brackets
+        self.assertEqual(len(chunks), 5)
+
+        expected = self.client.get(f"/api/exercises/{exercise.id}/").json()
+        self.assertEqual(json.loads(b"".join(chunks)), expected)
+
+    def test_retrieve_stream_without_points(self):
+        exercise = create_exercise()
+
+        res = self.client.get(f"/api/exercises/{exercise.id}/", {"stream": "1"})
+
+        body = json.loads(b"".join(res.streaming_content))
+        self.assertEqual(body["id"], str(exercise.id))
+        self.assertEqual(body["data_points"], [])
+
+    def test_retrieve_stream_not_found(self):
+        res = self.client.get(f"/api/exercises/{uuid4()}/", {"stream": "true"})
+        self.assertEqual(res.status_code, 404)
+
+    def test_create_generated_exercise(self):
+        res = self.client.post(
+            "/api/exercises/",
+            {
+                "exercises": [
+                    {
+                        "title": "Generated",
+                        "description": "less than 20",
+                        "constraint_type": "lt",
+                        "upper_bound": 20,
+                        "generator": {
+                            "distribution": "normal",
+                            "seed": 1,
+                            "count": 50,
+                            "x": [0, 10],
+                            "y": [15, 2],
+                            "size": [3, 1],
+                        },
+                    }
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(res.status_code, 201)
+        exercise = res.json()[0]
+        self.assertEqual(len(exercise["data_points"]), 50)
+
+        variant = self.client.get(f"/api/exercises/{exercise['id']}/", {"seed": 2})
+        self.assertEqual(variant.json()["generator"]["seed"], 2)
+        self.assertNotEqual(variant.json()["data_points"], exercise["data_points"])
+
+    def test_retrieve_invalid_seed(self):
+        exercise = create_exercise()
+
+        res = self.client.get(f"/api/exercises/{exercise.id}/", {"seed": -1})
+        self.assertEqual(res.status_code, 400)
+
+        res = self.client.get(f"/api/exercises/{exercise.id}/", {"seed": 1})
+        self.assertEqual(res.status_code, 400)
+
+    def test_list(self):
+        exercises = [create_exercise(num_points=i) for i in range(3)]
+
+        res = self.client.get("/api/exercises/", {"limit": 2})
+        self.assertEqual(res.status_code, 200)
+        page = res.json()
+        self.assertEqual(
+            [ex["id"] for ex in page["exercises"]], [str(ex.id) for ex in exercises[:2]]
+        )
+        self.assertEqual(page["exercises"][1]["summary"]["point_count"], 1)
+
+        res = self.client.get("/api/exercises/", {"after": page["next_after"]})
+        self.assertEqual(res.json()["exercises"][0]["id"], str(exercises[2].id))
+        self.assertIsNone(res.json()["next_after"])
+
+    def test_partial_update(self):
+        exercise = create_exercise(num_points=3)
+        url = f"/api/exercises/{exercise.id}/"
+        point = exercise.data_points[1]
+        self.client.get(url)
+
+        res = self.client.patch(
+            url,
+            {
+                "upsert": [
+                    {"id": str(point.id), "x": 1, "y": 15, "size": 2},
+                    {"x": 5, "y": 30, "size": 1},
+                ],
+                "delete": [str(exercise.data_points[0].id)],
+            },
+            format="json",
+        )
+        self.assertEqual(res.status_code, 200)
+        body = res.json()
+        self.assertEqual((body["updated"], body["deleted"]), (1, 1))
+        self.assertEqual(body["summary"]["point_count"], 3)
+
+        retrieved = self.client.get(url).json()
+        self.assertEqual(retrieved["summary"], body["summary"])
+        self.assertEqual(
+            {p["id"]: p["y"] for p in retrieved["data_points"]},
+            {
+                str(point.id): 15,
+                str(exercise.data_points[2].id): 2,
+                body["created"][0]: 30,
+            },
+        )
+
+    def test_partial_update_invalid(self):
+        exercise = create_exercise(num_points=1)
+        url = f"/api/exercises/{exercise.id}/"
+
+        res = self.client.patch(
+            url, {"upsert": [{"x": 1, "y": 1, "size": -1}]}, format="json"
+        )
+        self.assertEqual(res.status_code, 400)
+
+        point_id = str(exercise.data_points[0].id)
+        res = self.client.patch(
+            url,
+            {
+                "upsert": [{"id": point_id, "x": 1, "y": 1, "size": 1}],
+                "delete": [point_id],
+            },
+            format="json",
+        )
+        self.assertEqual(res.status_code, 400)
+
+        res = self.client.patch(f"/api/exercises/{uuid4()}/", {}, format="json")
+        self.assertEqual(res.status_code, 404)
+
+    def test_archive_and_delete(self):
+        first, second = create_exercise(num_points=3), create_exercise()
+
+        res = self.client.post(
+            "/api/exercises/archive/", {"ids": [str(first.id)]}, format="json"
+        )
+        self.assertEqual(res.json(), {"archived": 1})
+        self.assertEqual(
+            self.client.get("/api/exercises/first/").json()["id"], str(second.id)
+        )
+
+        res = self.client.post(
+            "/api/exercises/delete/",
+            {"ids": [str(first.id), str(uuid4())]},
+            format="json",
+        )
+        self.assertEqual(res.json(), {"exercises": 1, "points": 3})
+        self.assertEqual(
+            self.client.get(f"/api/exercises/{first.id}/").status_code, 404
+        )
+
+        res = self.client.post("/api/exercises/delete/", {"ids": []}, format="json")
+        self.assertEqual(res.status_code, 400)
+
+    def test_schema_view_is_loaded_lazily(self):
+        res = self.client.get("/api/schema/", {"format": "json"})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("/api/exercises/", res.json()["paths"])
+
+    def test_first_response_is_reported_once(self):
+        middleware = FirstResponseTimerMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get("/api/exercises/")
+
+        with mock.patch.object(
+            FirstResponseTimerMiddleware, "reported", False
+        ), self.assertLogs("exercises.middleware", "INFO") as logs:
+            middleware(request)
+            middleware(request)
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("GET /api/exercises/", logs.output[0])
+
+    def test_evaluate_feedback(self):
+        exercise = create_exercise(
+            description="between 10 and 20",
+            constraint_type=ConstraintType.BETWEEN,
+            lower_bound=10,
+            upper_bound=20,
+        )
+        solution = [
+            {"id": str(uuid4()), "x": 1, "y": y, "size": 1} for y in (12, 25, 8, 18)
+        ]
+        url = f"/api/exercises/{exercise.id}/evaluate/"
+
+        res = self.client.post(url, {"solution": solution}, format="json")
+        self.assertNotIn("violations", res.json())
+
+        res = self.client.post(
+            f"{url}?feedback=ids", {"solution": solution}, format="json"
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            res.json(),
+            {
+                "is_correct": False,
+                "violations": {
+                    "count": 2,
+                    "worst_margin": 5.0,
+                    "ids": [solution[1]["id"], solution[2]["id"]],
+                },
+            },
+        )
+
+        res = self.client.post(
+            f"{url}?feedback=runs", {"solution": solution}, format="json"
+        )
+        self.assertEqual(res.json()["violations"]["runs"], [[1, 2]])
+
+        res = self.client.post(
+            f"{url}?feedback=indices&stream=true", {"solution": solution}, format="json"
+        )
+        self.assertEqual(res.status_code, 400)
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_retrieve_version(self):
+        exercise_cache.clear()
+        first, second = create_exercise(num_points=2), create_exercise()
+
+        res = self.client.get(f"/api/exercises/{first.id}/")
+        self.assertEqual(res.status_code, 200)
+        url = re.fullmatch(r'<(.+)>; rel="canonical"', res["Link"]).group(1)
+
+        versioned = self.client.get(url)
+        self.assertEqual(versioned.status_code, 200)
+        self.assertEqual(versioned.content, res.content)
+        self.assertEqual(
+            versioned["Cache-Control"], "public, max-age=31536000, immutable"
+        )
+
+        # navigation links to the same URLs
+        res = self.client.get("/api/exercises/first/")
+        self.assertEqual(res["Link"], f'<{url}>; rel="canonical"')
+        res = self.client.get(f"/api/exercises/{first.id}/next/")
+        self.assertEqual(res.json()["id"], str(second.id))
+        # the next exercise isn't rendered just for its URL
+        self.assertEqual(res.json()["url"], f"/api/exercises/{second.id}/")
+        self.assertIsNone(cached_payload_url(second.id))
+        res = self.client.get(res.json()["url"])
+        second_url = re.fullmatch(r'<(.+)>; rel="canonical"', res["Link"]).group(1)
+        res = self.client.get(f"/api/exercises/{first.id}/next/")
+        self.assertEqual(res.json()["url"], second_url)
+
+        # a new version gets a new URL, the old one keeps serving the old content
+        self.client.patch(
+            f"/api/exercises/{first.id}/",
+            {"upsert": [{"x": 5, "y": 15, "size": 1}]},
+            format="json",
+        )
+        res = self.client.get(f"/api/exercises/{first.id}/")
+        self.assertNotEqual(res["Link"], f'<{url}>; rel="canonical"')
+        self.assertEqual(self.client.get(url).content, versioned.content)
+
+        # versions that are gone redirect to the current one
+        exercise_cache.shared.clear()
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(
+            f'<{res["Location"]}>; rel="canonical"',
+            self.client.get(f"/api/exercises/{first.id}/")["Link"],
+        )
+
+        res = self.client.get(f"/api/exercises/{uuid4()}/v/0123abcd/")
+        self.assertEqual(res.status_code, 404)
+
+    def test_clone(self):
+        source = create_exercise(num_points=3)
+
+        res = self.client.post(
+            "/api/exercises/clone/",
+            {"ids": [str(source.id)], "transform": {"y_shift": 1, "bound_shift": 1}},
+            format="json",
+        )
+        self.assertEqual(res.status_code, 201)
+        body = res.json()
+        self.assertEqual(body["points"], 3)
+        clone = body["exercises"][0]
+        self.assertEqual(clone["title"], "Test Exercise (copy)")
+        self.assertEqual(clone["summary"]["max_y"], 3)
+
+        retrieved = self.client.get(f"/api/exercises/{clone['id']}/").json()
+        self.assertEqual(
+            sorted(p["y"] for p in retrieved["data_points"]), [1.0, 2.0, 3.0]
+        )
+        self.assertEqual(retrieved["upper_bound"], 21)
+
+        res = self.client.post(
+            "/api/exercises/clone/", {"ids": [str(uuid4())]}, format="json"
+        )
+        self.assertEqual(res.status_code, 404)
+
+    def test_search(self):
+        create_exercise(title="Heights of the class")
+        create_exercise(title="Weights", description="heights too")
+
+        res = self.client.get("/api/exercises/search/", {"q": "height", "limit": 1})
+        self.assertEqual(res.status_code, 200)
+        body = res.json()
+        self.assertEqual(body["exercises"][0]["title"], "Heights of the class")
+        self.assertNotIn("data_points", body["exercises"][0])
+
+        res = self.client.get(
+            "/api/exercises/search/", {"q": "height", "cursor": body["next_cursor"]}
+        )
+        self.assertEqual([e["title"] for e in res.json()["exercises"]], ["Weights"])
+        self.assertIsNone(res.json()["next_cursor"])
+
+        res = self.client.get("/api/exercises/search/", {"q": "height", "cursor": "x"})
+        self.assertEqual(res.status_code, 400)
+
+    def test_resume(self):
+        first = create_exercise()
+        second = create_exercise()
+        learner = str(uuid4())
+
+        res = self.client.get("/api/exercises/resume/", {"learner": learner})
+        self.assertEqual(res.json()["id"], str(first.id))
+
+        self.client.post(
+            f"/api/exercises/{first.id}/evaluate/?learner={learner}",
+            {"solution": [{"id": str(uuid4()), "x": 1, "y": 15, "size": 1}]},
+            format="json",
+        )
+        res = self.client.get("/api/exercises/resume/", {"learner": learner})
+        self.assertEqual(res.json()["id"], str(second.id))
+
+        res = self.client.get("/api/exercises/resume/")
+        self.assertEqual(res.status_code, 400)
+
+    def test_evaluate_stream(self):
+        exercise = create_exercise()
+        url = f"/api/exercises/{exercise.id}/evaluate/?stream=true"
+
+        def solution(*ys):
+            return {
+                "solution": [
+                    {"id": str(uuid4()), "x": 1, "y": y, "size": 1} for y in ys
+                ]
+            }
+
+        res = self.client.post(url, solution(12, 18), format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.json()["is_correct"])
+
+        res = self.client.post(url, solution(12, 21), format="json")
+        self.assertFalse(res.json()["is_correct"])
+
+        res = self.client.post(url, solution(), format="json")
+        self.assertEqual(res.status_code, 400)
+
+        res = self.client.post(url, {"solution": [{"y": 1}]}, format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("solution[0].id", res.json()["error"])
+
+        res = self.client.post(url, solution(12))
+        self.assertEqual(res.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ExerciseViewSetBudgetTest(PerformanceBudgetMixin, TestCase):
+    SIZES = (0, 10, 1000)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        exercise_cache.clear()
+        stats_recorder.clear()
+        patcher = mock.patch.multiple(
+            stats_recorder, flush_size=float("inf"), flush_interval=float("inf")
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _budget(self, queries: int, size: int) -> Budget:
+        # rendering is included, so responses get more room per point than services
+        return Budget(queries=queries, max_kib=256 + 4 * size, max_ms=300 + size)
+
+    def test_read_endpoints_budget(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                exercise = create_exercise(num_points=size)
+
+                with self.assertWithinBudget(
+                    f"retrieve[size={size}]", self._budget(2, size)
+                ):
+                    self.client.get(f"/api/exercises/{exercise.id}/")
+
+                with self.assertWithinBudget(
+                    f"retrieve_cached[size={size}]", self._budget(0, size)
+                ):
+                    self.client.get(f"/api/exercises/{exercise.id}/")
+
+                with self.assertWithinBudget(
+                    f"retrieve_stream[size={size}]", self._budget(2, size)
+                ):
+                    res = self.client.get(
+                        f"/api/exercises/{exercise.id}/", {"stream": "true"}
+                    )
+                    b"".join(res.streaming_content)
+
+                with self.assertWithinBudget(
+                    f"retrieve_next[size={size}]", self._budget(2, 0)
+                ):
+                    self.client.get(f"/api/exercises/{exercise.id}/next/")
+
+                with self.assertWithinBudget(
+                    f"retrieve_stats[size={size}]", self._budget(2, 0)
+                ):
+                    self.client.get(f"/api/exercises/{exercise.id}/stats/")
+
+    def test_evaluate_budget(self):
+        exercise = create_exercise()
+
+        for size in self.SIZES[1:]:
+            with self.subTest(size=size):
+                solution = [
+                    {"id": str(uuid4()), "x": i, "y": 15, "size": 1}
+                    for i in range(size)
+                ]
+                exercise_cache.clear()
+
+                with self.assertWithinBudget(
+                    f"evaluate[size={size}]", self._budget(1, size)
+                ):
+                    self.client.post(
+                        f"/api/exercises/{exercise.id}/evaluate/",
+                        {"solution": solution},
+                        format="json",
+                    )
+
+                # the test client keeps a copy of the body, besides that the streamed
+                # evaluation only needs constant memory
+                body = json.dumps({"solution": solution}).encode()
+                body_kib = len(body) / 1024
+                exercise_cache.clear()
+
+                with self.assertWithinBudget(
+                    f"evaluate_stream[size={size}]",
+                    Budget(queries=1, max_kib=256 + 2 * body_kib, max_ms=300 + size),
+                ):
+                    self.client.generic(
+                        "POST",
+                        f"/api/exercises/{exercise.id}/evaluate/?stream=true",
+                        body,
+                        content_type="application/json",
+                    )
+
+    def test_create_budget(self):
+        with self.assertWithinBudget("create", self._budget(6 + 1, 100)):
+            res = self.client.post(
+                "/api/exercises/",
+                {
+                    "exercises": [
+                        {
+                            "title": "Budget",
+                            "description": "less than 20",
+                            "constraint_type": "lt",
+                            "upper_bound": 20,
+                            "points": [{"x": i, "y": 1, "size": 1} for i in range(100)],
+                        }
+                    ]
+                },
+                format="json",
+            )
+
+        self.assertEqual(res.status_code, 201)
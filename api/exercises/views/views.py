@@ -1,4 +1,7 @@
+import io
+from typing import Optional
 from uuid import UUID
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from drf_spectacular.utils import extend_schema
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
@@ -10,28 +13,142 @@ from django.core.exceptions import (
 )
 
 from exercises.serializers.exercises import (
+    EvaluateQuerySerializer,
     EvaluateSolutionResponseSerializer,
     EvaluateSolutionSerializer,
     NextExerciseSerializer,
+    ExerciseArchiveResponseSerializer,
+    ExerciseCloneResponseSerializer,
+    ExerciseCloneSerializer,
     ExerciseCreateManySerializer,
+    ExerciseDeleteResponseSerializer,
+    ExerciseIdsSerializer,
+    ExerciseListItemSerializer,
+    ExerciseListQuerySerializer,
+    ExerciseListResponseSerializer,
     ExerciseManyResponseSerializer,
+    ExercisePatchResponseSerializer,
+    ExercisePatchSerializer,
     ExerciseResponseSerializer,
+    ExerciseRetrieveQuerySerializer,
+    ExerciseSearchQuerySerializer,
+    ExerciseSearchResponseSerializer,
+    ExerciseStatsResponseSerializer,
+    LearnerQuerySerializer,
+    SolutionViolationsSerializer,
 )
+from exercises import tracing
+from exercises.serializers.solution_parser import parse_solution
+from exercises.services.payloads import (
+    IMMUTABLE_CACHE_CONTROL,
+    ExercisePayloadDto,
+    get_payload,
+    get_payload_version,
+)
+from exercises.services.search import search_exercises
 from exercises.services.service import ExerciseService, ExerciseDataPointDto
 
 
 class ExerciseViewSet(viewsets.ViewSet):
+    @extend_schema(
+        responses=ExerciseListResponseSerializer,
+        description="List exercises by order, without their data points",
+        parameters=[ExerciseListQuerySerializer],
+    )
+    def list(self, request: Request) -> Response:
+        query = ExerciseListQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        assert isinstance(query.validated_data, dict)
+        limit = query.validated_data["limit"]
+
+        try:
+            exercises = ExerciseService.list(
+                after_order=query.validated_data.get("after"), limit=limit
+            )
+            return Response(
+                {
+                    "exercises": [
+                        ExerciseListItemSerializer.from_dto(exercise)
+                        for exercise in exercises
+                    ],
+                    "next_after": (
+                        exercises[-1].order if len(exercises) == limit else None
+                    ),
+                },
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    @extend_schema(
+        responses=ExerciseSearchResponseSerializer,
+        description="Search exercises by title and description, best match first, "
+        "without their data points",
+        parameters=[ExerciseSearchQuerySerializer],
+    )
+    @action(methods=["GET"], url_path="search", detail=False)
+    def search(self, request: Request) -> Response:
+        query = ExerciseSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        assert isinstance(query.validated_data, dict)
+
+        try:
+            page = search_exercises(
+                query.validated_data["q"],
+                limit=query.validated_data["limit"],
+                cursor=query.validated_data.get("cursor"),
+            )
+            return Response(
+                ExerciseSearchResponseSerializer.from_dto(page),
+                status=status.HTTP_200_OK,
+            )
+        except DjangoValidationError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
     @extend_schema(
         responses=ExerciseResponseSerializer,
         description="Get a range exercise by ID",
+        parameters=[ExerciseRetrieveQuerySerializer],
     )
-    def retrieve(self, _, pk: UUID) -> Response:
+    def retrieve(self, request: Request, pk: UUID) -> Response | StreamingHttpResponse:
+        query = ExerciseRetrieveQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        assert isinstance(query.validated_data, dict)
+        seed = query.validated_data.get("seed")
+
         try:
-            exercise = ExerciseService.get(pk)
+            if query.validated_data["stream"]:
+                header, chunks = ExerciseService.get_streaming(pk, seed=seed)
+                return StreamingHttpResponse(
+                    ExerciseResponseSerializer.stream_from_dto(header, chunks),
+                    content_type="application/json",
+                    status=status.HTTP_200_OK,
+                )
+
+            if seed is None:
+                return self._payload_response(request, get_payload(pk))
+
+            exercise = ExerciseService.get(pk, seed=seed)
             return Response(
                 ExerciseResponseSerializer.from_dto(exercise),
                 status=status.HTTP_200_OK,
             )
+        except DjangoValidationError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         except ObjectDoesNotExist:
             return Response(
                 {"error": f"Exercise with id {pk} not found"},
@@ -47,13 +164,10 @@ class ExerciseViewSet(viewsets.ViewSet):
         responses=ExerciseResponseSerializer, description="Get the first exercise"
     )
     @action(methods=["GET"], url_path="first", detail=False)
-    def retrieve_first(self, _) -> Response:
+    def retrieve_first(self, request: Request) -> Response | HttpResponse:
         try:
             exercise = ExerciseService.get_first()
-            return Response(
-                ExerciseResponseSerializer.from_dto(exercise),
-                status=status.HTTP_200_OK,
-            )
+            return self._payload_response(request, get_payload(exercise.id))
         except ObjectDoesNotExist:
             return Response(
                 {"error": f"could not find any exercise"},
@@ -73,15 +187,93 @@ class ExerciseViewSet(viewsets.ViewSet):
     def retrieve_next(self, _, pk: UUID) -> Response:
         next_id = ExerciseService.get_next(pk)
 
-        data = {
-            "id": next_id,
-        }
-
         return Response(
-            data=data,
+            data=NextExerciseSerializer.from_id(next_id),
             status=status.HTTP_200_OK,
         )
 
+    @extend_schema(
+        responses=ExerciseResponseSerializer,
+        description="Get a version of an exercise by the hash of its content. The "
+        "response never changes, so it can be cached forever. Versions that are no "
+        "longer available redirect to the current one",
+    )
+    @action(
+        methods=["GET"],
+        url_path=r"v/(?P<digest>[0-9a-f]+)",
+        url_name="retrieve-version",
+        detail=True,
+    )
+    def retrieve_version(self, _, pk: UUID, digest: str) -> HttpResponse | Response:
+        try:
+            body = get_payload_version(pk, digest)
+            if body is None:
+                response = HttpResponseRedirect(get_payload(pk).url)
+                response["Cache-Control"] = "no-cache"
+                return response
+
+            response = HttpResponse(body, content_type="application/json")
+            response["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+            response["ETag"] = f'"{digest}"'
+            return response
+        except ObjectDoesNotExist:
+            return Response(
+                {"error": f"Exercise with id {pk} not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    @extend_schema(
+        responses=NextExerciseSerializer,
+        description="Get the first exercise, in navigation order, the learner hasn't "
+        "solved yet. The id is null once they solved every active exercise",
+        parameters=[LearnerQuerySerializer],
+    )
+    @action(methods=["GET"], url_path="resume", detail=False)
+    def retrieve_resume(self, request: Request) -> Response:
+        query = LearnerQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        assert isinstance(query.validated_data, dict)
+
+        try:
+            resume_id = ExerciseService.get_resume(query.validated_data["learner"])
+            return Response(
+                NextExerciseSerializer.from_id(resume_id),
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    @extend_schema(
+        responses=ExerciseStatsResponseSerializer,
+        description="Get the evaluation statistics of an exercise",
+    )
+    @action(methods=["GET"], url_path="stats", detail=True)
+    def retrieve_stats(self, _, pk: UUID) -> Response:
+        try:
+            stats = ExerciseService.get_stats(pk)
+            return Response(
+                ExerciseStatsResponseSerializer.from_dto(stats),
+                status=status.HTTP_200_OK,
+            )
+        except ObjectDoesNotExist:
+            return Response(
+                {"error": f"Exercise with id {pk} not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
     @extend_schema(
         request=ExerciseCreateManySerializer,
         responses=ExerciseManyResponseSerializer,
@@ -115,27 +307,168 @@ class ExerciseViewSet(viewsets.ViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @extend_schema(
+        request=ExerciseCloneSerializer,
+        responses=ExerciseCloneResponseSerializer,
+        description="Copy exercises with their data points, optionally transforming "
+        "them. The copies are added at the end of the navigation",
+    )
+    @action(methods=["POST"], url_path="clone", detail=False)
+    def clone(self, request: Request) -> Response:
+        serializer = ExerciseCloneSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            ids, transform, title_suffix = serializer.to_dto()
+            result = ExerciseService.clone_exercises(ids, transform, title_suffix)
+            return Response(
+                ExerciseCloneResponseSerializer.from_dto(result),
+                status=status.HTTP_201_CREATED,
+            )
+        except DjangoValidationError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except ObjectDoesNotExist as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    @extend_schema(
+        request=ExerciseIdsSerializer,
+        responses=ExerciseArchiveResponseSerializer,
+        description="Archive exercises, removing them from the navigation",
+    )
+    @action(methods=["POST"], url_path="archive", detail=False)
+    def archive(self, request: Request) -> Response:
+        serializer = ExerciseIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        assert isinstance(serializer.validated_data, dict)
+
+        try:
+            archived = ExerciseService.archive_exercises(
+                serializer.validated_data["ids"]
+            )
+            return Response(
+                ExerciseArchiveResponseSerializer({"archived": archived}).data,
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    @extend_schema(
+        request=ExerciseIdsSerializer,
+        responses=ExerciseDeleteResponseSerializer,
+        description="Delete exercises and their data points",
+    )
+    @action(methods=["POST"], url_path="delete", detail=False)
+    def bulk_delete(self, request: Request) -> Response:
+        serializer = ExerciseIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        assert isinstance(serializer.validated_data, dict)
+
+        try:
+            result = ExerciseService.delete_exercises(serializer.validated_data["ids"])
+            return Response(
+                ExerciseDeleteResponseSerializer.from_dto(result),
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    @extend_schema(
+        request=ExercisePatchSerializer,
+        responses=ExercisePatchResponseSerializer,
+        description="Upsert and delete data points of an exercise by id, without "
+        "rewriting the rest of them",
+    )
+    def partial_update(self, request: Request, pk: UUID) -> Response:
+        serializer = ExercisePatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            result = ExerciseService.patch_data_points(pk, serializer.to_dto())
+            return Response(
+                ExercisePatchResponseSerializer.from_dto(result),
+                status=status.HTTP_200_OK,
+            )
+        except DjangoValidationError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except ObjectDoesNotExist:
+            return Response(
+                {"error": f"Exercise with id {pk} not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
     @extend_schema(
         request=EvaluateSolutionSerializer,
         responses=EvaluateSolutionResponseSerializer,
         description="Evaluate an exercise's solution",
+        parameters=[EvaluateQuerySerializer],
     )
     @action(methods=["POST"], url_path="evaluate", detail=True)
     def evaluate(self, req: Request, pk: UUID) -> Response:
+        query = EvaluateQuerySerializer(data=req.query_params)
+        query.is_valid(raise_exception=True)
+        assert isinstance(query.validated_data, dict)
+
         try:
-            serializer = EvaluateSolutionSerializer(data=req.data)
-            serializer.is_valid(raise_exception=True)
+            if query.validated_data["stream"]:
+                res = {
+                    "is_correct": self._evaluate_stream(
+                        req, pk, query.validated_data.get("learner")
+                    )
+                }
+            else:
+                serializer = EvaluateSolutionSerializer(data=req.data)
+                serializer.is_valid(raise_exception=True)
 
-            assert isinstance(serializer.validated_data, dict)
+                assert isinstance(serializer.validated_data, dict)
 
-            points = [
-                ExerciseDataPointDto(**point)
-                for point in serializer.validated_data["solution"]
-            ]
+                points = [
+                    ExerciseDataPointDto(**point)
+                    for point in serializer.validated_data["solution"]
+                ]
 
-            res = {
-                "is_correct": ExerciseService.evaluate_solution(pk, points),
-            }
+                feedback = query.validated_data.get("feedback")
+                learner = query.validated_data.get("learner")
+                if feedback is None:
+                    res = {
+                        "is_correct": ExerciseService.evaluate_solution(
+                            pk, points, learner
+                        ),
+                    }
+                else:
+                    violations = ExerciseService.evaluate_violations(
+                        pk, [point.y for point in points], learner
+                    )
+                    res = {
+                        "is_correct": violations.is_correct,
+                        "violations": SolutionViolationsSerializer.from_dto(
+                            violations, feedback, points
+                        ),
+                    }
 
             return Response(
                 EvaluateSolutionResponseSerializer(res).data,
@@ -153,3 +486,38 @@ class ExerciseViewSet(viewsets.ViewSet):
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+    @staticmethod
+    def _payload_response(
+        request: Request, payload: ExercisePayloadDto
+    ) -> Response | HttpResponse:
+        """
+        The precomputed payload of the current version, linking to its immutable URL.
+        Other formats than JSON (the browsable API) are rendered as usual
+        """
+        if request.accepted_renderer.format == "json":
+            response: Response | HttpResponse = HttpResponse(
+                payload.body, content_type="application/json"
+            )
+        else:
+            response = Response(
+                ExerciseResponseSerializer.from_dto(
+                    ExerciseService.get(payload.exercise_id)
+                ),
+                status=status.HTTP_200_OK,
+            )
+        response["Link"] = f'<{payload.url}>; rel="canonical"'
+        return response
+
+    @staticmethod
+    def _evaluate_stream(req: Request, pk: UUID, learner: Optional[UUID]) -> bool:
+        """evaluates the solution while the body is read, without building the points"""
+        if req.content_type.split(";")[0].strip() != "application/json":
+            raise DjangoValidationError(
+                "streamed solutions have to be sent as application/json"
+            )
+
+        with tracing.span("parse_solution") as span:
+            solution = parse_solution(req.stream or io.BytesIO())
+            span.set_attribute("point_count", solution.count)
+        return ExerciseService.evaluate_summary(pk, solution, learner)
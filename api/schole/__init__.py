@@ -0,0 +1,5 @@
+import time
+
+# imported before the settings and the apps, so it's the closest we get to the
+# process start. Used to report the time to the first response
+STARTED_AT = time.perf_counter()
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "schole.settings")
 
 application = get_asgi_application()
+
+# after the application, which loads the apps
+from exercises.apps import start_warmup  # noqa: E402
+
+start_warmup()
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +46,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "exercises.middleware.FirstResponseTimerMiddleware",
+    "exercises.middleware.TracingMiddleware",
+    "exercises.middleware.MemoryProfilingMiddleware",
+    "exercises.middleware.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -53,6 +59,7 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "exercises.middleware.AdmissionControlMiddleware",
 ]
 
 ROOT_URLCONF = "schole.urls"
@@ -85,6 +92,108 @@ DATABASES = {
     }
 }
 
+# read replicas of the default database, as a comma separated list of SQLite files kept
+# up to date by external replication. Other engines can be added to DATABASES and
+# listed in EXERCISES_REPLICA_DATABASES
+EXERCISES_REPLICA_DATABASES = []
+for i, path in enumerate(
+    filter(None, os.environ.get("SCHOLE_REPLICA_DATABASES", "").split(","))
+):
+    DATABASES[f"replica{i}"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": path,
+        # tests read the replicas through the default test database
+        "TEST": {"MIRROR": "default"},
+    }
+    EXERCISES_REPLICA_DATABASES.append(f"replica{i}")
+
+DATABASE_ROUTERS = ["exercises.routers.PrimaryReplicaRouter"]
+
+# seconds a client keeps reading from the primary after it wrote, should be more than
+# the replication lag
+EXERCISES_REPLICA_STICKY_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# "exercises" caches serialized exercises and constraints and has to be shared by all
+# the workers, so invalidations reach every one of them. A file based cache is enough
+# for a single host, for several hosts point it to Redis or memcached instead.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "exercises": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get(
+            "SCHOLE_EXERCISES_CACHE_LOCATION",
+            os.path.join(tempfile.gettempdir(), "schole-exercises-cache"),
+        ),
+        "TIMEOUT": 60 * 60,
+    },
+}
+
+# number of entries kept in each worker's in-process LRU, in front of the shared cache
+EXERCISES_CACHE_LRU_SIZE = 256
+# and the points of the exercises in it, their DTOs and rendered payloads. Exercises
+# with more points are only kept in the shared cache
+EXERCISES_CACHE_LRU_POINTS = 500_000
+
+# points of generated exercises kept in each worker, 24 bytes each. Variants of
+# client chosen seeds are never kept
+EXERCISES_GENERATOR_CACHE_POINTS = 1_000_000
+
+# seconds a request waits for another one loading the same exercise before loading
+# it on its own
+EXERCISES_CACHE_FLIGHT_TIMEOUT = 30
+
+# points removed per DELETE statement when deleting exercises
+EXERCISES_DELETE_BATCH_SIZE = 5000
+
+# points inserted per INSERT statement when they're replaced from an upload
+EXERCISES_IMPORT_BATCH_SIZE = 5000
+
+# preload the first exercises into the cache in the background when a worker starts,
+# see exercises.apps.start_warmup
+EXERCISES_WARMUP_ON_STARTUP = os.environ.get("SCHOLE_WARMUP_ON_STARTUP") == "1"
+EXERCISES_WARMUP_LIMIT = 50
+
+# fraction of requests traced, their spans are written as OTLP/JSON lines to a file
+# that is rotated when it reaches EXERCISES_TRACE_FILE_MAX_BYTES
+EXERCISES_TRACE_SAMPLE_RATE = float(os.environ.get("SCHOLE_TRACE_SAMPLE_RATE", 0))
+EXERCISES_TRACE_FILE = os.environ.get(
+    "SCHOLE_TRACE_FILE", os.path.join(tempfile.gettempdir(), "schole-traces.jsonl")
+)
+EXERCISES_TRACE_FILE_MAX_BYTES = 10 * 2**20
+EXERCISES_TRACE_FILE_BACKUPS = 3
+
+# serve reads from a memory-mapped snapshot of the active exercises, built with
+# `manage.py build_snapshot` and rebuilt in the background after writes
+EXERCISES_SNAPSHOT_FILE = os.environ.get("SCHOLE_SNAPSHOT_FILE") or None
+EXERCISES_SNAPSHOT_CHECK_INTERVAL = 1.0
+EXERCISES_SNAPSHOT_AUTO_REBUILD = True
+
+# requests served at the same time by class, the ones that can't get a slot in time
+# are rejected with a 503. EXERCISES_ADMISSION_POLICIES and
+# EXERCISES_ADMISSION_MAX_ACTIVE default to the ones in exercises/admission.py
+# expose the admission metrics at /metrics/, to staff and EXERCISES_INTERNAL_TOKEN
+EXERCISES_METRICS = os.environ.get("SCHOLE_METRICS") == "1"
+
+# measure the traced allocations of every request and keep snapshot diffs of the
+# worst ones in EXERCISES_MEMORY_DIR, see exercises/memory.py. Slow, for diagnosis only
+EXERCISES_MEMORY_PROFILING = os.environ.get("SCHOLE_MEMORY_PROFILING") == "1"
+EXERCISES_MEMORY_DIR = os.environ.get(
+    "SCHOLE_MEMORY_DIR", os.path.join(tempfile.gettempdir(), "schole-memory")
+)
+EXERCISES_MEMORY_FRAMES = 10
+EXERCISES_MEMORY_WORST_REQUESTS = 10
+EXERCISES_MEMORY_REPORT_INTERVAL = 10.0
+
+# bearer token of internal callers, e.g. scrapers, of the views exposing the internals
+# of workers. Staff users can always see them
+EXERCISES_INTERNAL_TOKEN = os.environ.get("SCHOLE_INTERNAL_TOKEN") or None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -129,6 +238,16 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": [
+        "exercises.serializers.renderers.TracedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+SPECTACULAR_SETTINGS = {
+    # the schema views are loaded lazily and aren't part of the schema, so the prefix
+    # can't be inferred from the common prefix of every path anymore
+    "SCHEMA_PATH_PREFIX": r"/api/",
 }
 
 CORS_ALLOW_CREDENTIALS = True
@@ -1,20 +1,54 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.routers import DefaultRouter
 
+from exercises.views.diagnostics import memory_diagnostics
+from exercises.views.metrics import metrics
 from exercises.views.views import ExerciseViewSet
 
+
+def lazy_view(view_class: str, **initkwargs):
+    """
+    A view that only imports `view_class` on its first request, for rarely used
+    views that would otherwise be imported by every worker when the URLconf loads
+    """
+    view = None
+
+    @csrf_exempt
+    def dispatch(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(view_class).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+
+    return dispatch
+
+
 router = DefaultRouter()
 router.register(r"exercises", ExerciseViewSet, basename="exercise")
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include(router.urls)),
-    path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
+    path(
+        "api/schema/",
+        lazy_view("drf_spectacular.views.SpectacularAPIView"),
+        name="schema",
+    ),
     path(
         "api/schema/swagger-ui/",
-        SpectacularSwaggerView.as_view(url_name="schema"),
+        lazy_view("drf_spectacular.views.SpectacularSwaggerView", url_name="schema"),
         name="swagger-ui",
     ),
 ]
+
+if settings.EXERCISES_METRICS:
+    urlpatterns.append(path("metrics/", metrics, name="metrics"))
+
+if settings.EXERCISES_MEMORY_PROFILING:
+    urlpatterns.append(
+        path("diagnostics/memory/", memory_diagnostics, name="memory-diagnostics")
+    )
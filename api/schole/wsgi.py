@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "schole.settings")
 
 application = get_wsgi_application()
+
+# after the application, which loads the apps
+from exercises.apps import start_warmup  # noqa: E402
+
+start_warmup()